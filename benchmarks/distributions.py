@@ -0,0 +1,29 @@
+import random
+from collections.abc import Callable
+
+Sampler = Callable[[], float]
+
+
+def parse_distribution(spec: str, rng: random.Random | None = None) -> Sampler:
+    """Build a sampler of non-negative seconds from a spec string.
+
+    Supported: ``fixed:S``, ``uniform:LO,HI``, ``normal:MEAN,STDDEV``,
+    ``lognormal:MU,SIGMA`` and ``exp:MEAN``.
+    """
+    rng = rng or random.Random()
+    kind, _, raw = spec.partition(":")
+    try:
+        args = [float(value) for value in raw.split(",") if value]
+    except ValueError as exc:
+        raise ValueError(f"invalid distribution {spec!r}") from exc
+    if kind == "fixed" and len(args) == 1:
+        return lambda: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda: rng.uniform(args[0], args[1])
+    if kind == "normal" and len(args) == 2:
+        return lambda: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal" and len(args) == 2:
+        return lambda: rng.lognormvariate(args[0], args[1])
+    if kind == "exp" and len(args) == 1:
+        return lambda: rng.expovariate(1 / args[0]) if args[0] > 0 else 0.0
+    raise ValueError(f"invalid distribution {spec!r}")
@@ -0,0 +1,218 @@
+"""A fake ComfyUI server for benchmarks.
+
+Implements the parts of the ComfyUI API the worker uses: /prompt, /queue,
+/history, /ws, /view and /system_stats. Prompts run one at a time, like a
+single GPU, for a duration drawn from the configured distribution; an
+optional queue-delay distribution holds each prompt back before it becomes
+eligible to run. A prompt containing a ``BenchSleep`` node runs for that
+node's ``seconds`` input instead, which is how recorded traces are replayed.
+The request count per endpoint is served on /bench/stats.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import Counter, deque
+from typing import Any
+
+from aiohttp import WSMsgType, web
+
+from benchmarks.distributions import Sampler, parse_distribution
+
+logger = logging.getLogger(__name__)
+
+
+class FakeComfyUi:
+    def __init__(
+        self,
+        execution: Sampler,
+        queue_delay: Sampler | None = None,
+        output_bytes: int = 64 * 1024,
+        outputs_per_prompt: int = 1,
+    ) -> None:
+        self._execution = execution
+        self._queue_delay = queue_delay
+        self._output = b"\x89PNG" + b"\0" * max(0, output_bytes - 4)
+        self._outputs_per_prompt = outputs_per_prompt
+        self._pending: deque[tuple[str, str | None, float, float | None]] = deque()
+        self._running: str | None = None
+        self._history: dict[str, Any] = {}
+        self._sockets: dict[str, web.WebSocketResponse] = {}
+        self._work = asyncio.Event()
+        self._number = 0
+        self.requests: Counter[str] = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._count])
+        app.router.add_post("/prompt", self.prompt)
+        app.router.add_get("/queue", self.queue)
+        app.router.add_get("/history", self.history_batch)
+        app.router.add_get("/history/{prompt_id}", self.history)
+        app.router.add_get("/view", self.view)
+        app.router.add_get("/system_stats", self.system_stats)
+        app.router.add_get("/ws", self.websocket)
+        app.router.add_get("/bench/stats", self.stats)
+        app.on_startup.append(self._start)
+        return app
+
+    @web.middleware
+    async def _count(self, request: web.Request, handler: Any) -> web.StreamResponse:
+        if not request.path.startswith("/bench"):
+            self.requests["/" + request.path.lstrip("/").split("/", 1)[0]] += 1
+        return await handler(request)
+
+    async def _start(self, app: web.Application) -> None:
+        app["executor"] = asyncio.create_task(self._execute())
+
+    async def prompt(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        prompt_id = str(uuid.uuid4())
+        delay = self._queue_delay() if self._queue_delay is not None else 0.0
+        self._pending.append(
+            (
+                prompt_id,
+                body.get("client_id"),
+                time.monotonic() + delay,
+                _sleep_seconds(body.get("prompt") or {}),
+            )
+        )
+        self._work.set()
+        self._number += 1
+        return web.json_response({"prompt_id": prompt_id, "number": self._number})
+
+    async def queue(self, request: web.Request) -> web.Response:
+        running = [[self._running, 0]] if self._running else []
+        pending = [[prompt_id, 0] for prompt_id, *_ in self._pending]
+        return web.json_response({"queue_running": running, "queue_pending": pending})
+
+    async def history(self, request: web.Request) -> web.Response:
+        prompt_id = request.match_info["prompt_id"]
+        entry = self._history.get(prompt_id)
+        return web.json_response({prompt_id: entry} if entry else {})
+
+    async def history_batch(self, request: web.Request) -> web.Response:
+        max_items = int(request.query.get("max_items", "64"))
+        recent = list(self._history.items())[-max_items:]
+        return web.json_response(dict(recent))
+
+    async def view(self, request: web.Request) -> web.Response:
+        return web.Response(body=self._output, content_type="image/png")
+
+    async def system_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"devices": [{"name": "fake", "vram_free": 1 << 34}]})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": dict(self.requests)})
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        socket = web.WebSocketResponse()
+        await socket.prepare(request)
+        client_id = request.query.get("clientId", "")
+        self._sockets[client_id] = socket
+        try:
+            async for message in socket:
+                if message.type == WSMsgType.ERROR:
+                    break
+        finally:
+            self._sockets.pop(client_id, None)
+        return socket
+
+    async def _send(self, client_id: str | None, event: dict[str, Any]) -> None:
+        socket = self._sockets.get(client_id or "")
+        if socket is not None and not socket.closed:
+            await socket.send_str(json.dumps(event))
+
+    async def _execute(self) -> None:
+        while True:
+            if not self._pending:
+                self._work.clear()
+                await self._work.wait()
+                continue
+            eligible_at = self._pending[0][2]
+            if eligible_at > time.monotonic():
+                await asyncio.sleep(eligible_at - time.monotonic())
+            prompt_id, client_id, _, duration = self._pending.popleft()
+            self._running = prompt_id
+            started = time.time()
+            await self._send(
+                client_id,
+                {"type": "execution_start", "data": {"prompt_id": prompt_id}},
+            )
+            await asyncio.sleep(self._execution() if duration is None else duration)
+            images = [
+                {
+                    "filename": f"{prompt_id}_{index}.png",
+                    "subfolder": "",
+                    "type": "output",
+                }
+                for index in range(self._outputs_per_prompt)
+            ]
+            self._history[prompt_id] = {
+                "outputs": {"9": {"images": images}},
+                "status": {
+                    "status_str": "success",
+                    "completed": True,
+                    "messages": [
+                        [
+                            "execution_start",
+                            {"prompt_id": prompt_id, "timestamp": int(started * 1000)},
+                        ],
+                        [
+                            "execution_success",
+                            {
+                                "prompt_id": prompt_id,
+                                "timestamp": int(time.time() * 1000),
+                            },
+                        ],
+                    ],
+                },
+            }
+            self._running = None
+            await self._send(
+                client_id,
+                {"type": "executing", "data": {"node": None, "prompt_id": prompt_id}},
+            )
+
+
+def _sleep_seconds(workflow: dict[str, Any]) -> float | None:
+    for node in workflow.values():
+        if isinstance(node, dict) and node.get("class_type") == "BenchSleep":
+            return float((node.get("inputs") or {}).get("seconds", 0.0))
+    return None
+
+
+async def serve(
+    server: FakeComfyUi, host: str = "127.0.0.1", port: int = 0
+) -> tuple[web.AppRunner, int]:
+    """Start ``server`` and return its runner and the bound port."""
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    sockets = site._server.sockets  # type: ignore[union-attr]
+    return runner, sockets[0].getsockname()[1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--execution", default="lognormal:0,0.5")
+    parser.add_argument("--queue-delay", default="fixed:0")
+    parser.add_argument("--output-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--outputs-per-prompt", type=int, default=1)
+    args = parser.parse_args()
+    server = FakeComfyUi(
+        parse_distribution(args.execution),
+        queue_delay=parse_distribution(args.queue_delay),
+        output_bytes=args.output_bytes,
+        outputs_per_prompt=args.outputs_per_prompt,
+    )
+    web.run_app(server.app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Drive the task handler against a fake ComfyUI and report throughput.
+
+Example::
+
+    uv run --group bench python -m benchmarks.harness --tasks 200 \\
+        --concurrency 8 --depth 4 --execution lognormal:-2,0.4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager
+from multiprocessing.connection import Connection
+from typing import Any
+
+import httpx
+
+from benchmarks.distributions import parse_distribution
+
+# What a failed task raises: ComfyUI HTTP errors, timeouts and dropped
+# event streams (OSError), failed prompts (RuntimeError) and bad payloads.
+TASK_ERRORS = (httpx.HTTPError, OSError, RuntimeError, ValueError)
+
+
+class _Ctx:
+    def log(self, message: str) -> None:
+        pass
+
+
+def _serve(conn: Connection, options: dict[str, Any]) -> None:
+    from benchmarks.fake_comfyui import FakeComfyUi, serve
+
+    async def run() -> None:
+        server = FakeComfyUi(
+            parse_distribution(options["execution"]),
+            queue_delay=parse_distribution(options["queue_delay"]),
+            output_bytes=options["output_bytes"],
+            outputs_per_prompt=options["outputs_per_prompt"],
+        )
+        _, port = await serve(server)
+        conn.send(port)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def start_fake_server(**options: Any) -> tuple[multiprocessing.Process, str]:
+    """Run the fake server in its own process so its CPU is not measured."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.get_context("spawn").Process(
+        target=_serve, args=(child, options), daemon=True
+    )
+    process.start()
+    if not parent.poll(30):
+        process.kill()
+        raise RuntimeError("fake ComfyUI did not start")
+    return process, f"http://127.0.0.1:{parent.recv()}"
+
+
+def _percentile(values: list[float], pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[pct - 1]
+
+
+@asynccontextmanager
+async def task_handler(
+    base_url: str,
+    depth: int = 1,
+    use_websocket: bool = True,
+    output_mode: str = "path",
+    poll_interval: int = 1,
+    poll_min_interval: float = 0.25,
+) -> AsyncIterator[Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]]:
+    """Build the worker's task handler against ``base_url`` as main.py would."""
+    from comfyui_worker.config import Settings
+    from comfyui_worker.polling import AdaptivePolling
+    from comfyui_worker.worker import build_task_handler
+    from main import build_backend_pool
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        settings = Settings(
+            comfyui_base_url=base_url,
+            comfyui_output_dir=output_dir,
+            comfyui_in_flight_depth=depth,
+            comfyui_use_websocket=use_websocket,
+            comfyui_output_mode=output_mode,
+            comfyui_poll_interval_sec=poll_interval,
+        )
+        backends = build_backend_pool(settings)
+        for backend in backends.backends:
+            if backend.events is not None:
+                await backend.events.wait_connected(5)
+        handler = build_task_handler(
+            backends=backends,
+            poll_interval=poll_interval,
+            history_timeout=600,
+            polling=AdaptivePolling(poll_min_interval, poll_interval),
+            output_mode=output_mode,
+        )
+        try:
+            yield lambda payload: handler(payload, _Ctx())  # type: ignore[arg-type]
+        finally:
+            for backend in backends.backends:
+                if backend.events is not None:
+                    await backend.events.stop()
+                await backend.client.aclose()
+
+
+async def request_counts(base_url: str) -> dict[str, int]:
+    """Per-endpoint request counts from the fake server, or {} from ComfyUI."""
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        try:
+            response = await http.get("/bench/stats")
+            response.raise_for_status()
+        except httpx.HTTPError:
+            return {}
+        return response.json()["requests"]
+
+
+def latency_summary(latencies: list[float]) -> dict[str, float]:
+    return {
+        "latency_p50_sec": round(_percentile(latencies, 50), 4),
+        "latency_p95_sec": round(_percentile(latencies, 95), 4),
+        "latency_p99_sec": round(_percentile(latencies, 99), 4),
+    }
+
+
+async def run_benchmark(
+    base_url: str,
+    tasks: int,
+    concurrency: int,
+    depth: int = 1,
+    use_websocket: bool = True,
+    output_mode: str = "path",
+    poll_interval: int = 1,
+    poll_min_interval: float = 0.25,
+) -> dict[str, Any]:
+    async with task_handler(
+        base_url,
+        depth=depth,
+        use_websocket=use_websocket,
+        output_mode=output_mode,
+        poll_interval=poll_interval,
+        poll_min_interval=poll_min_interval,
+    ) as handle:
+        before = await request_counts(base_url)
+        latencies: list[float] = []
+        failures = 0
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> None:
+            nonlocal failures
+            workflow = {"3": {"class_type": "KSampler", "inputs": {"seed": index}}}
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    await handle(workflow)
+                except TASK_ERRORS:
+                    failures += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(tasks)))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        after = await request_counts(base_url)
+
+    requests = {key: after.get(key, 0) - before.get(key, 0) for key in after}
+    completed = len(latencies)
+    return {
+        "tasks": tasks,
+        "failures": failures,
+        "concurrency": concurrency,
+        "depth": depth,
+        "use_websocket": use_websocket,
+        "output_mode": output_mode,
+        "wall_sec": round(wall, 3),
+        "tasks_per_sec": round(completed / wall, 3) if wall else 0.0,
+        **latency_summary(latencies),
+        "http_requests_per_task": round(sum(requests.values()) / tasks, 3),
+        "http_requests_by_endpoint": requests,
+        "cpu_ms_per_task": round(cpu * 1000 / tasks, 3),
+    }
+
+
+def compare(
+    result: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Return a description of every metric that regressed past ``tolerance``."""
+    regressions = []
+    if result["tasks_per_sec"] < baseline["tasks_per_sec"] * (1 - tolerance):
+        regressions.append("tasks_per_sec")
+    for key in (
+        "latency_p95_sec",
+        "latency_p99_sec",
+        "http_requests_per_task",
+        "cpu_ms_per_task",
+    ):
+        if result[key] > baseline[key] * (1 + tolerance):
+            regressions.append(key)
+    return [f"{key}: {baseline[key]} -> {result[key]}" for key in regressions]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--execution", default="lognormal:-2.5,0.4")
+    parser.add_argument("--queue-delay", default="fixed:0")
+    parser.add_argument("--output-bytes", type=int, default=64 * 1024)
+    parser.add_argument("--outputs-per-prompt", type=int, default=1)
+    parser.add_argument("--no-websocket", action="store_true")
+    parser.add_argument("--output-mode", choices=("path", "fetch"), default="path")
+    parser.add_argument("--poll-min-interval", type=float, default=0.25)
+    parser.add_argument("--save", help="write the result JSON to this file")
+    parser.add_argument("--baseline", help="fail if worse than this result JSON")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    process, base_url = start_fake_server(
+        execution=args.execution,
+        queue_delay=args.queue_delay,
+        output_bytes=args.output_bytes,
+        outputs_per_prompt=args.outputs_per_prompt,
+    )
+    try:
+        result = asyncio.run(
+            run_benchmark(
+                base_url,
+                tasks=args.tasks,
+                concurrency=args.concurrency,
+                depth=args.depth,
+                use_websocket=not args.no_websocket,
+                output_mode=args.output_mode,
+                poll_min_interval=args.poll_min_interval,
+            )
+        )
+    finally:
+        process.kill()
+
+    print(json.dumps(result, indent=2))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(result, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(result, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Compare full-body and streaming parsing of large /history responses.
+
+Example::
+
+    uv run python -m benchmarks.history_parse --nodes 400 --outputs 64
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+from comfyui_worker.history import output_files, parse_history
+
+PROMPT_ID = "2f0c5d6e-6f0b-4cb5-a1f4-3c1d7c3b9a10"
+
+
+def build_body(nodes: int, outputs: int, meta_bytes: int) -> bytes:
+    """A /history/{id} body with a large graph, many outputs and metadata."""
+    graph = {
+        str(index): {
+            "class_type": "KSampler",
+            "inputs": {"seed": index, "steps": 30, "text": "a prompt " * 20},
+            "_meta": {"title": f"node {index}"},
+        }
+        for index in range(nodes)
+    }
+    images = [
+        {"filename": f"ComfyUI_{index:05}_.png", "subfolder": "", "type": "output"}
+        for index in range(outputs)
+    ]
+    entry = {
+        "prompt": [1, PROMPT_ID, graph, {"client_id": "bench"}, ["9"]],
+        "outputs": {"9": {"images": images}},
+        "status": {
+            "status_str": "success",
+            "completed": True,
+            "messages": [["execution_start", {"timestamp": 1}]],
+        },
+        "meta": {str(index): {"blob": "m" * meta_bytes} for index in range(nodes)},
+    }
+    return json.dumps({PROMPT_ID: entry}).encode()
+
+
+async def _chunks(body: bytes, size: int) -> AsyncIterator[bytes]:
+    view = memoryview(body)
+    for start in range(0, len(body), size):
+        yield bytes(view[start : start + size])
+
+
+async def _full(body: bytes, chunk_size: int) -> int:
+    buffered = b"".join([chunk async for chunk in _chunks(body, chunk_size)])
+    return len(output_files(json.loads(buffered)[PROMPT_ID]))
+
+
+async def _streaming(body: bytes, chunk_size: int) -> int:
+    history = await parse_history(_chunks(body, chunk_size), PROMPT_ID)
+    return len(output_files(history or {}))
+
+
+async def _measure(
+    parse: Callable[[bytes, int], Awaitable[int]],
+    body: bytes,
+    chunk_size: int,
+    repeat: int,
+) -> dict[str, Any]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        files = await parse(body, chunk_size)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    await parse(body, chunk_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"parse_ms": round(best * 1000, 3), "peak_kib": peak // 1024, "files": files}
+
+
+async def run(
+    nodes: int, outputs: int, meta_bytes: int, chunk_size: int, repeat: int
+) -> dict[str, Any]:
+    """Time and trace both parsers on the same body, read in ``chunk_size`` pieces.
+
+    The full-body path buffers the response first, as ``response.json()``
+    does, so its peak includes the buffered body.
+    """
+    body = build_body(nodes, outputs, meta_bytes)
+    return {
+        "body_kib": len(body) // 1024,
+        "full": await _measure(_full, body, chunk_size, repeat),
+        "streaming": await _measure(_streaming, body, chunk_size, repeat),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=400)
+    parser.add_argument("--outputs", type=int, default=64)
+    parser.add_argument("--meta-bytes", type=int, default=2048)
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    result = asyncio.run(
+        run(args.nodes, args.outputs, args.meta_bytes, args.chunk_size, args.repeat)
+    )
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""Replay a recorded workload trace through the task handler.
+
+Traces come from COMFYUI_RECORD_FILE. Tasks are submitted at their
+recorded arrival offsets divided by ``--speed``. Against the fake server
+each prompt runs for its recorded execution time (also divided by the
+speed); with ``--base-url`` the recorded workflows are sent to a real
+ComfyUI, which needs a trace taken with COMFYUI_RECORD_PAYLOADS.
+
+Example::
+
+    uv run --group bench python -m benchmarks.replay trace.jsonl --speed 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Any
+
+from benchmarks.harness import (
+    TASK_ERRORS,
+    latency_summary,
+    request_counts,
+    start_fake_server,
+    task_handler,
+)
+from comfyui_worker.recorder import read_trace
+
+
+def recorded_summary(entries: list[dict[str, Any]], speed: float) -> dict[str, Any]:
+    """Throughput and latency the trace observed, scaled to ``speed``."""
+    completed = [entry for entry in entries if entry.get("ok")]
+    if not completed:
+        return {"tasks": len(entries), "tasks_per_sec": 0.0, **latency_summary([])}
+    start = entries[0]["t"]
+    end = max(entry["t"] + entry["total"] for entry in entries)
+    span = (end - start) / speed
+    return {
+        "tasks": len(entries),
+        "tasks_per_sec": round(len(completed) / span, 3) if span else 0.0,
+        **latency_summary([entry["total"] / speed for entry in completed]),
+    }
+
+
+def replay_payload(
+    entry: dict[str, Any], index: int, speed: float, fake: bool
+) -> dict[str, Any]:
+    """The workflow to submit for one trace entry."""
+    workflow = dict(entry.get("workflow") or {})
+    if not workflow and not fake:
+        raise ValueError("replaying against ComfyUI needs recorded workflows")
+    if fake:
+        seconds = (entry.get("execute") or 0.0) / speed
+        workflow["bench_sleep"] = {
+            "class_type": "BenchSleep",
+            "inputs": {"seconds": seconds, "index": index},
+        }
+    return workflow
+
+
+async def run_replay(
+    base_url: str,
+    entries: list[dict[str, Any]],
+    speed: float = 1.0,
+    fake: bool = True,
+    depth: int = 1,
+    concurrency: int = 64,
+    use_websocket: bool = True,
+) -> dict[str, Any]:
+    payloads = [
+        replay_payload(entry, index, speed, fake) for index, entry in enumerate(entries)
+    ]
+    async with task_handler(
+        base_url, depth=depth, use_websocket=use_websocket
+    ) as handle:
+        before = await request_counts(base_url)
+        latencies: list[float] = []
+        failures = 0
+        slots = asyncio.Semaphore(concurrency)
+        origin = entries[0]["t"] if entries else 0.0
+        wall_start = time.perf_counter()
+
+        async def one(entry: dict[str, Any], payload: dict[str, Any]) -> None:
+            nonlocal failures
+            offset = (entry["t"] - origin) / speed
+            await asyncio.sleep(max(0.0, wall_start + offset - time.perf_counter()))
+            async with slots:
+                start = time.perf_counter()
+                try:
+                    await handle(payload)
+                except TASK_ERRORS:
+                    failures += 1
+                    return
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*map(one, entries, payloads))
+        wall = time.perf_counter() - wall_start
+        after = await request_counts(base_url)
+
+    requests = {key: after.get(key, 0) - before.get(key, 0) for key in after}
+    return {
+        "tasks": len(entries),
+        "failures": failures,
+        "speed": speed,
+        "wall_sec": round(wall, 3),
+        "tasks_per_sec": round(len(latencies) / wall, 3) if wall else 0.0,
+        **latency_summary(latencies),
+        "http_requests_by_endpoint": requests,
+    }
+
+
+def compare_to_recorded(
+    replayed: dict[str, Any], recorded: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Describe every metric where the replay did worse than the recording."""
+    regressions = []
+    if replayed["tasks_per_sec"] < recorded["tasks_per_sec"] * (1 - tolerance):
+        regressions.append("tasks_per_sec")
+    for key in ("latency_p50_sec", "latency_p95_sec", "latency_p99_sec"):
+        if replayed[key] > recorded[key] * (1 + tolerance):
+            regressions.append(key)
+    return [f"{key}: {recorded[key]} -> {replayed[key]}" for key in regressions]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--base-url", help="replay against this ComfyUI instead")
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--no-websocket", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    entries = read_trace(args.trace)
+    if not entries:
+        parser.error("trace is empty")
+    process = None
+    base_url = args.base_url
+    if base_url is None:
+        process, base_url = start_fake_server(
+            execution="fixed:0",
+            queue_delay="fixed:0",
+            output_bytes=64 * 1024,
+            outputs_per_prompt=1,
+        )
+    try:
+        replayed = asyncio.run(
+            run_replay(
+                base_url,
+                entries,
+                speed=args.speed,
+                fake=process is not None,
+                depth=args.depth,
+                concurrency=args.concurrency,
+                use_websocket=not args.no_websocket,
+            )
+        )
+    finally:
+        if process is not None:
+            process.kill()
+
+    recorded = recorded_summary(entries, args.speed)
+    print(json.dumps({"recorded": recorded, "replayed": replayed}, indent=2))
+    regressions = compare_to_recorded(replayed, recorded, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
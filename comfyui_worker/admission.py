@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest execution time in the service-time average.
+_SERVICE_ALPHA = 0.2
+
+
+class AdmissionController:
+    """Decide when the worker may take another LittleHorse task.
+
+    Polling pauses while no ComfyUI backend is ``available``, so tasks stay
+    on the server instead of failing here. With ``target_wait`` set, the
+    number of tasks held at once follows AIMD: every finished prompt that
+    waited less than the target (locally for a slot plus in ComfyUI's queue)
+    raises the limit by ``1 / limit``, and one that waited longer cuts it by
+    ``backoff``, at most once per average execution time. With
+    ``wait_budget`` set, polling also pauses while the predicted wait for a
+    new task, the backlog on the least-loaded backend times the average
+    execution time, exceeds it, so work goes to less-loaded replicas.
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        wait_budget: float | None = None,
+        target_wait: float | None = None,
+        backlog: Callable[[], int] = lambda: 0,
+        available: Callable[[], bool] = lambda: True,
+        initial_limit: int | None = None,
+        min_limit: int = 1,
+        backoff: float = 0.5,
+        recheck_interval: float = 1.0,
+    ) -> None:
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("admission limits must satisfy 1 <= min <= max")
+        self._max_limit = max_limit
+        self._min_limit = min_limit
+        self._limit = float(min(max(initial_limit or max_limit, min_limit), max_limit))
+        self._wait_budget = wait_budget
+        self._target_wait = target_wait
+        self._backlog = backlog
+        self._available = available
+        self._backoff = backoff
+        self._recheck_interval = recheck_interval
+        self._changed = asyncio.Event()
+        self._decreased_at = 0.0
+        self._paused_since: float | None = None
+        self.service_time: float | None = None
+        self.in_use = 0
+        self.paused_sec = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def predicted_wait(self) -> float:
+        return self._backlog() * (self.service_time or 0.0)
+
+    def observe(self, wait: float, service: float | None) -> None:
+        """Feed back one finished prompt's wait and execution seconds."""
+        if service is not None:
+            if self.service_time is None:
+                self.service_time = service
+            else:
+                self.service_time += _SERVICE_ALPHA * (service - self.service_time)
+        if self._target_wait is None:
+            return
+        now = time.monotonic()
+        if wait > self._target_wait:
+            if now - self._decreased_at >= (self.service_time or 0.0):
+                self._limit = max(self._min_limit, self._limit * self._backoff)
+                self._decreased_at = now
+                logger.debug(
+                    "Admission limit decreased",
+                    extra={"limit": self.limit, "wait": round(wait, 3)},
+                )
+        else:
+            self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+        self._changed.set()
+
+    async def admit(self, stopped: Callable[[], bool] = lambda: False) -> None:
+        """Return once another task may be polled for, or once ``stopped()``."""
+        while not stopped() and (reason := self._blocked()) is not None:
+            if self._paused_since is None:
+                self._paused_since = time.monotonic()
+                logger.info(
+                    "Pausing task polling",
+                    extra={
+                        "reason": reason,
+                        "limit": self.limit,
+                        "in_use": self.in_use,
+                        "predicted_wait": round(self.predicted_wait(), 3),
+                    },
+                )
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), self._recheck_interval)
+            except TimeoutError:
+                pass
+        if self._paused_since is not None:
+            paused = time.monotonic() - self._paused_since
+            self.paused_sec += paused
+            self._paused_since = None
+            logger.info(
+                "Resuming task polling",
+                extra={"paused_sec": round(paused, 3), "limit": self.limit},
+            )
+
+    def _blocked(self) -> str | None:
+        if self.in_use >= self.limit:
+            return "limit"
+        if not self._available():
+            return "unavailable"
+        if self._wait_budget is not None and self.predicted_wait() > self._wait_budget:
+            return "wait_budget"
+        return None
+
+    def wake(self) -> None:
+        """Have paused pollers check again now."""
+        self._changed.set()
+
+    def started(self) -> None:
+        self.in_use += 1
+
+    def finished(self) -> None:
+        self.in_use -= 1
+        self._changed.set()
+
+
+class _AskForWork:
+    """Stands in for an LHConnection's ask-for-work semaphore.
+
+    The connection acquires it before every PollTask request, so holding it
+    back keeps tasks on the server for other workers to claim. Stopping the
+    connection releases it, which also ends a paused wait.
+    """
+
+    def __init__(self, controller: AdmissionController, connection: Any) -> None:
+        self._controller = controller
+        self._connection = connection
+        self._inner = connection._ask_for_work_semaphore
+
+    async def acquire(self) -> bool:
+        await self._controller.admit(lambda: not self._connection.running)
+        return await self._inner.acquire()
+
+    def release(self) -> None:
+        self._inner.release()
+        if not self._connection.running:
+            self._controller.wake()
+
+
+class _TaskSlots:
+    """Stands in for an LHConnection's schedule-task semaphore.
+
+    Acquired when a claimed task is scheduled and released when it has run,
+    so it counts the tasks the worker holds across all connections.
+    """
+
+    def __init__(self, controller: AdmissionController) -> None:
+        self._controller = controller
+
+    async def acquire(self) -> bool:
+        self._controller.started()
+        return True
+
+    def release(self) -> None:
+        self._controller.finished()
+
+
+class _GatedConnections(dict[str, Any]):
+    def __init__(self, controller: AdmissionController) -> None:
+        super().__init__()
+        self._controller = controller
+
+    def __setitem__(self, host: str, connection: Any) -> None:
+        _check_sdk(connection, _CONNECTION_ATTRIBUTES)
+        connection._ask_for_work_semaphore = _AskForWork(self._controller, connection)
+        connection._schedule_task_semaphore = _TaskSlots(self._controller)
+        super().__setitem__(host, connection)
+
+
+# LHTaskWorker and LHConnection internals the gate relies on; pyproject pins
+# littlehorse-client to the minor series they were checked against.
+_WORKER_ATTRIBUTES = ("_connections",)
+_CONNECTION_ATTRIBUTES = (
+    "running",
+    "_ask_for_work_semaphore",
+    "_schedule_task_semaphore",
+)
+
+
+def _check_sdk(target: Any, attributes: tuple[str, ...]) -> None:
+    missing = [name for name in attributes if not hasattr(target, name)]
+    if missing:
+        raise RuntimeError(
+            f"littlehorse-client {type(target).__name__} lacks {', '.join(missing)};"
+            " admission control does not support this SDK version"
+        )
+
+
+def gate_task_worker(worker: Any, controller: AdmissionController) -> None:
+    """Route a LittleHorse task worker's polling through ``controller``.
+
+    Connections are opened per LittleHorse server after the worker starts;
+    each one is gated as it is added. Call before the worker starts.
+    """
+    _check_sdk(worker, _WORKER_ATTRIBUTES)
+    worker._connections = _GatedConnections(controller)
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Any, Protocol
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# S3 rejects multipart parts smaller than 5 MiB, except the last one.
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class ArtifactSink(Protocol):
+    async def upload(
+        self, path: str, key: str, limit: asyncio.Semaphore
+    ) -> dict[str, Any]: ...
+
+
+class FileSink:
+    """Copy artifacts under a local directory, hashing while copying."""
+
+    def __init__(self, root: str, chunk_size: int = 1024 * 1024) -> None:
+        self._root = Path(root)
+        self._chunk_size = chunk_size
+
+    async def upload(
+        self, path: str, key: str, limit: asyncio.Semaphore
+    ) -> dict[str, Any]:
+        async with limit:
+            return await asyncio.to_thread(self._copy, path, key)
+
+    def _copy(self, path: str, key: str) -> dict[str, Any]:
+        target = self._root / key
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(target.name + ".part")
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as src, open(partial, "wb") as dst:
+            while chunk := src.read(self._chunk_size):
+                digest.update(chunk)
+                dst.write(chunk)
+                size += len(chunk)
+        os.replace(partial, target)
+        return {
+            "uri": target.resolve().as_uri(),
+            "size": size,
+            "sha256": digest.hexdigest(),
+        }
+
+
+class S3Sink:
+    """Upload artifacts to an S3-compatible bucket with multipart uploads.
+
+    The file is read once, part by part; each part updates the checksum and
+    is uploaded on a thread while the next one is read. ``limit`` bounds the
+    parts in flight across all files, which also bounds buffered memory.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        client: Any = None,
+        endpoint_url: str | None = None,
+        part_size: int = 8 * 1024 * 1024,
+    ) -> None:
+        if client is None:
+            try:
+                import boto3
+            except ImportError as exc:  # pragma: no cover - optional extra
+                raise RuntimeError(
+                    "s3:// artifact URIs need the s3 extra (boto3) installed"
+                ) from exc
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self._client = client
+        self._bucket = bucket
+        self._prefix = prefix.strip("/")
+        self._part_size = max(part_size, MIN_PART_SIZE)
+
+    async def upload(
+        self, path: str, key: str, limit: asyncio.Semaphore
+    ) -> dict[str, Any]:
+        key = f"{self._prefix}/{key}" if self._prefix else key
+        if await asyncio.to_thread(os.path.getsize, path) <= self._part_size:
+            async with limit:
+                body = await asyncio.to_thread(Path(path).read_bytes)
+                await asyncio.to_thread(
+                    self._client.put_object, Bucket=self._bucket, Key=key, Body=body
+                )
+            return self._artifact(key, len(body), hashlib.sha256(body).hexdigest())
+        return await self._multipart(path, key, limit)
+
+    async def _multipart(
+        self, path: str, key: str, limit: asyncio.Semaphore
+    ) -> dict[str, Any]:
+        upload = await asyncio.to_thread(
+            self._client.create_multipart_upload, Bucket=self._bucket, Key=key
+        )
+        upload_id = upload["UploadId"]
+        digest = hashlib.sha256()
+        size = 0
+        parts: list[asyncio.Task[dict[str, Any]]] = []
+        try:
+            # Opened, read and closed on a thread to keep disk I/O off the loop.
+            src = await asyncio.to_thread(open, path, "rb")
+            try:
+                number = 1
+                while True:
+                    # Wait for a free slot before reading, so at most ``limit``
+                    # parts are ever held in memory.
+                    await limit.acquire()
+                    chunk = await asyncio.to_thread(src.read, self._part_size)
+                    if not chunk:
+                        limit.release()
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    parts.append(
+                        asyncio.create_task(
+                            self._upload_part(key, upload_id, number, chunk, limit)
+                        )
+                    )
+                    number += 1
+            finally:
+                await asyncio.to_thread(src.close)
+            completed = await asyncio.gather(*parts)
+            await asyncio.to_thread(
+                self._client.complete_multipart_upload,
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": completed},
+            )
+        except BaseException:
+            for part in parts:
+                part.cancel()
+            await asyncio.gather(*parts, return_exceptions=True)
+            await asyncio.to_thread(
+                self._client.abort_multipart_upload,
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+            )
+            raise
+        return self._artifact(key, size, digest.hexdigest())
+
+    async def _upload_part(
+        self,
+        key: str,
+        upload_id: str,
+        number: int,
+        chunk: bytes,
+        limit: asyncio.Semaphore,
+    ) -> dict[str, Any]:
+        try:
+            response = await asyncio.to_thread(
+                self._client.upload_part,
+                Bucket=self._bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=number,
+                Body=chunk,
+            )
+        finally:
+            limit.release()
+        return {"ETag": response["ETag"], "PartNumber": number}
+
+    def _artifact(self, key: str, size: int, sha256: str) -> dict[str, Any]:
+        return {"uri": f"s3://{self._bucket}/{key}", "size": size, "sha256": sha256}
+
+
+class ArtifactUploader:
+    """Publish a prompt's output files to a sink, all files concurrently."""
+
+    def __init__(self, sink: ArtifactSink, concurrency: int = 4) -> None:
+        self._sink = sink
+        self._concurrency = concurrency
+
+    async def upload(
+        self, prompt_id: str, outputs: list[str], root: str | None = None
+    ) -> list[dict[str, Any]]:
+        """Upload ``outputs`` under ``<prompt_id>/``.
+
+        Files under ``root`` keep their path relative to it, subfolders
+        included, so same-named outputs do not overwrite each other.
+        """
+        limit = asyncio.Semaphore(self._concurrency)
+        artifacts = await asyncio.gather(
+            *(
+                self._sink.upload(path, _artifact_key(prompt_id, path, root), limit)
+                for path in outputs
+            )
+        )
+        for path, artifact in zip(outputs, artifacts):
+            artifact["filename"] = Path(path).name
+        logger.info(
+            "Uploaded output artifacts",
+            extra={
+                "prompt_id": prompt_id,
+                "artifact_count": len(artifacts),
+                "bytes": sum(artifact["size"] for artifact in artifacts),
+            },
+        )
+        return list(artifacts)
+
+
+def _artifact_key(prompt_id: str, path: str, root: str | None) -> str:
+    relative = Path(path)
+    if root is not None and relative.is_relative_to(root):
+        relative = relative.relative_to(root)
+    if relative.is_absolute() or ".." in relative.parts:
+        relative = Path(relative.name)
+    return f"{prompt_id}/{relative.as_posix()}"
+
+
+def build_sink(
+    uri: str,
+    endpoint_url: str | None = None,
+    part_size: int = 8 * 1024 * 1024,
+) -> ArtifactSink:
+    """Create a sink from ``file:///dir`` or ``s3://bucket/prefix``."""
+    parsed = urlparse(uri)
+    if parsed.scheme == "file":
+        return FileSink(parsed.path)
+    if parsed.scheme == "s3":
+        return S3Sink(
+            parsed.netloc,
+            prefix=parsed.path,
+            endpoint_url=endpoint_url,
+            part_size=part_size,
+        )
+    raise ValueError(f"unsupported artifact URI {uri!r}")
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from comfyui_worker.comfyui_client import ComfyUiClient
+
+logger = logging.getLogger(__name__)
+
+# Input subfolder the worker's content-addressed uploads live in.
+ASSET_SUBFOLDER = "lhw-assets"
+
+
+class AssetError(ValueError):
+    """Raised for asset references that cannot be fetched."""
+
+
+class Asset(NamedTuple):
+    sha256: str
+    filename: str
+    content: bytes
+
+    @property
+    def value(self) -> str:
+        """What a LoadImage node reads the uploaded asset back as."""
+        return f"{ASSET_SUBFOLDER}/{self.filename}"
+
+
+class AssetUploader:
+    """Fetch task input assets and upload each distinct one to ComfyUI once.
+
+    References are http(s) URLs or paths under ``root``. Uploads are named
+    by content hash, so an LRU index of the (backend, hash) pairs already
+    uploaded is enough to skip repeats; an entry that was evicted costs one
+    idempotent re-upload.
+    """
+
+    def __init__(
+        self,
+        root: str | None = None,
+        max_entries: int = 4096,
+        max_bytes: int = 64 * 1024**2,
+        concurrency: int = 4,
+        timeout: float = 30.0,
+    ) -> None:
+        self._root = Path(root).resolve() if root else None
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._limit = asyncio.Semaphore(concurrency)
+        self._http = httpx.AsyncClient(timeout=timeout, follow_redirects=True)
+        self._uploaded: OrderedDict[tuple[str, str], None] = OrderedDict()
+        self._pending: dict[tuple[str, str], asyncio.Future[None]] = {}
+        self.uploads = 0
+        self.reused = 0
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+    async def fetch(self, references: dict[str, str]) -> dict[str, Asset]:
+        """Fetch and hash every reference concurrently, keyed like ``references``."""
+        keys = list(references)
+        assets = await asyncio.gather(*(self._fetch(references[key]) for key in keys))
+        return dict(zip(keys, assets))
+
+    async def upload(self, client: ComfyUiClient, assets: Iterable[Asset]) -> None:
+        """Upload the assets ``client``'s ComfyUI has not received yet."""
+        distinct = {asset.sha256: asset for asset in assets}
+        await asyncio.gather(
+            *(self._upload(client, asset) for asset in distinct.values())
+        )
+
+    async def _upload(self, client: ComfyUiClient, asset: Asset) -> None:
+        key = (client.base_url, asset.sha256)
+        if key in self._uploaded:
+            self._uploaded.move_to_end(key)
+            self.reused += 1
+            return
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._store(client, asset, key))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        else:
+            self.reused += 1
+        await asyncio.shield(pending)
+
+    async def _store(
+        self, client: ComfyUiClient, asset: Asset, key: tuple[str, str]
+    ) -> None:
+        async with self._limit:
+            await client.upload_image(asset.content, asset.filename, ASSET_SUBFOLDER)
+        self.uploads += 1
+        self._uploaded[key] = None
+        while len(self._uploaded) > self._max_entries:
+            self._uploaded.popitem(last=False)
+        logger.debug(
+            "Uploaded input asset",
+            extra={"backend": key[0], "sha256": asset.sha256},
+        )
+
+    async def _fetch(self, reference: str) -> Asset:
+        parts = urlsplit(reference)
+        async with self._limit:
+            if parts.scheme in ("http", "https"):
+                content = await self._download(reference)
+            elif parts.scheme in ("", "file"):
+                path = parts.path if parts.scheme else reference
+                content = await asyncio.to_thread(self._read, path)
+            else:
+                raise AssetError(f"unsupported asset reference {reference!r}")
+        sha256 = hashlib.sha256(content).hexdigest()
+        suffix = Path(parts.path).suffix.lower() or ".png"
+        return Asset(sha256, f"{sha256}{suffix}", content)
+
+    async def _download(self, url: str) -> bytes:
+        chunks = []
+        size = 0
+        try:
+            async with self._http.stream("GET", url) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self._max_bytes:
+                        raise AssetError(
+                            f"asset {url} is larger than {self._max_bytes} bytes"
+                        )
+                    chunks.append(chunk)
+        except httpx.HTTPError as exc:
+            raise AssetError(f"could not fetch asset {url}: {exc}") from exc
+        return b"".join(chunks)
+
+    def _read(self, path: str) -> bytes:
+        if self._root is None:
+            raise AssetError("local asset paths are not enabled")
+        resolved = (self._root / path).resolve()
+        if not resolved.is_relative_to(self._root):
+            raise AssetError(f"asset path {path!r} is outside the asset root")
+        try:
+            if resolved.stat().st_size > self._max_bytes:
+                raise AssetError(
+                    f"asset {path!r} is larger than {self._max_bytes} bytes"
+                )
+            return resolved.read_bytes()
+        except OSError as exc:
+            raise AssetError(f"could not read asset {path!r}: {exc}") from exc
@@ -0,0 +1,254 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import httpx
+
+from comfyui_worker import tracing
+from comfyui_worker.comfyui_client import ComfyUiClient
+from comfyui_worker.events import ComfyUiEventListener
+from comfyui_worker.poller import QueuePoller, QueueSnapshot
+from comfyui_worker.scheduler import PromptScheduler
+
+logger = logging.getLogger(__name__)
+
+
+# Circuit breaker states of a backend.
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class NoHealthyBackendError(RuntimeError):
+    """Raised when every ComfyUI backend is out of rotation."""
+
+
+def is_backend_failure(exc: BaseException) -> bool:
+    """Return True for errors that say the backend is unwell, not the workflow."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return False
+
+
+class ComfyUiBackend:
+    """One ComfyUI instance together with its health and load state.
+
+    Health is a circuit breaker. ``failure_threshold`` consecutive failures
+    open it and take the backend out of rotation; the next successful health
+    probe half-opens it and puts it back, and the first workflow to finish
+    there either closes it again or, on failure, reopens it at once.
+    """
+
+    def __init__(
+        self,
+        client: ComfyUiClient,
+        output_dir: str,
+        events: ComfyUiEventListener | None = None,
+        scheduler: PromptScheduler | None = None,
+        poller: QueuePoller | None = None,
+        failure_threshold: int = 3,
+    ) -> None:
+        self.client = client
+        self.output_dir = output_dir
+        self.events = events
+        self.scheduler = scheduler
+        self.poller = poller
+        self._failure_threshold = failure_threshold
+        self._consecutive_failures = 0
+        self.state = CLOSED
+        self.opened = 0
+        self.assigned = 0
+        self.queue_depth = 0
+        self.vram_free = 0
+        self.refreshed_at: float | None = None
+
+    @property
+    def name(self) -> str:
+        return getattr(self.client, "base_url", "comfyui")
+
+    @property
+    def healthy(self) -> bool:
+        return self.state != OPEN
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            logger.info(
+                "ComfyUI backend back in rotation", extra={"backend": self.name}
+            )
+        self.state = CLOSED
+        self._consecutive_failures = 0
+
+    def record_probe(self) -> None:
+        """A health probe answered; an open circuit lets workflows try again."""
+        if self.state == OPEN:
+            logger.info(
+                "ComfyUI backend answering again, trying it",
+                extra={"backend": self.name},
+            )
+            self.state = HALF_OPEN
+        elif self.state == CLOSED:
+            self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self.state == HALF_OPEN or (
+            self.state == CLOSED
+            and self._consecutive_failures >= self._failure_threshold
+        ):
+            self.state = OPEN
+            self.opened += 1
+            logger.warning(
+                "ComfyUI backend removed from rotation",
+                extra={"backend": self.name},
+            )
+
+    @property
+    def last_model(self) -> str:
+        return self.scheduler.last_model if self.scheduler is not None else ""
+
+    def load(self, model: str = "") -> tuple[int, bool, int]:
+        """Sort key: fewest queued prompts, then models already loaded, then VRAM."""
+        swap = bool(model) and self.last_model != model
+        return (max(self.queue_depth, self.assigned), swap, -self.vram_free)
+
+    async def refresh(self, max_age: float = 0.0) -> None:
+        """Update cached queue depth and free VRAM from ComfyUI.
+
+        A queue snapshot the poller took within ``max_age`` seconds is reused
+        instead of fetching /queue again.
+        """
+        snapshot = self.poller.snapshot if self.poller is not None else None
+        try:
+            if snapshot is None or time.monotonic() - snapshot.fetched_at > max_age:
+                snapshot = QueueSnapshot(await self.client.get_queue())
+            stats = await self.client.get_system_stats()
+        except (httpx.RequestError, httpx.HTTPStatusError, ValueError) as exc:
+            self.record_failure()
+            logger.debug(
+                "ComfyUI backend refresh failed",
+                extra={"backend": self.name, "error": str(exc)},
+            )
+            return
+        self.queue_depth = snapshot.depth
+        self.vram_free = _free_vram(stats)
+        self.refreshed_at = time.monotonic()
+        self.record_probe()
+
+
+def _free_vram(stats: dict[str, Any]) -> int:
+    return sum(int(device.get("vram_free") or 0) for device in stats.get("devices", []))
+
+
+class BackendPool:
+    """Route each workflow to the least-loaded healthy ComfyUI backend."""
+
+    def __init__(
+        self,
+        backends: list[ComfyUiBackend],
+        refresh_interval: float = 2.0,
+    ) -> None:
+        if not backends:
+            raise ValueError("at least one ComfyUI backend is required")
+        self.backends = backends
+        self._refresh_interval = refresh_interval
+        self._task: asyncio.Task[None] | None = None
+        self._next = 0
+
+    def start(self) -> None:
+        """Refresh backend load and probe backend health in the background."""
+        if self._task is None:
+            self._task = tracing.background_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def health_check(self) -> bool:
+        """Return True once any backend answers; probes all of them."""
+        results = await asyncio.gather(
+            *(backend.client.health_check() for backend in self.backends)
+        )
+        for backend, ok in zip(self.backends, results):
+            if ok:
+                backend.record_success()
+        return any(results)
+
+    async def refresh(self) -> None:
+        await asyncio.gather(
+            *(backend.refresh(self._refresh_interval) for backend in self.backends)
+        )
+
+    def available(self) -> bool:
+        """False while every backend's circuit is open."""
+        return any(backend.healthy for backend in self.backends)
+
+    def backlog(self) -> int:
+        """Prompts ahead of a new one on the least-loaded healthy backend."""
+        healthy = [backend for backend in self.backends if backend.healthy]
+        return min(backend.load()[0] for backend in healthy or self.backends)
+
+    def select(self, model: str = "") -> ComfyUiBackend:
+        healthy = [backend for backend in self.backends if backend.healthy]
+        if not healthy:
+            # Fail fast instead of spending retries and timeouts on a
+            # backend the health monitor already knows is down.
+            raise NoHealthyBackendError("No healthy ComfyUI backend available")
+        if len(healthy) == 1:
+            return healthy[0]
+        # Rotate the starting point so ties are spread across backends.
+        start = self._next % len(healthy)
+        self._next += 1
+        ordered = healthy[start:] + healthy[:start]
+        return min(ordered, key=lambda backend: backend.load(model))
+
+    @asynccontextmanager
+    async def route(
+        self, model: str = "", prefer: str | None = None
+    ) -> AsyncIterator[ComfyUiBackend]:
+        """Pick a backend for one workflow and track its outcome.
+
+        ``prefer`` names a backend to use while it is healthy, such as the
+        one already running the workflow's prompt.
+        """
+        preferred = [
+            backend
+            for backend in self.backends
+            if backend.name == prefer and backend.healthy
+        ]
+        backend = preferred[0] if preferred else self.select(model)
+        backend.assigned += 1
+        logger.debug(
+            "Routed workflow to ComfyUI backend",
+            extra={"backend": backend.name, "load": backend.load(model)},
+        )
+        try:
+            yield backend
+        except Exception as exc:
+            if is_backend_failure(exc):
+                backend.record_failure()
+            raise
+        else:
+            backend.record_success()
+        finally:
+            backend.assigned -= 1
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception:
+                # A malformed /queue or /system_stats body must not end the
+                # loop: an open circuit only half-opens on a later probe.
+                logger.exception("ComfyUI backend refresh loop failed")
+            await asyncio.sleep(self._refresh_interval)
@@ -0,0 +1,139 @@
+import copy
+import json
+import logging
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class _Entry:
+    def __init__(self, result: dict[str, Any], size: int) -> None:
+        self.result = result
+        self.size = size
+
+
+class ResultCache:
+    """LRU cache of workflow results keyed by workflow hash.
+
+    Entries are only served while every output file still exists. Eviction
+    drops index entries by count and by the total size of the outputs they
+    reference; the files themselves belong to ComfyUI and are left in place.
+    Results whose outputs are missing or too large are not stored and are
+    counted in ``skipped``. With ``index_path`` set the index is rewritten after each change and
+    reloaded on start.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        index_path: str | None = None,
+    ) -> None:
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._index_path = Path(index_path) if index_path else None
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        if self._index_path is not None:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if not all(Path(path).is_file() for path in entry.result["outputs"]):
+            logger.info("Cached outputs missing, dropping entry", extra={"key": key})
+            self._remove(key)
+            self._save()
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry.result)
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        size = _output_size(result["outputs"])
+        if size is None or size > self._max_bytes:
+            self.skipped += 1
+            logger.info(
+                "Result not cached",
+                extra={
+                    "key": key,
+                    "reason": "outputs missing" if size is None else "too large",
+                },
+            )
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(copy.deepcopy(result), size)
+        self.total_bytes += size
+        self._evict()
+        self._save()
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+
+    def _evict(self) -> None:
+        while self._entries and (
+            len(self._entries) > self._max_entries or self.total_bytes > self._max_bytes
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
+            logger.debug("Evicted cached result", extra={"key": key})
+
+    def _load(self) -> None:
+        assert self._index_path is not None
+        try:
+            data = json.loads(self._index_path.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exc:
+            logger.warning(
+                "Ignoring unreadable result cache index",
+                extra={"path": str(self._index_path), "error": str(exc)},
+            )
+            return
+        for item in data.get("entries", []):
+            self._entries[item["key"]] = _Entry(item["result"], item["size"])
+            self.total_bytes += item["size"]
+        self._evict()
+        logger.info(
+            "Loaded result cache index",
+            extra={"entries": len(self._entries), "bytes": self.total_bytes},
+        )
+
+    def _save(self) -> None:
+        if self._index_path is None:
+            return
+        data = {
+            "entries": [
+                {"key": key, "result": entry.result, "size": entry.size}
+                for key, entry in self._entries.items()
+            ]
+        }
+        # Write then rename so a crash never leaves a truncated index.
+        tmp_path = self._index_path.with_suffix(self._index_path.suffix + ".tmp")
+        tmp_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(json.dumps(data))
+        os.replace(tmp_path, self._index_path)
+
+
+def _output_size(outputs: list[str]) -> int | None:
+    total = 0
+    for path in outputs:
+        try:
+            total += os.stat(path).st_size
+        except OSError:
+            return None
+    return total
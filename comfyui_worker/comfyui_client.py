@@ -1,24 +1,70 @@
+import asyncio
 import logging
-from typing import Any
+import os
+import time
+from pathlib import Path
+from typing import Any, Self
 
 import httpx
 
+from comfyui_worker import metrics
+from comfyui_worker.history import (
+    HistoryRecord,
+    parse_history,
+    parse_history_batch,
+)
+from comfyui_worker.tracing import TracingTransport
+
 logger = logging.getLogger(__name__)
 
 
 class ComfyUiClient:
-    def __init__(self, base_url: str, timeout: float, retries: int) -> None:
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float,
+        retries: int,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 5,
+        keepalive_expiry: float = 30.0,
+        client_id: str | None = None,
+    ) -> None:
         self._base_url = base_url.rstrip("/")
         self._timeout = timeout
         self._retries = retries
+        self._client_id = client_id
+        self._http = httpx.AsyncClient(
+            base_url=self._base_url,
+            timeout=timeout,
+            transport=TracingTransport(
+                httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_keepalive_connections,
+                        keepalive_expiry=keepalive_expiry,
+                    )
+                )
+            ),
+            event_hooks={
+                "request": [_mark_request_start],
+                "response": [_observe_response],
+            },
+        )
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
 
-    def health_check(self) -> bool:
+    async def aclose(self) -> None:
+        """Close the pooled HTTP connections."""
+        await self._http.aclose()
+
+    async def health_check(self) -> bool:
         """Return True if ComfyUI /queue endpoint responds successfully."""
         try:
-            response = httpx.get(
-                f"{self._base_url}/queue",
-                timeout=self._timeout,
-            )
+            response = await self._http.get("/queue")
             response.raise_for_status()
             logger.debug("ComfyUI health check passed")
             return True
@@ -29,36 +75,112 @@ class ComfyUiClient:
             )
             return False
 
-    def is_in_queue(self, prompt_id: str) -> bool:
+    async def get_queue(self) -> dict[str, Any]:
         for attempt in range(self._retries + 1):
             try:
-                response = httpx.get(
-                    f"{self._base_url}/queue",
-                    timeout=self._timeout,
-                )
+                response = await self._http.get("/queue")
                 response.raise_for_status()
-                payload = response.json()
-                running = {item[0] for item in payload.get("queue_running", [])}
-                pending = {item[0] for item in payload.get("queue_pending", [])}
-                in_queue = prompt_id in running or prompt_id in pending
-                logger.debug(
-                    "Checked ComfyUI queue",
-                    extra={"prompt_id": prompt_id, "in_queue": in_queue},
-                )
-                return in_queue
+                return response.json()
             except httpx.RequestError:
                 if attempt >= self._retries:
+                    metrics.HTTP_ERRORS.labels("/queue").inc()
                     raise
-        return False
+                metrics.HTTP_RETRIES.labels("/queue").inc()
+            except httpx.HTTPStatusError:
+                metrics.HTTP_ERRORS.labels("/queue").inc()
+                raise
+        raise RuntimeError("unreachable")
+
+    async def is_in_queue(self, prompt_id: str) -> bool:
+        payload = await self.get_queue()
+        running = {item[0] for item in payload.get("queue_running", [])}
+        pending = {item[0] for item in payload.get("queue_pending", [])}
+        in_queue = prompt_id in running or prompt_id in pending
+        logger.debug(
+            "Checked ComfyUI queue",
+            extra={"prompt_id": prompt_id, "in_queue": in_queue},
+        )
+        return in_queue
+
+    async def delete_from_queue(self, prompt_ids: list[str]) -> None:
+        """Remove pending prompts; ids that already started are ignored."""
+        await self._post_control("/queue", {"delete": prompt_ids})
+        logger.info("Deleted ComfyUI prompts", extra={"prompt_ids": prompt_ids})
+
+    async def interrupt(self, prompt_id: str) -> None:
+        """Interrupt the running prompt.
+
+        ComfyUI versions that accept a prompt_id only interrupt that prompt;
+        older ones interrupt whatever is running.
+        """
+        await self._post_control("/interrupt", {"prompt_id": prompt_id})
+        logger.info("Interrupted ComfyUI prompt", extra={"prompt_id": prompt_id})
 
-    def submit_prompt(self, workflow: dict[str, Any]) -> str:
+    async def _post_control(self, path: str, body: dict[str, Any]) -> None:
         for attempt in range(self._retries + 1):
             try:
-                response = httpx.post(
-                    f"{self._base_url}/prompt",
-                    json={"prompt": workflow},
-                    timeout=self._timeout,
-                )
+                response = await self._http.post(path, json=body)
+                response.raise_for_status()
+                return
+            except httpx.RequestError:
+                if attempt >= self._retries:
+                    metrics.HTTP_ERRORS.labels(path).inc()
+                    raise
+                metrics.HTTP_RETRIES.labels(path).inc()
+            except httpx.HTTPStatusError:
+                metrics.HTTP_ERRORS.labels(path).inc()
+                raise
+
+    async def get_history_batch(self, max_items: int) -> dict[str, HistoryRecord]:
+        """Return the most recent history entries keyed by prompt_id.
+
+        Parsed as the body streams in, keeping only outputs and status.
+        """
+        for attempt in range(self._retries + 1):
+            try:
+                async with self._http.stream(
+                    "GET", "/history", params={"max_items": max_items}
+                ) as response:
+                    response.raise_for_status()
+                    return await parse_history_batch(response.aiter_bytes())
+            except httpx.RequestError:
+                if attempt >= self._retries:
+                    metrics.HTTP_ERRORS.labels("/history").inc()
+                    raise
+                metrics.HTTP_RETRIES.labels("/history").inc()
+            except httpx.HTTPStatusError:
+                metrics.HTTP_ERRORS.labels("/history").inc()
+                raise
+        raise RuntimeError("unreachable")
+
+    async def get_system_stats(self) -> dict[str, Any]:
+        try:
+            response = await self._http.get("/system_stats")
+            response.raise_for_status()
+        except httpx.HTTPError:
+            metrics.HTTP_ERRORS.labels("/system_stats").inc()
+            raise
+        return response.json()
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    @property
+    def client_id(self) -> str | None:
+        return self._client_id
+
+    async def submit_prompt(self, workflow: dict[str, Any], front: bool = False) -> str:
+        """Queue a prompt; ``front`` puts it ahead of ComfyUI's pending queue."""
+        body: dict[str, Any] = {"prompt": workflow}
+        if self._client_id:
+            # Routes execution events for this prompt to our /ws subscriber.
+            body["client_id"] = self._client_id
+        if front:
+            body["front"] = True
+        for attempt in range(self._retries + 1):
+            try:
+                response = await self._http.post("/prompt", json=body)
                 response.raise_for_status()
                 payload = response.json()
                 prompt_id = payload.get("prompt_id")
@@ -71,24 +193,58 @@ class ComfyUiClient:
                 return prompt_id
             except httpx.RequestError:
                 if attempt >= self._retries:
+                    metrics.HTTP_ERRORS.labels("/prompt").inc()
                     raise
+                metrics.HTTP_RETRIES.labels("/prompt").inc()
             except httpx.HTTPStatusError as exc:
                 status = exc.response.status_code
                 if status >= 500 and attempt < self._retries:
+                    metrics.HTTP_RETRIES.labels("/prompt").inc()
                     continue
+                metrics.HTTP_ERRORS.labels("/prompt").inc()
                 raise
         raise RuntimeError("unreachable")
 
-    def get_history(self, prompt_id: str) -> dict[str, Any] | None:
+    async def upload_image(
+        self, content: bytes, filename: str, subfolder: str = ""
+    ) -> str:
+        """Store an input image through /upload/image, replacing any same-named file.
+
+        Returns the value a LoadImage node takes to read it back.
+        """
+        files = {"image": (filename, content)}
+        data = {"type": "input", "overwrite": "true", "subfolder": subfolder}
         for attempt in range(self._retries + 1):
             try:
-                response = httpx.get(
-                    f"{self._base_url}/history/{prompt_id}",
-                    timeout=self._timeout,
+                response = await self._http.post(
+                    "/upload/image", files=files, data=data
                 )
                 response.raise_for_status()
                 payload = response.json()
-                history = payload.get(prompt_id)
+                name = payload.get("name")
+                if not name:
+                    raise ValueError("ComfyUI upload response missing name")
+                folder = payload.get("subfolder") or ""
+                return f"{folder}/{name}" if folder else name
+            except httpx.RequestError:
+                if attempt >= self._retries:
+                    metrics.HTTP_ERRORS.labels("/upload").inc()
+                    raise
+                metrics.HTTP_RETRIES.labels("/upload").inc()
+            except httpx.HTTPStatusError:
+                metrics.HTTP_ERRORS.labels("/upload").inc()
+                raise
+        raise RuntimeError("unreachable")
+
+    async def get_history(self, prompt_id: str) -> HistoryRecord | None:
+        """Return the outputs and status of one prompt, parsed as they stream in."""
+        for attempt in range(self._retries + 1):
+            try:
+                async with self._http.stream(
+                    "GET", f"/history/{prompt_id}"
+                ) as response:
+                    response.raise_for_status()
+                    history = await parse_history(response.aiter_bytes(), prompt_id)
                 if history is None:
                     logger.debug(
                         "History not yet available",
@@ -102,5 +258,69 @@ class ComfyUiClient:
                 return history
             except httpx.RequestError:
                 if attempt >= self._retries:
+                    metrics.HTTP_ERRORS.labels("/history").inc()
                     raise
+                metrics.HTTP_RETRIES.labels("/history").inc()
+            except httpx.HTTPStatusError:
+                metrics.HTTP_ERRORS.labels("/history").inc()
+                raise
         return None
+
+    async def download_output(
+        self,
+        filename: str,
+        subfolder: str,
+        folder_type: str,
+        destination: Path,
+        chunk_size: int = 256 * 1024,
+    ) -> int:
+        """Stream one output file from /view to ``destination``.
+
+        Chunks are written on a thread as they arrive, so neither memory use
+        nor the event loop is held up by the file size. Returns the number
+        of bytes written.
+        """
+        params = {"filename": filename, "subfolder": subfolder, "type": folder_type}
+        partial = destination.with_name(destination.name + ".part")
+        await asyncio.to_thread(destination.parent.mkdir, parents=True, exist_ok=True)
+        for attempt in range(self._retries + 1):
+            try:
+                size = 0
+                async with self._http.stream("GET", "/view", params=params) as response:
+                    response.raise_for_status()
+                    file = await asyncio.to_thread(open, partial, "wb")
+                    try:
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            await asyncio.to_thread(file.write, chunk)
+                            size += len(chunk)
+                    finally:
+                        await asyncio.to_thread(file.close)
+                await asyncio.to_thread(os.replace, partial, destination)
+                logger.debug(
+                    "Downloaded output",
+                    extra={"output_file": filename, "bytes": size},
+                )
+                return size
+            except httpx.RequestError:
+                if attempt >= self._retries:
+                    metrics.HTTP_ERRORS.labels("/view").inc()
+                    partial.unlink(missing_ok=True)
+                    raise
+                metrics.HTTP_RETRIES.labels("/view").inc()
+            except httpx.HTTPStatusError:
+                metrics.HTTP_ERRORS.labels("/view").inc()
+                partial.unlink(missing_ok=True)
+                raise
+        raise RuntimeError("unreachable")
+
+
+async def _mark_request_start(request: httpx.Request) -> None:
+    request.extensions["comfyui_started_at"] = time.perf_counter()
+
+
+async def _observe_response(response: httpx.Response) -> None:
+    started_at = response.request.extensions.get("comfyui_started_at")
+    if started_at is not None:
+        metrics.HTTP_REQUEST_SECONDS.labels(
+            metrics.endpoint(response.request.url.path), str(response.status_code)
+        ).observe(time.perf_counter() - started_at)
@@ -1,20 +1,104 @@
 import logging
 import os
+import socket
+import uuid
+from typing import Literal
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 logger = logging.getLogger(__name__)
 
 
+def default_client_id() -> str:
+    """A ComfyUI client id that survives restarts of the worker on this host.
+
+    ComfyUI routes a prompt's execution events to the client id it was
+    submitted with, so a restarted worker keeps receiving them.
+    """
+    return uuid.uuid5(uuid.NAMESPACE_DNS, socket.gethostname()).hex
+
+
 class Settings(BaseModel):
     comfyui_base_url: str = Field(..., min_length=1)
     comfyui_output_dir: str = Field(..., min_length=1)
+    comfyui_output_mode: Literal["path", "fetch"] = "path"
     comfyui_poll_interval_sec: int = Field(default=2, ge=1)
+    comfyui_poll_min_interval_sec: float = Field(default=0.25, gt=0)
+    comfyui_poll_backoff: float = Field(default=1.5, ge=1)
+    comfyui_poll_jitter: float = Field(default=0.1, ge=0, lt=1)
     comfyui_history_timeout_sec: int = Field(default=600, ge=1)
     comfyui_http_timeout_sec: float = Field(default=30.0, gt=0)
     comfyui_http_retries: int = Field(default=3, ge=0)
+    comfyui_http_max_connections: int = Field(default=10, ge=1)
+    comfyui_http_max_keepalive_connections: int = Field(default=5, ge=0)
+    comfyui_http_keepalive_expiry_sec: float = Field(default=30.0, ge=0)
     comfyui_health_check_interval_sec: int = Field(default=2, ge=1)
     comfyui_health_check_timeout_sec: int = Field(default=120, ge=1)
+    comfyui_in_flight_depth: int = Field(default=1, ge=1)
+    comfyui_affinity_max_wait_sec: float = Field(default=30.0, ge=0)
+    comfyui_priority_aging_sec: float = Field(default=30.0, ge=0)
+    comfyui_admission_wait_budget_sec: float | None = Field(default=None, gt=0)
+    comfyui_admission_target_wait_sec: float = Field(default=10.0, gt=0)
+    comfyui_backend_refresh_interval_sec: float = Field(default=2.0, gt=0)
+    comfyui_backend_failure_threshold: int = Field(default=3, ge=1)
+    comfyui_pause_when_unavailable: bool = False
+    comfyui_use_websocket: bool = True
+    comfyui_cache_max_entries: int = Field(default=1024, ge=0)
+    comfyui_cache_max_bytes: int = Field(default=10 * 1024**3, ge=0)
+    comfyui_cache_index_path: str | None = None
+    comfyui_template_dir: str | None = None
+    comfyui_template_reload_interval_sec: float = Field(default=2.0, ge=0)
+    comfyui_artifact_uri: str | None = None
+    comfyui_artifact_concurrency: int = Field(default=4, ge=1)
+    comfyui_artifact_part_size: int = Field(default=8 * 1024**2, ge=5 * 1024**2)
+    comfyui_s3_endpoint_url: str | None = None
+    comfyui_asset_root: str | None = None
+    comfyui_asset_cache_entries: int = Field(default=4096, ge=0)
+    comfyui_asset_max_bytes: int = Field(default=64 * 1024**2, ge=1)
+    comfyui_metrics_port: int | None = Field(default=None, ge=1, le=65535)
+    comfyui_trace_otlp_endpoint: str | None = None
+    comfyui_trace_file: str | None = None
+    comfyui_trace_sample_rate: float = Field(default=1.0, ge=0, le=1)
+    comfyui_record_file: str | None = None
+    comfyui_record_payloads: bool = False
+    comfyui_journal_path: str | None = None
+    comfyui_client_id: str = Field(default_factory=default_client_id, min_length=1)
+
+    @property
+    def comfyui_base_urls(self) -> list[str]:
+        """Backends from the comma-separated COMFYUI_BASE_URL."""
+        return _split_list(self.comfyui_base_url)
+
+    @property
+    def comfyui_output_dirs(self) -> list[str]:
+        """Output directory per backend; a single directory is shared."""
+        dirs = _split_list(self.comfyui_output_dir)
+        if len(dirs) == 1:
+            return dirs * len(self.comfyui_base_urls)
+        return dirs
+
+    @model_validator(mode="after")
+    def _check_backend_lists(self) -> "Settings":
+        urls = _split_list(self.comfyui_base_url)
+        dirs = _split_list(self.comfyui_output_dir)
+        if not urls:
+            raise ValueError("COMFYUI_BASE_URL must list at least one backend")
+        if len(dirs) not in (1, len(urls)):
+            raise ValueError(
+                "COMFYUI_OUTPUT_DIR must be one directory or one per backend"
+            )
+        return self
+
+
+def _split_list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
 
 
 def load_settings() -> Settings:
@@ -27,18 +111,89 @@ def load_settings() -> Settings:
     settings = Settings(
         comfyui_base_url=base_url,
         comfyui_output_dir=output_dir,
+        comfyui_output_mode=os.getenv("COMFYUI_OUTPUT_MODE", "path"),
         comfyui_poll_interval_sec=int(os.getenv("COMFYUI_POLL_INTERVAL_SEC", "2")),
+        comfyui_poll_min_interval_sec=float(
+            os.getenv("COMFYUI_POLL_MIN_INTERVAL_SEC", "0.25")
+        ),
+        comfyui_poll_backoff=float(os.getenv("COMFYUI_POLL_BACKOFF", "1.5")),
+        comfyui_poll_jitter=float(os.getenv("COMFYUI_POLL_JITTER", "0.1")),
         comfyui_history_timeout_sec=int(
             os.getenv("COMFYUI_HISTORY_TIMEOUT_SEC", "600")
         ),
         comfyui_http_timeout_sec=float(os.getenv("COMFYUI_HTTP_TIMEOUT_SEC", "30.0")),
         comfyui_http_retries=int(os.getenv("COMFYUI_HTTP_RETRIES", "3")),
+        comfyui_http_max_connections=int(
+            os.getenv("COMFYUI_HTTP_MAX_CONNECTIONS", "10")
+        ),
+        comfyui_http_max_keepalive_connections=int(
+            os.getenv("COMFYUI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "5")
+        ),
+        comfyui_http_keepalive_expiry_sec=float(
+            os.getenv("COMFYUI_HTTP_KEEPALIVE_EXPIRY_SEC", "30.0")
+        ),
         comfyui_health_check_interval_sec=int(
             os.getenv("COMFYUI_HEALTH_CHECK_INTERVAL_SEC", "2")
         ),
         comfyui_health_check_timeout_sec=int(
             os.getenv("COMFYUI_HEALTH_CHECK_TIMEOUT_SEC", "120")
         ),
+        comfyui_in_flight_depth=int(os.getenv("COMFYUI_IN_FLIGHT_DEPTH", "1")),
+        comfyui_affinity_max_wait_sec=float(
+            os.getenv("COMFYUI_AFFINITY_MAX_WAIT_SEC", "30.0")
+        ),
+        comfyui_priority_aging_sec=float(
+            os.getenv("COMFYUI_PRIORITY_AGING_SEC", "30.0")
+        ),
+        comfyui_admission_wait_budget_sec=float(
+            os.getenv("COMFYUI_ADMISSION_WAIT_BUDGET_SEC") or 0
+        )
+        or None,
+        comfyui_admission_target_wait_sec=float(
+            os.getenv("COMFYUI_ADMISSION_TARGET_WAIT_SEC", "10.0")
+        ),
+        comfyui_backend_refresh_interval_sec=float(
+            os.getenv("COMFYUI_BACKEND_REFRESH_INTERVAL_SEC", "2.0")
+        ),
+        comfyui_backend_failure_threshold=int(
+            os.getenv("COMFYUI_BACKEND_FAILURE_THRESHOLD", "3")
+        ),
+        comfyui_pause_when_unavailable=_env_bool(
+            "COMFYUI_PAUSE_WHEN_UNAVAILABLE", False
+        ),
+        comfyui_use_websocket=_env_bool("COMFYUI_USE_WEBSOCKET", True),
+        comfyui_cache_max_entries=int(os.getenv("COMFYUI_CACHE_MAX_ENTRIES", "1024")),
+        comfyui_cache_max_bytes=int(
+            os.getenv("COMFYUI_CACHE_MAX_BYTES", str(10 * 1024**3))
+        ),
+        comfyui_cache_index_path=os.getenv("COMFYUI_CACHE_INDEX_PATH") or None,
+        comfyui_template_dir=os.getenv("COMFYUI_TEMPLATE_DIR") or None,
+        comfyui_template_reload_interval_sec=float(
+            os.getenv("COMFYUI_TEMPLATE_RELOAD_INTERVAL_SEC", "2.0")
+        ),
+        comfyui_artifact_uri=os.getenv("COMFYUI_ARTIFACT_URI") or None,
+        comfyui_artifact_concurrency=int(
+            os.getenv("COMFYUI_ARTIFACT_CONCURRENCY", "4")
+        ),
+        comfyui_artifact_part_size=int(
+            os.getenv("COMFYUI_ARTIFACT_PART_SIZE", str(8 * 1024**2))
+        ),
+        comfyui_s3_endpoint_url=os.getenv("COMFYUI_S3_ENDPOINT_URL") or None,
+        comfyui_asset_root=os.getenv("COMFYUI_ASSET_ROOT") or None,
+        comfyui_asset_cache_entries=int(
+            os.getenv("COMFYUI_ASSET_CACHE_ENTRIES", "4096")
+        ),
+        comfyui_asset_max_bytes=int(
+            os.getenv("COMFYUI_ASSET_MAX_BYTES", str(64 * 1024**2))
+        ),
+        comfyui_metrics_port=int(os.getenv("COMFYUI_METRICS_PORT") or 0) or None,
+        comfyui_trace_otlp_endpoint=os.getenv("COMFYUI_TRACE_OTLP_ENDPOINT") or None,
+        comfyui_trace_file=os.getenv("COMFYUI_TRACE_FILE") or None,
+        comfyui_trace_sample_rate=float(os.getenv("COMFYUI_TRACE_SAMPLE_RATE", "1.0")),
+        comfyui_record_file=os.getenv("COMFYUI_RECORD_FILE") or None,
+        comfyui_record_payloads=_env_bool("COMFYUI_RECORD_PAYLOADS", False),
+        comfyui_journal_path=os.getenv("COMFYUI_JOURNAL_PATH") or None,
+        comfyui_client_id=os.getenv("COMFYUI_CLIENT_ID") or default_client_id(),
     )
 
     logger.info(
@@ -46,12 +201,55 @@ def load_settings() -> Settings:
         extra={
             "comfyui_base_url": settings.comfyui_base_url,
             "comfyui_output_dir": settings.comfyui_output_dir,
+            "output_mode": settings.comfyui_output_mode,
             "poll_interval_sec": settings.comfyui_poll_interval_sec,
+            "poll_min_interval_sec": settings.comfyui_poll_min_interval_sec,
+            "poll_backoff": settings.comfyui_poll_backoff,
+            "poll_jitter": settings.comfyui_poll_jitter,
             "history_timeout_sec": settings.comfyui_history_timeout_sec,
             "http_timeout_sec": settings.comfyui_http_timeout_sec,
             "http_retries": settings.comfyui_http_retries,
+            "http_max_connections": settings.comfyui_http_max_connections,
+            "http_max_keepalive_connections": (
+                settings.comfyui_http_max_keepalive_connections
+            ),
+            "http_keepalive_expiry_sec": settings.comfyui_http_keepalive_expiry_sec,
             "health_check_interval_sec": settings.comfyui_health_check_interval_sec,
             "health_check_timeout_sec": settings.comfyui_health_check_timeout_sec,
+            "in_flight_depth": settings.comfyui_in_flight_depth,
+            "affinity_max_wait_sec": settings.comfyui_affinity_max_wait_sec,
+            "priority_aging_sec": settings.comfyui_priority_aging_sec,
+            "admission_wait_budget_sec": settings.comfyui_admission_wait_budget_sec,
+            "admission_target_wait_sec": settings.comfyui_admission_target_wait_sec,
+            "backend_count": len(settings.comfyui_base_urls),
+            "backend_refresh_interval_sec": (
+                settings.comfyui_backend_refresh_interval_sec
+            ),
+            "backend_failure_threshold": settings.comfyui_backend_failure_threshold,
+            "pause_when_unavailable": settings.comfyui_pause_when_unavailable,
+            "use_websocket": settings.comfyui_use_websocket,
+            "cache_max_entries": settings.comfyui_cache_max_entries,
+            "cache_max_bytes": settings.comfyui_cache_max_bytes,
+            "cache_index_path": settings.comfyui_cache_index_path,
+            "template_dir": settings.comfyui_template_dir,
+            "template_reload_interval_sec": (
+                settings.comfyui_template_reload_interval_sec
+            ),
+            "artifact_uri": settings.comfyui_artifact_uri,
+            "artifact_concurrency": settings.comfyui_artifact_concurrency,
+            "artifact_part_size": settings.comfyui_artifact_part_size,
+            "s3_endpoint_url": settings.comfyui_s3_endpoint_url,
+            "asset_root": settings.comfyui_asset_root,
+            "asset_cache_entries": settings.comfyui_asset_cache_entries,
+            "asset_max_bytes": settings.comfyui_asset_max_bytes,
+            "metrics_port": settings.comfyui_metrics_port,
+            "trace_otlp_endpoint": settings.comfyui_trace_otlp_endpoint,
+            "trace_file": settings.comfyui_trace_file,
+            "trace_sample_rate": settings.comfyui_trace_sample_rate,
+            "record_file": settings.comfyui_record_file,
+            "record_payloads": settings.comfyui_record_payloads,
+            "journal_path": settings.comfyui_journal_path,
+            "client_id": settings.comfyui_client_id,
         },
     )
 
@@ -0,0 +1,200 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+from comfyui_worker import tracing
+
+logger = logging.getLogger(__name__)
+
+# Completed prompts remembered for waiters registered after the event arrived.
+_FINISHED_CACHE_SIZE = 1024
+
+
+class ComfyUiExecutionError(RuntimeError):
+    """Raised when ComfyUI reports a prompt failed or was interrupted."""
+
+
+class ComfyUiEventStreamClosed(ConnectionError):
+    """Raised to waiters when the websocket drops before their prompt finished."""
+
+
+def websocket_url(base_url: str, client_id: str) -> str:
+    url = base_url.rstrip("/")
+    if url.startswith("https://"):
+        url = "wss://" + url[len("https://") :]
+    elif url.startswith("http://"):
+        url = "ws://" + url[len("http://") :]
+    return f"{url}/ws?clientId={client_id}"
+
+
+class ComfyUiEventListener:
+    """Subscribe to ComfyUI's /ws stream and resolve one waiter per prompt_id."""
+
+    def __init__(
+        self,
+        base_url: str,
+        client_id: str,
+        reconnect_interval: float = 2.0,
+    ) -> None:
+        self._url = websocket_url(base_url, client_id)
+        self._reconnect_interval = reconnect_interval
+        self._waiters: dict[str, asyncio.Future[None]] = {}
+        self._errors: dict[str, str] = {}
+        self._finished: OrderedDict[str, str | None] = OrderedDict()
+        self._started: OrderedDict[str, float] = OrderedDict()
+        self._connected = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = tracing.background_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._disconnected()
+
+    async def wait_connected(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    async def wait_for_completion(self, prompt_id: str, timeout: float) -> None:
+        """Wait until ComfyUI reports prompt_id finished and its history is stored.
+
+        Raises ComfyUiExecutionError if the prompt failed, and
+        ComfyUiEventStreamClosed if the socket drops first.
+        """
+        if prompt_id in self._finished:
+            self._raise_for_error(prompt_id, self._finished[prompt_id])
+            return
+        if not self.connected:
+            raise ComfyUiEventStreamClosed("ComfyUI event stream not connected")
+        waiter = self._waiters.get(prompt_id)
+        if waiter is None:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[prompt_id] = waiter
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        finally:
+            if self._waiters.get(prompt_id) is waiter:
+                del self._waiters[prompt_id]
+
+    def running_for(self, prompt_id: str) -> float | None:
+        """Seconds since ComfyUI reported prompt_id started executing."""
+        started = self._started.get(prompt_id)
+        return None if started is None else time.monotonic() - started
+
+    def _raise_for_error(self, prompt_id: str, error: str | None) -> None:
+        if error is not None:
+            raise _execution_error(prompt_id, error)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with connect(self._url, max_size=None) as websocket:
+                    self._connected.set()
+                    logger.info("ComfyUI event stream connected")
+                    async for message in websocket:
+                        if isinstance(message, str):
+                            self._handle_message(message)
+            except (OSError, WebSocketException) as exc:
+                logger.warning(
+                    "ComfyUI event stream unavailable",
+                    extra={"error": str(exc)},
+                )
+            self._disconnected()
+            await asyncio.sleep(self._reconnect_interval)
+
+    def _disconnected(self) -> None:
+        if self._connected.is_set():
+            logger.info("ComfyUI event stream disconnected")
+        self._connected.clear()
+        waiters, self._waiters = self._waiters, {}
+        for waiter in waiters.values():
+            if not waiter.done():
+                waiter.set_exception(
+                    ComfyUiEventStreamClosed("ComfyUI event stream closed")
+                )
+                # Mark retrieved so an abandoned waiter does not warn on GC.
+                waiter.exception()
+
+    def _handle_message(self, message: str) -> None:
+        try:
+            event = json.loads(message)
+        except json.JSONDecodeError:
+            logger.debug("Ignoring malformed ComfyUI event")
+            return
+        event_type = event.get("type")
+        data: dict[str, Any] = event.get("data") or {}
+        prompt_id = data.get("prompt_id")
+        if not prompt_id:
+            return
+
+        if event_type == "execution_start":
+            self._started[prompt_id] = time.monotonic()
+            while len(self._started) > _FINISHED_CACHE_SIZE:
+                self._started.popitem(last=False)
+        elif event_type == "execution_error":
+            self._errors[prompt_id] = str(
+                data.get("exception_message") or "execution error"
+            )
+        elif event_type == "execution_interrupted":
+            self._errors[prompt_id] = "execution interrupted"
+        elif event_type == "executed":
+            logger.debug(
+                "ComfyUI node executed",
+                extra={"prompt_id": prompt_id, "node": data.get("node")},
+            )
+        elif event_type == "execution_success" or (
+            event_type == "executing" and data.get("node") is None
+        ):
+            # Older ComfyUI only sends executing/node=None after storing
+            # history; newer versions end with execution_success, which may
+            # arrive just before the history is stored. Waiters treat missing
+            # history as not there yet, so either event completes the prompt.
+            self._finish(prompt_id, self._errors.pop(prompt_id, None))
+
+    def _finish(self, prompt_id: str, error: str | None) -> None:
+        if prompt_id in self._finished:
+            # execution_success followed by executing/node=None.
+            return
+        logger.debug(
+            "ComfyUI prompt finished",
+            extra={"prompt_id": prompt_id, "error": error},
+        )
+        self._started.pop(prompt_id, None)
+        self._finished[prompt_id] = error
+        self._finished.move_to_end(prompt_id)
+        while len(self._finished) > _FINISHED_CACHE_SIZE:
+            self._finished.popitem(last=False)
+
+        waiter = self._waiters.pop(prompt_id, None)
+        if waiter is None or waiter.done():
+            return
+        if error is None:
+            waiter.set_result(None)
+        else:
+            waiter.set_exception(_execution_error(prompt_id, error))
+
+
+def _execution_error(prompt_id: str, error: str) -> ComfyUiExecutionError:
+    return ComfyUiExecutionError(f"ComfyUI prompt {prompt_id} failed: {error}")
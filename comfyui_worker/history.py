@@ -0,0 +1,173 @@
+from collections.abc import AsyncIterable
+from typing import Any, NamedTuple, TypedDict
+
+import ijson
+
+# ComfyUI UI output keys that list saved files, and the media kind of each.
+# Video Helper Suite reports its videos and GIFs under "gifs".
+MEDIA_KINDS = {
+    "images": "image",
+    "gifs": "video",
+    "videos": "video",
+    "video": "video",
+    "audio": "audio",
+}
+TEXT_KEY = "text"
+
+_CONTAINER_STARTS = frozenset({"start_map", "start_array"})
+_CONTAINER_ENDS = frozenset({"end_map", "end_array"})
+
+
+class StatusRecord(TypedDict, total=False):
+    status_str: str
+    completed: bool
+    messages: list[list[Any]]
+
+
+class HistoryRecord(TypedDict, total=False):
+    """The parts of a /history entry the worker reads."""
+
+    outputs: dict[str, dict[str, list[Any]]]
+    status: StatusRecord
+
+
+class OutputFile(NamedTuple):
+    node_id: str
+    kind: str
+    filename: str
+    subfolder: str
+    type: str
+
+
+def compact_history(entry: dict[str, Any]) -> HistoryRecord:
+    """Keep only file and text outputs and the status of a /history entry."""
+    outputs: dict[str, dict[str, list[Any]]] = {}
+    for node_id, node in (entry.get("outputs") or {}).items():
+        if not isinstance(node, dict):
+            continue
+        kept = {
+            key: value
+            for key, value in node.items()
+            if key in MEDIA_KINDS or key == TEXT_KEY
+        }
+        if kept:
+            outputs[node_id] = kept
+    record: HistoryRecord = {"outputs": outputs}
+    status = entry.get("status")
+    if isinstance(status, dict):
+        record["status"] = status  # type: ignore[typeddict-item]
+    return record
+
+
+class _EntryExtractor:
+    """Build the ``outputs`` and ``status`` of /history entries from ijson events.
+
+    With a ``prompt_id`` only that entry is kept; without one, every
+    top-level entry of a /history body is.
+    """
+
+    def __init__(self, prompt_id: str | None = None) -> None:
+        self._every = prompt_id is None
+        self._wanted: dict[str, tuple[str, str]] = {}
+        if prompt_id is not None:
+            self._want(prompt_id)
+        self._builder: ijson.ObjectBuilder | None = None
+        self._capturing = ""
+        self.entries: dict[str, dict[str, Any]] = {}
+
+    def _want(self, prompt_id: str) -> None:
+        self._wanted = {
+            f"{prompt_id}.outputs": (prompt_id, "outputs"),
+            f"{prompt_id}.status": (prompt_id, "status"),
+        }
+
+    def feed(self, events: list[tuple[str, str, Any]]) -> None:
+        for prefix, event, value in events:
+            if self._builder is not None:
+                self._builder.event(event, value)
+                if prefix == self._capturing and event in _CONTAINER_ENDS:
+                    prompt_id, key = self._wanted[prefix]
+                    self.entries.setdefault(prompt_id, {})[key] = self._builder.value
+                    self._builder = None
+            elif prefix in self._wanted and event in _CONTAINER_STARTS:
+                self._builder = ijson.ObjectBuilder()
+                self._builder.event(event, value)
+                self._capturing = prefix
+            elif self._every and not prefix and event == "map_key":
+                self.entries[value] = {}
+                self._want(value)
+
+
+async def _extract(chunks: AsyncIterable[bytes], extractor: _EntryExtractor) -> None:
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    try:
+        async for chunk in chunks:
+            parser.send(chunk)
+            extractor.feed(events)
+            del events[:]
+        parser.close()
+    except ijson.JSONError as exc:
+        raise ValueError(f"Invalid ComfyUI history body: {exc}") from exc
+    extractor.feed(events)
+
+
+async def parse_history(
+    chunks: AsyncIterable[bytes], prompt_id: str
+) -> HistoryRecord | None:
+    """Stream a /history/{prompt_id} body into a compact record.
+
+    Only the entry's ``outputs`` and ``status`` are built into Python
+    objects; the prompt graph and metadata, usually most of the body, are
+    tokenised and dropped. Returns None when the prompt has no entry yet.
+    """
+    extractor = _EntryExtractor(prompt_id)
+    await _extract(chunks, extractor)
+    entry = extractor.entries.get(prompt_id)
+    if not entry:
+        return None
+    return compact_history(entry)
+
+
+async def parse_history_batch(
+    chunks: AsyncIterable[bytes],
+) -> dict[str, HistoryRecord]:
+    """Stream a /history?max_items=N body into compact records by prompt_id."""
+    extractor = _EntryExtractor()
+    await _extract(chunks, extractor)
+    return {
+        prompt_id: compact_history(entry)
+        for prompt_id, entry in extractor.entries.items()
+    }
+
+
+def output_files(history: dict[str, Any]) -> list[OutputFile]:
+    """Every saved image, video and audio file in a history entry."""
+    files = []
+    for node_id, node in (history.get("outputs") or {}).items():
+        for key, kind in MEDIA_KINDS.items():
+            for item in node.get(key) or []:
+                if not isinstance(item, dict) or not item.get("filename"):
+                    continue
+                files.append(
+                    OutputFile(
+                        node_id,
+                        kind,
+                        item["filename"],
+                        item.get("subfolder") or "",
+                        item.get("type") or "output",
+                    )
+                )
+    return files
+
+
+def output_texts(history: dict[str, Any]) -> list[str]:
+    """Text outputs, such as captions or prompts from LLM nodes."""
+    texts = []
+    for node in (history.get("outputs") or {}).values():
+        value = node.get(TEXT_KEY)
+        if isinstance(value, str):
+            texts.append(value)
+        elif isinstance(value, list):
+            texts.extend(item for item in value if isinstance(item, str))
+    return texts
@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+SUBMITTED = "submitted"
+FINISHED = "finished"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    task_key TEXT PRIMARY KEY,
+    prompt_id TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    workflow_hash TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class JournalEntry(NamedTuple):
+    prompt_id: str
+    backend: str
+    workflow_hash: str
+    state: str
+
+
+class PromptJournal:
+    """Durable map from LittleHorse task runs to the ComfyUI prompts serving them.
+
+    A task retried after a worker restart finds the prompt its earlier
+    attempt submitted and waits on that instead of resubmitting. Queries run
+    on a thread so a slow disk or a held lock never stalls the event loop.
+    WAL mode needs a local filesystem, so keep the file off network shares.
+    Entries untouched for ``max_age`` seconds are pruned on open. Journal
+    errors are logged and never fail a task.
+    """
+
+    def __init__(self, path: str, max_age: float = 86400.0) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(_SCHEMA)
+        self._execute(
+            "DELETE FROM prompts WHERE updated_at < ?", (time.time() - max_age,)
+        )
+
+    async def get(self, task_key: str) -> JournalEntry | None:
+        rows = await self._query(
+            "SELECT prompt_id, backend, workflow_hash, state FROM prompts"
+            " WHERE task_key = ?",
+            (task_key,),
+        )
+        return JournalEntry(*rows[0]) if rows else None
+
+    async def record(
+        self, task_key: str, prompt_id: str, backend: str, workflow_hash: str
+    ) -> None:
+        await self._query(
+            "INSERT OR REPLACE INTO prompts VALUES (?, ?, ?, ?, ?, ?)",
+            (task_key, prompt_id, backend, workflow_hash, SUBMITTED, time.time()),
+        )
+
+    async def finish(self, task_key: str) -> None:
+        await self._query(
+            "UPDATE prompts SET state = ?, updated_at = ? WHERE task_key = ?",
+            (FINISHED, time.time(), task_key),
+        )
+
+    async def discard(self, task_key: str) -> None:
+        await self._query("DELETE FROM prompts WHERE task_key = ?", (task_key,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    async def _query(self, sql: str, params: tuple[Any, ...]) -> list[Any]:
+        return await asyncio.to_thread(self._execute, sql, params)
+
+    def _execute(self, sql: str, params: tuple[Any, ...]) -> list[Any]:
+        try:
+            with self._lock:
+                return self._db.execute(sql, params).fetchall()
+        except sqlite3.Error as exc:
+            logger.warning(
+                "Prompt journal update failed",
+                extra={"path": self.path, "error": str(exc)},
+            )
+            return []
@@ -0,0 +1,272 @@
+import logging
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from prometheus_client import REGISTRY, Counter, Histogram, start_http_server
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+
+logger = logging.getLogger(__name__)
+
+# Circuit breaker states of a ComfyUiBackend.
+_CIRCUIT_STATES = ("closed", "half_open", "open")
+
+_LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600
+)  # fmt: skip
+
+PHASE_SECONDS = Histogram(
+    "comfyui_worker_phase_seconds",
+    "Time spent per task phase.",
+    ["phase"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "comfyui_worker_http_request_seconds",
+    "ComfyUI HTTP latency until response headers, by endpoint and status.",
+    ["endpoint", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+HTTP_RETRIES = Counter(
+    "comfyui_worker_http_retries_total",
+    "ComfyUI HTTP requests retried after a failure.",
+    ["endpoint"],
+)
+HTTP_ERRORS = Counter(
+    "comfyui_worker_http_errors_total",
+    "ComfyUI HTTP requests that failed after all retries or with an error status.",
+    ["endpoint"],
+)
+POLLS_PER_PROMPT = Histogram(
+    "comfyui_worker_polls_per_prompt",
+    "Status polls needed before a prompt's history was available.",
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+
+PROMPTS_CANCELLED = Counter(
+    "comfyui_worker_prompts_cancelled_total",
+    "Abandoned prompts by what cancellation found: dequeued, interrupted, "
+    "finished (nothing left to stop) or failed.",
+    ["action"],
+)
+LANE_WAIT_SECONDS = Histogram(
+    "comfyui_worker_lane_wait_seconds",
+    "Time a prompt waited before running by priority lane, split by queue: "
+    "local (for an in-flight slot) or comfyui (in ComfyUI's own queue).",
+    ["lane", "queue"],
+    buckets=_LATENCY_BUCKETS,
+)
+PROMPTS_REATTACHED = Counter(
+    "comfyui_worker_prompts_reattached_total",
+    "Retried tasks that waited on their earlier attempt's prompt instead of "
+    "resubmitting it.",
+)
+RECLAIMED_GPU_SECONDS = Counter(
+    "comfyui_worker_reclaimed_gpu_seconds_total",
+    "Estimated GPU time freed by dequeuing or interrupting abandoned prompts.",
+)
+
+
+def endpoint(path: str) -> str:
+    """Collapse ``/history/<id>`` and similar paths to their endpoint."""
+    return "/" + path.lstrip("/").split("/", 1)[0]
+
+
+def observe_phase(phase: str, seconds: float) -> None:
+    PHASE_SECONDS.labels(phase).observe(max(0.0, seconds))
+
+
+def observe_history_timing(
+    history: dict[str, Any], submitted_at: float
+) -> tuple[float | None, float | None]:
+    """Record queued and execution time from ComfyUI's own status messages.
+
+    ``submitted_at`` is wall-clock time; ComfyUI timestamps are in ms.
+    Returns the (queued, execute) seconds that could be determined.
+    """
+    started = finished = None
+    for message in (history.get("status") or {}).get("messages") or []:
+        if not isinstance(message, list) or len(message) != 2:
+            continue
+        name, data = message
+        timestamp = data.get("timestamp") if isinstance(data, dict) else None
+        if timestamp is None:
+            continue
+        if name == "execution_start":
+            started = timestamp / 1000
+        elif name in ("execution_success", "execution_error", "execution_interrupted"):
+            finished = timestamp / 1000
+    queued = executed = None
+    if started is not None:
+        queued = max(0.0, started - submitted_at)
+        observe_phase("queued", queued)
+        if finished is not None:
+            executed = max(0.0, finished - started)
+            observe_phase("execute", executed)
+    return queued, executed
+
+
+class WorkerCollector(Collector):
+    """Expose scheduler, backend, cache and polling state at scrape time.
+
+    Reading plain attributes here keeps the task path free of metric
+    updates for values the worker already tracks.
+    """
+
+    def __init__(
+        self,
+        backends: Any,
+        cache: Any = None,
+        singleflight: Any = None,
+        polling: Any = None,
+        admission: Any = None,
+        assets: Any = None,
+    ) -> None:
+        self._backends = backends
+        self._cache = cache
+        self._singleflight = singleflight
+        self._polling = polling
+        self._admission = admission
+        self._assets = assets
+
+    def collect(self) -> Iterator[Metric]:
+        in_flight = GaugeMetricFamily(
+            "comfyui_worker_in_flight_prompts",
+            "Prompts submitted to ComfyUI and not yet finished.",
+            labels=["backend"],
+        )
+        waiting = GaugeMetricFamily(
+            "comfyui_worker_waiting_prompts",
+            "Prompts waiting locally for an in-flight slot.",
+            labels=["backend"],
+        )
+        queue_depth = GaugeMetricFamily(
+            "comfyui_worker_queue_depth",
+            "Running plus pending prompts in ComfyUI's queue, last observed.",
+            labels=["backend"],
+        )
+        healthy = GaugeMetricFamily(
+            "comfyui_worker_backend_healthy",
+            "1 while the backend is in rotation.",
+            labels=["backend"],
+        )
+        circuit = GaugeMetricFamily(
+            "comfyui_worker_backend_circuit_state",
+            "1 for the backend's current circuit breaker state.",
+            labels=["backend", "state"],
+        )
+        opened = CounterMetricFamily(
+            "comfyui_worker_backend_circuit_opened",
+            "Times the backend was taken out of rotation.",
+            labels=["backend"],
+        )
+        swaps = CounterMetricFamily(
+            "comfyui_worker_model_swaps",
+            "Submissions that load different models than the previous prompt.",
+            labels=["backend"],
+        )
+        affinity = CounterMetricFamily(
+            "comfyui_worker_affinity_reorders",
+            "Waiting prompts submitted early because their models were loaded.",
+            labels=["backend"],
+        )
+        for backend in self._backends.backends:
+            name = backend.name
+            healthy.add_metric([name], 1 if backend.healthy else 0)
+            for state in _CIRCUIT_STATES:
+                circuit.add_metric([name, state], 1 if backend.state == state else 0)
+            opened.add_metric([name], backend.opened)
+            queue_depth.add_metric([name], _queue_depth(backend))
+            if backend.scheduler is not None:
+                in_flight.add_metric([name], backend.scheduler.in_flight)
+                waiting.add_metric([name], backend.scheduler.waiting)
+                swaps.add_metric([name], backend.scheduler.swaps)
+                affinity.add_metric([name], backend.scheduler.affinity_picks)
+        yield from (in_flight, waiting, queue_depth, healthy, circuit, opened)
+        yield from (swaps, affinity)
+        yield from self._collect_cache()
+        if self._singleflight is not None:
+            yield CounterMetricFamily(
+                "comfyui_worker_deduplicated_tasks",
+                "Tasks that shared an identical in-flight prompt.",
+                value=self._singleflight.shared,
+            )
+        if self._polling is not None:
+            stats = self._polling.stats()
+            yield GaugeMetricFamily(
+                "comfyui_worker_runtime_prediction_error_seconds",
+                "Mean absolute error of predicted prompt runtimes.",
+                value=stats["mean_abs_prediction_error_sec"],
+            )
+        yield from self._collect_admission()
+        if self._assets is not None:
+            uploads = CounterMetricFamily(
+                "comfyui_worker_asset_uploads",
+                "Input assets needed by prompts, by whether they were uploaded "
+                "or already present on the backend.",
+                labels=["outcome"],
+            )
+            uploads.add_metric(["uploaded"], self._assets.uploads)
+            uploads.add_metric(["reused"], self._assets.reused)
+            yield uploads
+
+    def _collect_admission(self) -> Iterable[Metric]:
+        if self._admission is None:
+            return
+        yield GaugeMetricFamily(
+            "comfyui_worker_admission_limit",
+            "LittleHorse tasks the worker currently accepts at once.",
+            value=self._admission.limit,
+        )
+        yield GaugeMetricFamily(
+            "comfyui_worker_admitted_tasks",
+            "LittleHorse tasks held by the worker.",
+            value=self._admission.in_use,
+        )
+        yield GaugeMetricFamily(
+            "comfyui_worker_predicted_wait_seconds",
+            "Predicted wait for a newly accepted task.",
+            value=self._admission.predicted_wait(),
+        )
+        yield CounterMetricFamily(
+            "comfyui_worker_admission_paused_seconds",
+            "Time task polling was paused by admission control.",
+            value=self._admission.paused_sec,
+        )
+
+    def _collect_cache(self) -> Iterable[Metric]:
+        if self._cache is None:
+            return
+        lookups = CounterMetricFamily(
+            "comfyui_worker_cache_lookups",
+            "Result cache lookups by outcome.",
+            labels=["outcome"],
+        )
+        lookups.add_metric(["hit"], self._cache.hits)
+        lookups.add_metric(["miss"], self._cache.misses)
+        yield lookups
+        yield CounterMetricFamily(
+            "comfyui_worker_cache_skipped",
+            "Results not cached because their outputs were missing or too large.",
+            value=self._cache.skipped,
+        )
+        yield GaugeMetricFamily(
+            "comfyui_worker_cache_bytes",
+            "Size of the output files referenced by the result cache.",
+            value=self._cache.total_bytes,
+        )
+
+
+def _queue_depth(backend: Any) -> int:
+    snapshot = backend.poller.snapshot if backend.poller is not None else None
+    if snapshot is not None and (
+        backend.refreshed_at is None or snapshot.fetched_at > backend.refreshed_at
+    ):
+        return snapshot.depth
+    return backend.queue_depth
+
+
+def start_metrics_server(port: int, collector: Collector) -> None:
+    REGISTRY.register(collector)
+    start_http_server(port)
+    logger.info("Metrics endpoint listening", extra={"port": port})
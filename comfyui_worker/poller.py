@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import time
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+
+from comfyui_worker import tracing
+from comfyui_worker.comfyui_client import ComfyUiClient
+from comfyui_worker.polling import PollSchedule, fixed_schedule
+
+logger = logging.getLogger(__name__)
+
+# Extra entries requested from /history so prompts finished by other
+# clients in the same tick do not push ours out of the batch.
+_HISTORY_BATCH_SLACK = 8
+
+
+class QueueSnapshot:
+    """Running and pending prompt ids from one /queue fetch."""
+
+    def __init__(self, payload: dict[str, Any]) -> None:
+        self.running = {item[0] for item in payload.get("queue_running", [])}
+        self.pending = {item[0] for item in payload.get("queue_pending", [])}
+        self.fetched_at = time.monotonic()
+
+    @property
+    def depth(self) -> int:
+        return len(self.running) + len(self.pending)
+
+    def __contains__(self, prompt_id: object) -> bool:
+        return prompt_id in self.running or prompt_id in self.pending
+
+
+class _Waiter:
+    def __init__(
+        self,
+        future: asyncio.Future[dict[str, Any]],
+        log: Callable[[str], Any],
+        schedule: PollSchedule,
+    ) -> None:
+        self.future = future
+        self.log = log
+        self.schedule = schedule
+        self.next_at = time.monotonic()
+
+
+class QueuePoller:
+    """Poll one backend's /queue once per tick on behalf of every waiting prompt.
+
+    Prompts that have left the queue have their history fetched together:
+    one /history?max_items=N call per tick, with a per-prompt lookup only for
+    ids missing from that batch. Each prompt keeps its own PollSchedule; a
+    tick runs when the earliest one is due and its snapshot answers everyone.
+    """
+
+    def __init__(self, client: ComfyUiClient, interval: float) -> None:
+        self._client = client
+        self._interval = interval
+        self._waiters: dict[str, _Waiter] = {}
+        self._task: asyncio.Task[None] | None = None
+        self._wake = asyncio.Event()
+        self.snapshot: QueueSnapshot | None = None
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def wait_for_history(
+        self,
+        prompt_id: str,
+        timeout: float,
+        log: Callable[[str], Any] = lambda _: None,
+        schedule: PollSchedule | None = None,
+    ) -> dict[str, Any]:
+        waiter = self._waiters.get(prompt_id)
+        if waiter is None:
+            future = asyncio.get_running_loop().create_future()
+            waiter = _Waiter(future, log, schedule or fixed_schedule(self._interval))
+            self._waiters[prompt_id] = waiter
+        if self._task is None or self._task.done():
+            self._task = tracing.background_task(self._run())
+        else:
+            self._wake.set()
+        try:
+            return await asyncio.wait_for(waiter.future, timeout)
+        except TimeoutError as exc:
+            raise TimeoutError("ComfyUI queue wait timed out") from exc
+        finally:
+            if self._waiters.get(prompt_id) is waiter:
+                del self._waiters[prompt_id]
+
+    async def _run(self) -> None:
+        while self._waiters:
+            now = time.monotonic()
+            due = [w for w in self._waiters.values() if w.next_at <= now]
+            if due:
+                try:
+                    await self._tick()
+                except (httpx.HTTPError, ValueError) as exc:
+                    self._fail_all(exc)
+                    return
+                now = time.monotonic()
+                for waiter in due:
+                    waiter.next_at = now + waiter.schedule.next_delay()
+            if not self._waiters:
+                return
+            delay = min(w.next_at for w in self._waiters.values()) - now
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, delay))
+            except TimeoutError:
+                pass
+
+    async def _tick(self) -> None:
+        self.snapshot = QueueSnapshot(await self._client.get_queue())
+        finished = []
+        for prompt_id, waiter in self._waiters.items():
+            if prompt_id in self.snapshot.running:
+                waiter.schedule.mark_running()
+            if prompt_id in self.snapshot:
+                waiter.log(f"prompt {prompt_id} still queued")
+            else:
+                finished.append(prompt_id)
+        logger.debug(
+            "Polled ComfyUI queue",
+            extra={
+                "queue_depth": self.snapshot.depth,
+                "waiting": len(self._waiters),
+                "finished": len(finished),
+            },
+        )
+        if finished:
+            histories = await self._fetch_histories(finished)
+            for prompt_id, history in histories.items():
+                waiter = self._waiters.pop(prompt_id, None)
+                if waiter is not None and not waiter.future.done():
+                    waiter.future.set_result(history)
+
+    async def _fetch_histories(self, prompt_ids: list[str]) -> dict[str, Any]:
+        if len(prompt_ids) == 1:
+            history = await self._client.get_history(prompt_ids[0])
+            return {} if history is None else {prompt_ids[0]: history}
+        batch = await self._client.get_history_batch(
+            len(prompt_ids) + _HISTORY_BATCH_SLACK
+        )
+        found = {pid: batch[pid] for pid in prompt_ids if pid in batch}
+        missing = [pid for pid in prompt_ids if pid not in found]
+        if missing:
+            results = await asyncio.gather(
+                *(self._client.get_history(pid) for pid in missing)
+            )
+            for pid, history in zip(missing, results):
+                if history is not None:
+                    found[pid] = history
+        return found
+
+    def _fail_all(self, exc: Exception) -> None:
+        logger.warning(
+            "ComfyUI queue poll failed",
+            extra={"waiting": len(self._waiters), "error": str(exc)},
+        )
+        for waiter in self._waiters.values():
+            if not waiter.future.done():
+                waiter.future.set_exception(exc)
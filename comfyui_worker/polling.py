@@ -0,0 +1,193 @@
+import logging
+import random
+import statistics
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Samples needed before a fingerprint's runtime is trusted for an ETA.
+_MIN_SAMPLES = 3
+
+
+class PollSchedule:
+    """Delays between status checks for one prompt.
+
+    Polls start at ``min_interval`` and back off by ``backoff`` with jitter up
+    to ``max_interval``. With an expected completion window (p10, p90 of past
+    runtimes) the backoff is uncapped before the window opens but never
+    sleeps past its start, polls run at ``min_interval`` inside it, and the
+    capped backoff resumes once it has passed. The window is measured from
+    when the prompt was seen running, if it has been, since the runtimes it
+    comes from are execution times.
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        backoff: float = 1.5,
+        jitter: float = 0.1,
+        window: tuple[float, float] | None = None,
+        predicted: float | None = None,
+    ) -> None:
+        self._min = min(min_interval, max_interval)
+        self._max = max_interval
+        self._backoff = backoff
+        self._jitter = jitter
+        self._window = window
+        self._step = 0
+        self.predicted = predicted
+        self.started_at = time.monotonic()
+        self.running_since: float | None = None
+        self.polls = 0
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def executing(self) -> float | None:
+        """Seconds since the prompt was seen running, if it has been."""
+        if self.running_since is None:
+            return None
+        return time.monotonic() - self.running_since
+
+    def mark_running(self) -> None:
+        if self.running_since is None:
+            self.running_since = time.monotonic()
+
+    def next_delay(self) -> float:
+        """Record one poll and return how long to wait before the next."""
+        self.polls += 1
+        elapsed = self.executing
+        if elapsed is None:
+            elapsed = self.elapsed
+        if self._window is not None:
+            opens, closes = self._window
+            if elapsed < opens:
+                delay = self._backoff_delay(cap=None)
+                return max(self._min, min(opens - elapsed, delay))
+            if elapsed <= closes:
+                self._step = 0
+                return self._min
+        return self._backoff_delay(cap=self._max)
+
+    def _backoff_delay(self, cap: float | None) -> float:
+        delay = self._min * self._backoff**self._step
+        if cap is not None:
+            delay = min(cap, delay)
+        self._step += 1
+        if self._jitter:
+            delay *= 1 + random.uniform(-self._jitter, self._jitter)
+        return max(0.0, delay)
+
+
+class RuntimeHistogram:
+    """Rolling window of observed runtimes per workflow fingerprint."""
+
+    def __init__(self, window: int = 50, max_fingerprints: int = 512) -> None:
+        self._window = window
+        self._max_fingerprints = max_fingerprints
+        self._samples: OrderedDict[str, deque[float]] = OrderedDict()
+
+    def observe(self, fingerprint: str, seconds: float) -> None:
+        samples = self._samples.get(fingerprint)
+        if samples is None:
+            samples = deque(maxlen=self._window)
+            self._samples[fingerprint] = samples
+        self._samples.move_to_end(fingerprint)
+        samples.append(seconds)
+        while len(self._samples) > self._max_fingerprints:
+            self._samples.popitem(last=False)
+
+    def quantiles(self, fingerprint: str) -> tuple[float, float, float] | None:
+        """Return (p10, p50, p90) once enough runs have been seen."""
+        samples = self._samples.get(fingerprint)
+        if samples is None or len(samples) < _MIN_SAMPLES:
+            return None
+        deciles = statistics.quantiles(samples, n=10, method="inclusive")
+        return deciles[0], statistics.median(samples), deciles[-1]
+
+
+class AdaptivePolling:
+    """Hand out poll schedules and learn runtimes to predict completion."""
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        backoff: float = 1.5,
+        jitter: float = 0.1,
+        histogram: RuntimeHistogram | None = None,
+    ) -> None:
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._backoff = backoff
+        self._jitter = jitter
+        self.histogram = histogram or RuntimeHistogram()
+        self.prompts = 0
+        self.polls = 0
+        self.predictions = 0
+        self.total_abs_error = 0.0
+
+    def schedule(self, fingerprint: str) -> PollSchedule:
+        quantiles = self.histogram.quantiles(fingerprint)
+        window = predicted = None
+        if quantiles is not None:
+            p10, predicted, p90 = quantiles
+            window = (p10, p90)
+        return PollSchedule(
+            self._min_interval,
+            self._max_interval,
+            backoff=self._backoff,
+            jitter=self._jitter,
+            window=window,
+            predicted=predicted,
+        )
+
+    def complete(
+        self, fingerprint: str, schedule: PollSchedule, runtime: float | None
+    ) -> None:
+        """Record a finished prompt and its execution seconds, when known.
+
+        Only execution time is learnt; time spent in ComfyUI's queue depends
+        on load, not on the workflow.
+        """
+        self.prompts += 1
+        self.polls += schedule.polls
+        if runtime is None:
+            return
+        self.histogram.observe(fingerprint, runtime)
+        error = None
+        if schedule.predicted is not None:
+            error = runtime - schedule.predicted
+            self.predictions += 1
+            self.total_abs_error += abs(error)
+        logger.info(
+            "Prompt runtime observed",
+            extra={
+                "fingerprint": fingerprint,
+                "runtime_sec": round(runtime, 3),
+                "predicted_sec": schedule.predicted,
+                "prediction_error_sec": error,
+                "polls": schedule.polls,
+            },
+        )
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "prompts": self.prompts,
+            "polls": self.polls,
+            "polls_per_prompt": self.polls / self.prompts if self.prompts else 0.0,
+            "predictions": self.predictions,
+            "mean_abs_prediction_error_sec": (
+                self.total_abs_error / self.predictions if self.predictions else 0.0
+            ),
+        }
+
+
+def fixed_schedule(interval: float) -> PollSchedule:
+    """The pre-adaptive behaviour: poll every ``interval`` seconds."""
+    return PollSchedule(interval, interval, backoff=1.0, jitter=0.0)
@@ -0,0 +1,47 @@
+import json
+import logging
+import threading
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class WorkloadRecorder:
+    """Append one compact JSON line per task for later replay.
+
+    Each record holds the arrival time, workflow and model fingerprints,
+    payload size, observed queued and execution seconds, end-to-end
+    seconds and outcome. Full payloads are only kept when
+    ``include_payloads`` is set, since they can be large or sensitive.
+    The file is reopened for every record, so it can be rotated in place.
+    """
+
+    def __init__(self, path: str, include_payloads: bool = False) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.include_payloads = include_payloads
+        self.records = 0
+
+    def record(self, entry: dict[str, Any]) -> None:
+        line = json.dumps(entry, separators=(",", ":"), default=str)
+        with self._lock:
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    file.write(line + "\n")
+            except OSError as exc:
+                logger.warning("Failed to record task", extra={"error": str(exc)})
+                return
+            self.records += 1
+
+
+def read_trace(path: str) -> list[dict[str, Any]]:
+    """Load a recorded trace, skipping a torn last line."""
+    entries = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    entries.sort(key=lambda entry: entry["t"])
+    return entries
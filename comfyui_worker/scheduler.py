@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, highest first.
+PRIORITIES = ("high", "normal", "low")
+
+
+class _Waiter:
+    def __init__(self, future: asyncio.Future[None], model: str, lane: int) -> None:
+        self.future = future
+        self.model = model
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+
+
+class PromptScheduler:
+    """Bound how many prompts are submitted to ComfyUI's queue at once.
+
+    ComfyUI still executes one prompt at a time; keeping ``depth`` prompts
+    queued means the next one starts as soon as the GPU frees up instead of
+    waiting for the worker to report a result and poll a new task.
+
+    When prompts are waiting for a slot, the highest priority lane goes
+    first; every ``aging`` seconds spent waiting moves a prompt up one lane so
+    low-priority work is not starved. Within a lane, one that uses the same
+    models as the last submitted prompt goes first so ComfyUI does not swap
+    checkpoints back and forth. A prompt that has waited ``max_wait`` seconds
+    is served next in its lane regardless of its models.
+    """
+
+    def __init__(self, depth: int, max_wait: float = 30.0, aging: float = 30.0) -> None:
+        if depth < 1:
+            raise ValueError("in-flight depth must be at least 1")
+        self._depth = depth
+        self._max_wait = max_wait
+        self._aging = aging
+        self._in_flight = 0
+        self._waiters: deque[_Waiter] = deque()
+        self.last_model = ""
+        self.swaps = 0
+        self.affinity_picks = 0
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @asynccontextmanager
+    async def slot(
+        self, model: str = "", priority: str = "normal"
+    ) -> AsyncIterator[None]:
+        """Hold one in-flight slot from submission until the prompt finishes.
+
+        ``model`` identifies the models the prompt loads; prompts without
+        loaders pass an empty string and never count as a swap. ``priority``
+        is one of PRIORITIES.
+        """
+        await self._acquire(model, PRIORITIES.index(priority))
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, model: str, lane: int) -> None:
+        if self._in_flight < self._depth and not self._waiters:
+            self._in_flight += 1
+            self._record_model(model)
+            return
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), model, lane)
+        self._waiters.append(waiter)
+        logger.debug(
+            "Waiting for in-flight slot",
+            extra={"in_flight": self._in_flight, "waiting": len(self._waiters)},
+        )
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just before cancellation.
+                self._release()
+            elif waiter in self._waiters:
+                # A concurrent release may already have dropped it.
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < self._depth:
+            waiter = self._next_waiter()
+            if waiter.future.done():
+                continue
+            self._in_flight += 1
+            self._record_model(waiter.model)
+            waiter.future.set_result(None)
+
+    def _next_waiter(self) -> _Waiter:
+        now = time.monotonic()
+        lane = min(self._lane(waiter, now) for waiter in self._waiters)
+        candidates = [w for w in self._waiters if self._lane(w, now) == lane]
+        oldest = candidates[0]
+        if now - oldest.enqueued_at < self._max_wait and self.last_model:
+            for waiter in candidates:
+                if waiter.model == self.last_model and not waiter.future.done():
+                    if waiter is not oldest:
+                        self.affinity_picks += 1
+                    oldest = waiter
+                    break
+        self._waiters.remove(oldest)
+        return oldest
+
+    def _lane(self, waiter: _Waiter, now: float) -> int:
+        if not self._aging:
+            return waiter.lane
+        return max(0, waiter.lane - int((now - waiter.enqueued_at) / self._aging))
+
+    def _record_model(self, model: str) -> None:
+        if not model:
+            return
+        if self.last_model and model != self.last_model:
+            self.swaps += 1
+            logger.debug(
+                "Model swap scheduled",
+                extra={"model": model, "previous_model": self.last_model},
+            )
+        self.last_model = model
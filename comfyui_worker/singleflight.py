@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task[Any]) -> None:
+        self.task = task
+        self.callers = 0
+
+
+class SingleFlight:
+    """Run one execution per key and share its outcome with every caller.
+
+    Callers arriving while a key is in flight attach to the running call and
+    get its result or exception. The key is released as soon as the call
+    finishes, so a failure is never replayed to later callers. A caller that
+    is cancelled only detaches; the shared call is cancelled once nobody is
+    waiting on it.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[str, _Call] = {}
+        self.shared = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._calls
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.shared += 1
+            logger.info("Attached to in-flight workflow", extra={"key": key})
+        call.callers += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.callers == 1:
+                # New callers must not attach to a call that is winding down.
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.callers -= 1
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,65 @@
+from typing import Any, Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class TaskInput(BaseModel):
+    """Task payload: a ComfyUI workflow or template reference plus options.
+
+    Tasks may pass a bare API-format workflow, or an object such as
+    ``{"workflow": {...}, "cache": true}`` or
+    ``{"template_id": "txt2img", "params": {"3.inputs.seed": 42}}``.
+    ``assets`` maps input paths such as ``"10.inputs.image"`` to image URLs
+    or paths, which are uploaded to ComfyUI and patched in.
+    """
+
+    workflow: dict[str, Any] | None = Field(default=None, min_length=1)
+    template_id: str | None = Field(default=None, min_length=1)
+    params: dict[str, Any] = Field(default_factory=dict)
+    cache: bool = False
+    dedupe: bool = True
+    priority: Literal["high", "normal", "low"] = "normal"
+    assets: dict[str, str] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def _check_source(self) -> "TaskInput":
+        _check_source(self.workflow, self.template_id, self.params)
+        return self
+
+
+class BatchInput(BaseModel):
+    """Sweep payload: a base workflow or template and one override per variant.
+
+    Each entry of ``overrides`` patches the base by ``node.inputs.name`` path,
+    on top of ``params`` for templates, for example
+    ``{"template_id": "txt2img", "overrides": [{"3.inputs.seed": 1}, ...]}``.
+    """
+
+    workflow: dict[str, Any] | None = Field(default=None, min_length=1)
+    template_id: str | None = Field(default=None, min_length=1)
+    params: dict[str, Any] = Field(default_factory=dict)
+    overrides: list[dict[str, Any]] = Field(min_length=1)
+    concurrency: int | None = Field(default=None, ge=1)
+    cache: bool = False
+    priority: Literal["high", "normal", "low"] = "normal"
+    assets: dict[str, str] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def _check_source(self) -> "BatchInput":
+        _check_source(self.workflow, self.template_id, self.params)
+        return self
+
+
+def _check_source(
+    workflow: dict[str, Any] | None, template_id: str | None, params: dict[str, Any]
+) -> None:
+    if (workflow is None) == (template_id is None):
+        raise ValueError("exactly one of workflow or template_id is required")
+    if params and template_id is None:
+        raise ValueError("params require template_id")
+
+
+def parse_task_input(payload: dict[str, Any]) -> TaskInput:
+    if isinstance(payload.get("workflow"), dict) or "template_id" in payload:
+        return TaskInput.model_validate(payload)
+    return TaskInput(workflow=payload)
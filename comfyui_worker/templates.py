@@ -0,0 +1,125 @@
+import functools
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any
+
+from comfyui_worker.workflow import workflow_hash
+
+logger = logging.getLogger(__name__)
+
+
+class TemplateError(ValueError):
+    """Raised for unknown templates or parameters that do not fit them."""
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_path(path: str) -> tuple[str, ...]:
+    """Split a patch key such as ``"3.inputs.seed"`` into its parts."""
+    keys = tuple(path.split("."))
+    if len(keys) < 2 or not all(keys):
+        raise TemplateError(f"invalid parameter path {path!r}")
+    return keys
+
+
+def patch_workflow(
+    workflow: dict[str, Any], params: dict[str, Any], label: str = "workflow"
+) -> dict[str, Any]:
+    """Apply ``params`` to ``workflow`` copy-on-write.
+
+    Only the dicts along each patched path are copied; every other node is
+    shared with ``workflow``, which must therefore never be mutated.
+    """
+    patched = dict(workflow)
+    copied: set[tuple[str, ...]] = set()
+    for path, value in params.items():
+        keys = compile_path(path)
+        parent = patched
+        for depth in range(1, len(keys)):
+            child = parent.get(keys[depth - 1])
+            if not isinstance(child, dict):
+                raise TemplateError(f"parameter {path!r} does not match {label}")
+            prefix = keys[:depth]
+            if prefix not in copied:
+                child = dict(child)
+                parent[keys[depth - 1]] = child
+                copied.add(prefix)
+            parent = child
+        parent[keys[-1]] = value
+    return patched
+
+
+class WorkflowTemplate:
+    """A named workflow that tasks patch with a small parameter map."""
+
+    def __init__(self, template_id: str, workflow: dict[str, Any]) -> None:
+        self.template_id = template_id
+        self.workflow = workflow
+        self.digest = workflow_hash(workflow)
+
+    def render(self, params: dict[str, Any]) -> dict[str, Any]:
+        """Apply ``params`` copy-on-write; see patch_workflow."""
+        return patch_workflow(self.workflow, params, f"template {self.template_id!r}")
+
+    def key(self, params: dict[str, Any]) -> str:
+        """Content hash of the rendered workflow without rendering it."""
+        return workflow_hash({"template": self.digest, "params": params})
+
+
+class TemplateStore:
+    """Workflow templates loaded from ``<directory>/<template_id>.json``.
+
+    The directory is rescanned at most every ``reload_interval`` seconds and
+    only files whose mtime changed are parsed again. A file that fails to
+    parse keeps its previous version.
+    """
+
+    def __init__(self, directory: str, reload_interval: float = 2.0) -> None:
+        self._directory = Path(directory)
+        self._reload_interval = reload_interval
+        self._templates: dict[str, WorkflowTemplate] = {}
+        self._mtimes: dict[str, int] = {}
+        self._checked_at = float("-inf")
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def get(self, template_id: str) -> WorkflowTemplate:
+        if time.monotonic() - self._checked_at >= self._reload_interval:
+            self.load()
+        template = self._templates.get(template_id)
+        if template is None:
+            raise TemplateError(f"unknown workflow template {template_id!r}")
+        return template
+
+    def load(self) -> None:
+        self._checked_at = time.monotonic()
+        seen = set()
+        for path in self._directory.glob("*.json"):
+            template_id = path.stem
+            seen.add(template_id)
+            try:
+                mtime = path.stat().st_mtime_ns
+                if self._mtimes.get(template_id) == mtime:
+                    continue
+                workflow = json.loads(path.read_text())
+            except (OSError, ValueError) as exc:
+                logger.warning(
+                    "Failed to load workflow template",
+                    extra={"template_id": template_id, "error": str(exc)},
+                )
+                continue
+            if not isinstance(workflow, dict):
+                logger.warning(
+                    "Workflow template is not a JSON object",
+                    extra={"template_id": template_id},
+                )
+                continue
+            self._templates[template_id] = WorkflowTemplate(template_id, workflow)
+            self._mtimes[template_id] = mtime
+            logger.info("Loaded workflow template", extra={"template_id": template_id})
+        for template_id in set(self._templates) - seen:
+            del self._templates[template_id]
+            del self._mtimes[template_id]
+            logger.info("Removed workflow template", extra={"template_id": template_id})
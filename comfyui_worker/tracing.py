@@ -0,0 +1,346 @@
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import random
+import time
+from collections.abc import Coroutine, Iterator
+from contextlib import contextmanager
+from typing import Any, Protocol, TypeVar
+
+import httpx
+
+from comfyui_worker import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# OTLP span kinds and status codes.
+KIND_INTERNAL = 1
+KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+
+class Span:
+    """One timed operation; attributes are exported as OTLP key/values."""
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str | None,
+        kind: int = KIND_INTERNAL,
+        attributes: dict[str, Any] | None = None,
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.status = STATUS_OK
+        self.status_message = ""
+
+    @property
+    def recording(self) -> bool:
+        return True
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "attributes": self.attributes,
+            "status": "error" if self.status == STATUS_ERROR else "ok",
+            "status_message": self.status_message,
+        }
+
+
+class NoopSpan:
+    """Stands in for spans of unsampled traces; every call is a no-op."""
+
+    recording = False
+    trace_id = ""
+    span_id = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def record_error(self, exc: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+AnySpan = Span | NoopSpan
+
+_current: contextvars.ContextVar[AnySpan | None] = contextvars.ContextVar(
+    "comfyui_worker_span", default=None
+)
+
+
+class SpanExporter(Protocol):
+    async def export(self, spans: list[Span]) -> None: ...
+
+    async def aclose(self) -> None: ...
+
+
+class JsonFileExporter:
+    """Append finished spans to a file as JSON lines."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    async def export(self, spans: list[Span]) -> None:
+        lines = "".join(
+            json.dumps(span.to_dict(), default=str) + "\n" for span in spans
+        )
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str) -> None:
+        with open(self._path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+    async def aclose(self) -> None:
+        pass
+
+
+class OtlpHttpExporter:
+    """Send spans to an OTLP/HTTP collector using the JSON encoding."""
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str = "comfyui-worker",
+        headers: dict[str, str] | None = None,
+        timeout: float = 10.0,
+    ) -> None:
+        self._url = endpoint.rstrip("/") + "/v1/traces"
+        self._service_name = service_name
+        self._http = httpx.AsyncClient(headers=headers, timeout=timeout)
+
+    async def export(self, spans: list[Span]) -> None:
+        response = await self._http.post(self._url, json=self.encode(spans))
+        response.raise_for_status()
+
+    def encode(self, spans: list[Span]) -> dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {"service.name": self._service_name}
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "comfyui_worker"},
+                            "spans": [_otlp_span(span) for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+def _otlp_span(span: Span) -> dict[str, Any]:
+    encoded: dict[str, Any] = {
+        "traceId": span.trace_id,
+        "spanId": span.span_id,
+        "name": span.name,
+        "kind": span.kind,
+        "startTimeUnixNano": str(span.start_ns),
+        "endTimeUnixNano": str(span.end_ns or span.start_ns),
+        "attributes": _otlp_attributes(span.attributes),
+        "status": {"code": span.status, "message": span.status_message},
+    }
+    if span.parent_id:
+        encoded["parentSpanId"] = span.parent_id
+    return encoded
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    encoded = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            wrapped = {"boolValue": value}
+        elif isinstance(value, int):
+            wrapped = {"intValue": str(value)}
+        elif isinstance(value, float):
+            wrapped = {"doubleValue": value}
+        else:
+            wrapped = {"stringValue": str(value)}
+        encoded.append({"key": key, "value": wrapped})
+    return encoded
+
+
+class Tracer:
+    """Create spans and export finished ones in batches.
+
+    Sampling is decided once per trace at its root span; child spans of an
+    unsampled trace cost a context-variable lookup and nothing else.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        sample_rate: float = 1.0,
+        flush_interval: float = 2.0,
+        max_batch: int = 512,
+    ) -> None:
+        self.exporter = exporter
+        self._sample_rate = sample_rate
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._pending: list[Span] = []
+        self._task: asyncio.Task[None] | None = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        await self.exporter.aclose()
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        kind: int = KIND_INTERNAL,
+        attributes: dict[str, Any] | None = None,
+    ) -> Iterator[AnySpan]:
+        parent = _current.get()
+        if parent is None:
+            if random.random() >= self._sample_rate:
+                span: AnySpan = NOOP_SPAN
+            else:
+                span = Span(name, os.urandom(16).hex(), None, kind, attributes)
+        elif isinstance(parent, Span):
+            span = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+        else:
+            span = NOOP_SPAN
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.record_error(exc)
+            raise
+        finally:
+            _current.reset(token)
+            if isinstance(span, Span):
+                span.end_ns = time.time_ns()
+                self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        if len(self._pending) >= self._max_batch * 4:
+            # The exporter is not keeping up; shed spans rather than memory.
+            self.dropped += 1
+            return
+        self._pending.append(span)
+
+    async def flush(self) -> None:
+        while self._pending:
+            batch = self._pending[: self._max_batch]
+            del self._pending[: self._max_batch]
+            try:
+                await self.exporter.export(batch)
+            except (httpx.HTTPError, OSError) as exc:
+                logger.warning(
+                    "Span export failed",
+                    extra={"spans": len(batch), "error": str(exc)},
+                )
+                return
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            await self.flush()
+
+
+_tracer: Tracer | None = None
+
+
+def configure(tracer: Tracer | None) -> None:
+    """Install the process-wide tracer used by ``span``."""
+    global _tracer
+    _tracer = tracer
+
+
+@contextmanager
+def span(
+    name: str,
+    kind: int = KIND_INTERNAL,
+    attributes: dict[str, Any] | None = None,
+) -> Iterator[AnySpan]:
+    if _tracer is None:
+        yield NOOP_SPAN
+        return
+    with _tracer.span(name, kind, attributes) as current:
+        yield current
+
+
+def current_span() -> AnySpan:
+    return _current.get() or NOOP_SPAN
+
+
+def background_task(coro: Coroutine[Any, Any, T]) -> asyncio.Task[T]:
+    """Start a long-lived task outside the caller's trace.
+
+    Tasks copy the caller's context, so a loop started while a task span
+    is current would otherwise keep adding spans to that trace after it
+    has ended.
+    """
+    return asyncio.create_task(coro, context=contextvars.Context())
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Wrap an httpx transport with a client span per request made for a task."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport) -> None:
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attributes = {
+            "http.request.method": request.method,
+            "url.path": request.url.path,
+            "server.address": request.url.host,
+        }
+        if _current.get() is None:
+            # Background polls and probes serve no single task; leave them
+            # to the HTTP metrics.
+            return await self._transport.handle_async_request(request)
+        name = f"{request.method} {metrics.endpoint(request.url.path)}"
+        with span(name, KIND_CLIENT, attributes) as current:
+            response = await self._transport.handle_async_request(request)
+            current.set_attribute("http.response.status_code", response.status_code)
+            return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
@@ -1,57 +1,404 @@
 import asyncio
+import contextlib
+import functools
+import json
 from pathlib import Path
 import logging
+import os
 import time
-from typing import Any, Awaitable, Callable
+from typing import Any, Awaitable, Callable, Iterable, Iterator
 
+import httpx
 from littlehorse.worker import WorkerContext
 
+from comfyui_worker import metrics, tracing
+from comfyui_worker.admission import AdmissionController
+from comfyui_worker.artifacts import ArtifactUploader
+from comfyui_worker.assets import Asset, AssetError, AssetUploader
+from comfyui_worker.backends import BackendPool
+from comfyui_worker.cache import ResultCache
 from comfyui_worker.comfyui_client import ComfyUiClient
 from comfyui_worker.config import load_settings
+from comfyui_worker.events import ComfyUiEventListener, ComfyUiEventStreamClosed
+from comfyui_worker.history import output_files, output_texts
+from comfyui_worker.journal import PromptJournal
+from comfyui_worker.poller import QueuePoller, QueueSnapshot
+from comfyui_worker.polling import AdaptivePolling, PollSchedule, fixed_schedule
+from comfyui_worker.recorder import WorkloadRecorder
+from comfyui_worker.scheduler import PromptScheduler
+from comfyui_worker.singleflight import SingleFlight
+from comfyui_worker.task_input import BatchInput, TaskInput, parse_task_input
+from comfyui_worker.templates import (
+    TemplateError,
+    TemplateStore,
+    WorkflowTemplate,
+    patch_workflow,
+)
+from comfyui_worker.workflow import (
+    model_fingerprint,
+    workflow_fingerprint,
+    workflow_hash,
+)
 
 module_logger = logging.getLogger(__name__)
 
+# Failures that are reported per batch variant: ComfyUI HTTP errors,
+# timeouts and dropped event streams (OSError), failed prompts and
+# unavailable backends (RuntimeError), and invalid workflows or outputs.
+_VARIANT_ERRORS = (httpx.HTTPError, OSError, RuntimeError, ValueError)
+
+# Pauses before fetching history again when a completion event beat
+# ComfyUI's history write, before falling back to the slower poller.
+_HISTORY_RETRY_DELAYS = (0.05, 0.2)
+
+# Set once the task workers have stopped. Handlers cancelled after that are
+# torn down for a restart, not abandoned: their prompts keep running in
+# ComfyUI and stay journaled for the next worker to reattach to.
+_shutting_down = False
+
+
+def begin_shutdown() -> None:
+    """Leave in-flight prompts running when their handlers are cancelled."""
+    global _shutting_down
+    _shutting_down = True
+
+
+def _interrupted_by_shutdown(exc: BaseException) -> bool:
+    return _shutting_down and isinstance(exc, asyncio.CancelledError)
+
 
 def _extract_outputs(history: dict[str, Any]) -> list[str]:
-    outputs: list[str] = []
-    for node in history.get("outputs", {}).values():
-        for image in node.get("images", []):
-            filename = image.get("filename")
-            if filename:
-                outputs.append(filename)
+    """Output paths relative to ComfyUI's output directory.
+
+    Preview and other ``temp`` files live outside that directory and are
+    left out; fetch mode downloads them over /view instead.
+    """
+    return [
+        os.path.join(ref["subfolder"], ref["filename"])
+        for ref in _extract_output_refs(history)
+        if ref["type"] == "output"
+    ]
+
+
+def _extract_output_refs(history: dict[str, Any]) -> list[dict[str, str]]:
+    """Return filename, subfolder and type for every file in ``history``."""
+    refs = [
+        {"filename": file.filename, "subfolder": file.subfolder, "type": file.type}
+        for file in output_files(history)
+    ]
     module_logger.debug(
         "Parsed history outputs",
-        extra={"output_count": len(outputs)},
+        extra={"output_count": len(refs)},
     )
-    return outputs
+    return refs
+
+
+def _with_texts(result: dict[str, Any], history: dict[str, Any]) -> dict[str, Any]:
+    texts = output_texts(history)
+    if texts:
+        result["texts"] = texts
+    return result
 
 
-def _execute_workflow(
+async def _execute_workflow(
     client: ComfyUiClient,
     workflow: dict[str, Any],
     output_dir: str,
     logger: Any,
     poll_interval: int,
     history_timeout: int,
+    events: ComfyUiEventListener | None = None,
+    scheduler: PromptScheduler | None = None,
+    poller: QueuePoller | None = None,
+    polling: AdaptivePolling | None = None,
+    model: str = "",
+    output_mode: str = "path",
+    stats: dict[str, Any] | None = None,
+    priority: str = "normal",
+    resume: str | None = None,
+    on_submit: Callable[[str], Awaitable[Any]] | None = None,
+) -> dict[str, Any]:
+    """Submit a workflow, or reattach to prompt ``resume``, and collect its outputs.
+
+    ``resume`` is only waited on while ComfyUI still has it queued, running
+    or in its history; otherwise the workflow is submitted again. A resumed
+    prompt is polled rather than waited on over ``events``: it may have
+    finished before the restart, or been submitted under another client id.
+    """
+    fingerprint = workflow_fingerprint(workflow) if polling is not None else ""
+    if scheduler is not None:
+        slot = scheduler.slot(model, priority)
+    else:
+        slot = contextlib.nullcontext()
+    async with contextlib.AsyncExitStack() as stack:
+        slot_started = time.monotonic()
+        with _phase("slot_wait"):
+            await stack.enter_async_context(slot)
+        slot_wait = time.monotonic() - slot_started
+        metrics.LANE_WAIT_SECONDS.labels(priority, "local").observe(slot_wait)
+        submitted_at = time.time()
+        resumed = False
+        history = None
+        with _phase("submit") as span:
+            if resume is not None:
+                resumed, history = await _find_prompt(client, resume)
+            if resume is not None and resumed:
+                prompt_id = resume
+                metrics.PROMPTS_REATTACHED.inc()
+                module_logger.info(
+                    "Reattached to workflow", extra={"prompt_id": prompt_id}
+                )
+            else:
+                # High-priority prompts jump ComfyUI's pending queue as well.
+                prompt_id = await client.submit_prompt(
+                    workflow, front=priority == "high"
+                )
+                module_logger.info("Submitted workflow", extra={"prompt_id": prompt_id})
+                if on_submit is not None:
+                    await on_submit(prompt_id)
+            span.set_attribute("comfyui.prompt_id", prompt_id)
+        if polling is not None:
+            schedule = polling.schedule(fingerprint)
+        else:
+            schedule = fixed_schedule(poll_interval)
+
+        with _phase("wait", {"comfyui.prompt_id": prompt_id}) as span:
+            try:
+                if history is None:
+                    history = await _wait_for_history(
+                        client,
+                        prompt_id,
+                        logger,
+                        schedule,
+                        history_timeout,
+                        None if resumed else events,
+                        poller,
+                    )
+            except (TimeoutError, asyncio.CancelledError) as exc:
+                if _interrupted_by_shutdown(exc):
+                    raise
+                # Stop ComfyUI spending GPU time on a result nobody will
+                # collect; the slot is released only once it is gone.
+                reason = "timeout" if isinstance(exc, TimeoutError) else "cancelled"
+                await _abandon_prompt(client, prompt_id, schedule, reason, events)
+                raise
+            queued, executed = metrics.observe_history_timing(history, submitted_at)
+            if queued is not None:
+                metrics.LANE_WAIT_SECONDS.labels(priority, "comfyui").observe(queued)
+            if stats is not None:
+                stats.update(
+                    slot_wait=round(slot_wait, 4),
+                    queued=queued,
+                    execute=executed,
+                    polls=schedule.polls,
+                )
+            span.set_attribute("comfyui.polls", schedule.polls)
+            if queued is not None:
+                span.set_attribute("comfyui.queued_sec", queued)
+            if executed is not None:
+                span.set_attribute("comfyui.execute_sec", executed)
+        metrics.POLLS_PER_PROMPT.observe(schedule.polls)
+        if polling is not None:
+            polling.complete(fingerprint, schedule, executed)
+
+    # Downloads run after the slot is released; the GPU is already free.
+    with _phase("outputs", {"comfyui.prompt_id": prompt_id}):
+        if output_mode == "fetch":
+            return await _fetch_outputs(client, prompt_id, history, output_dir)
+        return _resolve_outputs(prompt_id, history, output_dir)
+
+
+async def _wait_for_history(
+    client: ComfyUiClient,
+    prompt_id: str,
+    logger: Any,
+    schedule: PollSchedule,
+    history_timeout: int,
+    events: ComfyUiEventListener | None,
+    poller: QueuePoller | None,
+) -> dict[str, Any]:
+    history = None
+    if events is not None:
+        history = await _wait_for_events(client, events, prompt_id, history_timeout)
+    if history is None and poller is not None:
+        history = await poller.wait_for_history(
+            prompt_id, timeout=history_timeout, log=logger, schedule=schedule
+        )
+    if history is None:
+        history = await _poll_for_history(
+            client, prompt_id, logger, schedule, history_timeout
+        )
+    return history
+
+
+# Cancellations in progress, kept referenced until they finish even if the
+# task that started them is cancelled again.
+_cancellations: set[asyncio.Task[None]] = set()
+
+
+async def _abandon_prompt(
+    client: ComfyUiClient,
+    prompt_id: str,
+    schedule: PollSchedule,
+    reason: str,
+    events: ComfyUiEventListener | None = None,
+) -> None:
+    running = schedule.executing
+    if running is None and events is not None:
+        running = events.running_for(prompt_id)
+    if running is None:
+        # It started after submission, so this bounds reclaimed time low.
+        running = schedule.elapsed
+    task = asyncio.ensure_future(
+        _cancel_prompt(client, prompt_id, schedule.predicted, running, reason)
+    )
+    _cancellations.add(task)
+    task.add_done_callback(_cancellations.discard)
+    await asyncio.shield(task)
+
+
+async def _cancel_prompt(
+    client: ComfyUiClient,
+    prompt_id: str,
+    predicted: float | None,
+    running: float,
+    reason: str,
+) -> None:
+    """Dequeue ``prompt_id`` if it is pending, or interrupt it if running.
+
+    Reclaimed GPU time is estimated from the predicted execution time: all
+    of it for a dequeued prompt, what is left after ``running`` seconds of
+    execution for an interrupted one.
+    """
+    action = "finished"
+    try:
+        queue = QueueSnapshot(await client.get_queue())
+        if prompt_id in queue.pending:
+            await client.delete_from_queue([prompt_id])
+            action = "dequeued"
+            # It may have started between the snapshot and the delete.
+            queue = QueueSnapshot(await client.get_queue())
+        if prompt_id in queue.running:
+            await client.interrupt(prompt_id)
+            action = "interrupted"
+    except (httpx.HTTPError, ValueError) as exc:
+        metrics.PROMPTS_CANCELLED.labels("failed").inc()
+        module_logger.warning(
+            "Failed to cancel ComfyUI prompt",
+            extra={"prompt_id": prompt_id, "reason": reason, "error": str(exc)},
+        )
+        return
+    reclaimed = 0.0
+    if predicted is not None and action == "dequeued":
+        reclaimed = predicted
+    elif predicted is not None and action == "interrupted":
+        reclaimed = max(0.0, predicted - running)
+    metrics.PROMPTS_CANCELLED.labels(action).inc()
+    metrics.RECLAIMED_GPU_SECONDS.inc(reclaimed)
+    module_logger.info(
+        "Cancelled ComfyUI prompt",
+        extra={
+            "prompt_id": prompt_id,
+            "reason": reason,
+            "action": action,
+            "reclaimed_gpu_sec": round(reclaimed, 3),
+        },
+    )
+
+
+@contextlib.contextmanager
+def _phase(
+    name: str, attributes: dict[str, Any] | None = None
+) -> Iterator[tracing.AnySpan]:
+    """Time one task phase as a histogram sample and a trace span."""
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"comfyui.{name}", attributes=attributes) as span:
+            yield span
+    finally:
+        metrics.observe_phase(name, time.perf_counter() - start)
+
+
+def _task_attributes(ctx: WorkerContext) -> dict[str, Any]:
+    try:
+        return {
+            "littlehorse.wf_run_id": ctx.wf_run_id.id,
+            "littlehorse.task_guid": ctx.task_run_id.task_guid,
+            "littlehorse.attempt_number": ctx.attempt_number,
+        }
+    except AttributeError:
+        return {}
+
+
+def _task_key(ctx: WorkerContext) -> str:
+    """Identify a task run across attempts, or "" outside LittleHorse."""
+    try:
+        return f"{ctx.wf_run_id.id}/{ctx.task_run_id.task_guid}"
+    except AttributeError:
+        return ""
+
+
+async def _wait_for_events(
+    client: ComfyUiClient,
+    events: ComfyUiEventListener,
+    prompt_id: str,
+    history_timeout: int,
+) -> dict[str, Any] | None:
+    """Wait for the completion event, then fetch history.
+
+    The fetch is retried briefly in case it raced ComfyUI storing the entry.
+    Returns None when the event stream is unavailable, or the entry has not
+    appeared by then, so the caller falls back to polling.
+    """
+    try:
+        await events.wait_for_completion(prompt_id, timeout=history_timeout)
+    except ComfyUiEventStreamClosed:
+        module_logger.warning(
+            "ComfyUI event stream unavailable, falling back to polling",
+            extra={"prompt_id": prompt_id},
+        )
+        return None
+    except TimeoutError as exc:
+        raise TimeoutError("ComfyUI execution wait timed out") from exc
+    history = await client.get_history(prompt_id)
+    for delay in _HISTORY_RETRY_DELAYS:
+        if history is not None:
+            break
+        await asyncio.sleep(delay)
+        history = await client.get_history(prompt_id)
+    return history
+
+
+async def _poll_for_history(
+    client: ComfyUiClient,
+    prompt_id: str,
+    logger: Any,
+    schedule: PollSchedule,
+    history_timeout: int,
 ) -> dict[str, Any]:
-    prompt_id = client.submit_prompt(workflow)
-    module_logger.info("Submitted workflow", extra={"prompt_id": prompt_id})
     queue_start = time.monotonic()
-    while client.is_in_queue(prompt_id):
+    while await client.is_in_queue(prompt_id):
         if time.monotonic() - queue_start >= history_timeout:
             raise TimeoutError("ComfyUI queue wait timed out")
         logger(f"prompt {prompt_id} still queued")
-        time.sleep(poll_interval)
+        await asyncio.sleep(schedule.next_delay())
 
     history_start = time.monotonic()
     history = None
     while history is None:
         if time.monotonic() - history_start >= history_timeout:
             raise TimeoutError("ComfyUI history wait timed out")
-        history = client.get_history(prompt_id)
+        history = await client.get_history(prompt_id)
         if history is None:
-            time.sleep(poll_interval)
+            await asyncio.sleep(schedule.next_delay())
+    return history
 
+
+def _resolve_outputs(
+    prompt_id: str,
+    history: dict[str, Any],
+    output_dir: str,
+) -> dict[str, Any]:
     filenames = _extract_outputs(history)
     outputs = []
     for name in filenames:
@@ -59,20 +406,88 @@ def _execute_workflow(
         outputs.append(str(path if path.is_absolute() else Path(output_dir) / path))
     module_logger.info(
         "Workflow outputs resolved",
-        extra={"prompt_id": prompt_id, "output_count": len(outputs)},
+        extra={
+            "prompt_id": prompt_id,
+            "output_count": len(outputs),
+            "skipped_count": len(output_files(history)) - len(outputs),
+        },
     )
-    return {"prompt_id": prompt_id, "outputs": outputs}
+    return _with_texts({"prompt_id": prompt_id, "outputs": outputs}, history)
 
 
-def execute_comfyui_workflow(
-    workflow: dict[str, Any],
+async def _fetch_outputs(
+    client: ComfyUiClient,
+    prompt_id: str,
+    history: dict[str, Any],
+    output_dir: str,
+) -> dict[str, Any]:
+    """Download every output over /view into ``output_dir/<prompt_id>``."""
+    root = (Path(output_dir) / prompt_id).resolve()
+    refs = _extract_output_refs(history)
+    destinations = []
+    for ref in refs:
+        destination = (root / ref["subfolder"] / ref["filename"]).resolve()
+        if not destination.is_relative_to(root):
+            raise ValueError(f"ComfyUI output escapes output dir: {ref['filename']}")
+        destinations.append(destination)
+    sizes = await asyncio.gather(
+        *(
+            client.download_output(
+                ref["filename"], ref["subfolder"], ref["type"], destination
+            )
+            for ref, destination in zip(refs, destinations)
+        )
+    )
+    module_logger.info(
+        "Workflow outputs downloaded",
+        extra={
+            "prompt_id": prompt_id,
+            "output_count": len(destinations),
+            "bytes": sum(sizes),
+        },
+    )
+    return _with_texts(
+        {"prompt_id": prompt_id, "outputs": [str(path) for path in destinations]},
+        history,
+    )
+
+
+async def _find_prompt(
+    client: ComfyUiClient, prompt_id: str
+) -> tuple[bool, dict[str, Any] | None]:
+    """Whether ComfyUI has the prompt queued, running or in its history.
+
+    Also returns its history when it has already finished. The queue is
+    checked first so a prompt finishing in between is still found.
+    """
+    try:
+        if await client.is_in_queue(prompt_id):
+            return True, None
+        history = await client.get_history(prompt_id)
+    except (httpx.HTTPError, ValueError) as exc:
+        module_logger.warning(
+            "Could not look up earlier prompt, resubmitting",
+            extra={"prompt_id": prompt_id, "error": str(exc)},
+        )
+        return False, None
+    return history is not None, history
+
+
+async def execute_comfyui_workflow(
+    payload: dict[str, Any],
     ctx: WorkerContext,
 ) -> dict[str, Any]:
     settings = load_settings()
+    task = parse_task_input(payload)
+    await _fetch_assets(task.assets, None)
+    workflow, _ = _resolve_workflow(task, templates=None)
     client = ComfyUiClient(
         base_url=settings.comfyui_base_url,
         timeout=settings.comfyui_http_timeout_sec,
         retries=settings.comfyui_http_retries,
+        max_connections=settings.comfyui_http_max_connections,
+        max_keepalive_connections=settings.comfyui_http_max_keepalive_connections,
+        keepalive_expiry=settings.comfyui_http_keepalive_expiry_sec,
     )
 
     ctx.log("submit workflow")
@@ -80,14 +495,19 @@ def execute_comfyui_workflow(
         "Executing task",
         extra={"workflow_keys": list(workflow.keys())},
     )
-    result = _execute_workflow(
-        client,
-        workflow,
-        settings.comfyui_output_dir,
-        ctx.log,
-        poll_interval=settings.comfyui_poll_interval_sec,
-        history_timeout=settings.comfyui_history_timeout_sec,
-    )
+    try:
+        result = await _execute_workflow(
+            client,
+            workflow,
+            settings.comfyui_output_dir,
+            ctx.log,
+            poll_interval=settings.comfyui_poll_interval_sec,
+            history_timeout=settings.comfyui_history_timeout_sec,
+            output_mode=settings.comfyui_output_mode,
+            priority=task.priority,
+        )
+    finally:
+        await client.aclose()
     ctx.log("workflow complete")
     module_logger.info(
         "Task complete",
@@ -96,34 +516,355 @@ def execute_comfyui_workflow(
     return result
 
 
+def _resolve_workflow(
+    task: TaskInput,
+    templates: TemplateStore | None,
+    inputs: dict[str, Asset] | None = None,
+) -> tuple[dict[str, Any], str]:
+    """Return the workflow to submit and its content hash.
+
+    ``inputs`` are fetched assets patched in by path; their names are
+    content hashes, so the key changes whenever an asset's content does.
+    """
+    names = {path: asset.value for path, asset in (inputs or {}).items()}
+    if task.workflow is not None:
+        workflow = patch_workflow(task.workflow, names) if names else task.workflow
+        return workflow, workflow_hash(workflow)
+    if templates is None:
+        raise TemplateError("workflow templates are not configured")
+    template = templates.get(task.template_id or "")
+    params = {**task.params, **names}
+    return template.render(params), template.key(params)
+
+
+async def _fetch_assets(
+    references: dict[str, str], assets: AssetUploader | None
+) -> dict[str, Asset]:
+    if not references:
+        return {}
+    if assets is None:
+        raise AssetError("input assets are not configured")
+    with _phase("asset_fetch"):
+        return await assets.fetch(references)
+
+
+async def _run_on_backend(
+    backends: BackendPool,
+    workflow: dict[str, Any],
+    log: Callable[[str], Any],
+    poll_interval: int,
+    history_timeout: int,
+    polling: AdaptivePolling | None = None,
+    artifacts: ArtifactUploader | None = None,
+    output_mode: str = "path",
+    stats: dict[str, Any] | None = None,
+    priority: str = "normal",
+    admission: AdmissionController | None = None,
+    journal: PromptJournal | None = None,
+    task_key: str = "",
+    assets: AssetUploader | None = None,
+    inputs: Iterable[Asset] = (),
+) -> dict[str, Any]:
+    """Run one workflow on the best backend and upload its artifacts.
+
+    With a ``journal``, the prompt is recorded under ``task_key`` so a retry
+    of the same task reattaches to it instead of submitting again.
+    """
+    model = model_fingerprint(workflow)
+    if admission is not None and stats is None:
+        stats = {}
+    if not task_key:
+        journal = None
+    whash = workflow_hash(workflow) if journal is not None else ""
+    earlier = await journal.get(task_key) if journal is not None else None
+    if earlier is not None and earlier.workflow_hash != whash:
+        earlier = None
+    async with backends.route(model, earlier.backend if earlier else None) as backend:
+        resume = None
+        on_submit = None
+        if journal is not None:
+            if earlier is not None and earlier.backend == backend.name:
+                resume = earlier.prompt_id
+            on_submit = functools.partial(
+                journal.record, task_key, backend=backend.name, workflow_hash=whash
+            )
+        try:
+            if assets is not None and inputs:
+                with _phase("asset_upload"):
+                    await assets.upload(backend.client, inputs)
+            result = await _execute_workflow(
+                backend.client,
+                workflow,
+                backend.output_dir,
+                log,
+                poll_interval,
+                history_timeout,
+                events=backend.events,
+                scheduler=backend.scheduler,
+                poller=backend.poller,
+                polling=polling,
+                model=model,
+                output_mode=output_mode,
+                stats=stats,
+                priority=priority,
+                resume=resume,
+                on_submit=on_submit,
+            )
+        except BaseException as exc:
+            if journal is not None and not _interrupted_by_shutdown(exc):
+                # The prompt was abandoned or failed; a retry starts over.
+                await journal.discard(task_key)
+            if admission is not None and isinstance(exc, TimeoutError):
+                admission.observe(history_timeout, None)
+            raise
+    if journal is not None:
+        await journal.finish(task_key)
+    if admission is not None and stats is not None:
+        admission.observe(
+            stats.get("slot_wait", 0.0) + (stats.get("queued") or 0.0),
+            stats.get("execute"),
+        )
+    module_logger.info(
+        "Task complete",
+        extra={"prompt_id": result.get("prompt_id"), "backend": backend.name},
+    )
+    if artifacts is not None:
+        log("upload output artifacts")
+        with _phase("artifacts"):
+            # Keys keep each output's path under the output directory, so
+            # same-named files from different subfolders stay apart.
+            root = Path(backend.output_dir)
+            if output_mode == "fetch":
+                root = root.resolve() / result["prompt_id"]
+            result["artifacts"] = await artifacts.upload(
+                result["prompt_id"], result["outputs"], str(root)
+            )
+    return result
+
+
 def build_task_handler(
-    client: Any,
-    output_dir: str,
+    backends: BackendPool,
     poll_interval: int,
     history_timeout: int,
+    polling: AdaptivePolling | None = None,
+    cache: ResultCache | None = None,
+    singleflight: SingleFlight | None = None,
+    templates: TemplateStore | None = None,
+    artifacts: ArtifactUploader | None = None,
+    output_mode: str = "path",
+    recorder: WorkloadRecorder | None = None,
+    admission: AdmissionController | None = None,
+    journal: PromptJournal | None = None,
+    assets: AssetUploader | None = None,
 ) -> Callable[[dict[str, Any], WorkerContext], Awaitable[dict[str, Any]]]:
     """Build an async task handler for LittleHorse worker registration."""
 
-    async def handler(workflow: dict[str, Any], ctx: WorkerContext) -> dict[str, Any]:
-        ctx.log("submit workflow")
-        module_logger.info(
-            "Executing task",
-            extra={"workflow_keys": list(workflow.keys())},
-        )
-        result = await asyncio.to_thread(
-            _execute_workflow,
-            client,
-            workflow,
-            output_dir,
-            ctx.log,
-            poll_interval,
-            history_timeout,
-        )
+    async def handler(payload: dict[str, Any], ctx: WorkerContext) -> dict[str, Any]:
+        with _phase("task", _task_attributes(ctx)):
+            if recorder is None:
+                return await handle(payload, ctx, None)
+            return await _recorded(recorder, payload, ctx, handle)
+
+    async def handle(
+        payload: dict[str, Any], ctx: WorkerContext, stats: dict[str, Any] | None
+    ) -> dict[str, Any]:
+        task = parse_task_input(payload)
+        inputs = await _fetch_assets(task.assets, assets)
+        workflow, key = _resolve_workflow(task, templates, inputs)
+        use_cache = cache is not None and task.cache
+        if stats is not None:
+            stats.update(
+                fp=workflow_fingerprint(workflow), model=model_fingerprint(workflow)
+            )
+            if recorder is not None and recorder.include_payloads:
+                stats["workflow"] = workflow
+        if use_cache:
+            cached = cache.get(key)
+            if cached is not None:
+                if stats is not None:
+                    stats["cached"] = True
+                ctx.log("workflow result served from cache")
+                module_logger.info(
+                    "Task served from cache",
+                    extra={"prompt_id": cached.get("prompt_id"), "key": key},
+                )
+                return cached
+
+        async def run() -> dict[str, Any]:
+            ctx.log("submit workflow")
+            module_logger.info(
+                "Executing task",
+                extra={
+                    "workflow_keys": list(workflow.keys()),
+                    "template_id": task.template_id,
+                },
+            )
+            result = await _run_on_backend(
+                backends,
+                workflow,
+                ctx.log,
+                poll_interval,
+                history_timeout,
+                polling=polling,
+                artifacts=artifacts,
+                output_mode=output_mode,
+                stats=stats,
+                priority=task.priority,
+                admission=admission,
+                journal=journal,
+                task_key=_task_key(ctx),
+                assets=assets,
+                inputs=inputs.values(),
+            )
+            if use_cache:
+                cache.put(key, result)
+            return result
+
+        if singleflight is not None and task.dedupe:
+            if key in singleflight:
+                ctx.log("identical workflow already in flight, sharing its result")
+            result = await singleflight.do(key, run)
+        else:
+            result = await run()
         ctx.log("workflow complete")
+        return result
+
+    return handler
+
+
+async def _recorded(
+    recorder: WorkloadRecorder,
+    payload: dict[str, Any],
+    ctx: WorkerContext,
+    handle: Callable[
+        [dict[str, Any], WorkerContext, dict[str, Any] | None],
+        Awaitable[dict[str, Any]],
+    ],
+) -> dict[str, Any]:
+    stats: dict[str, Any] = {
+        "t": time.time(),
+        "bytes": len(json.dumps(payload, separators=(",", ":"))),
+    }
+    start = time.perf_counter()
+    try:
+        result = await handle(payload, ctx, stats)
+    except BaseException as exc:
+        stats.update(ok=False, error=type(exc).__name__)
+        raise
+    else:
+        stats["ok"] = True
+        return result
+    finally:
+        stats["total"] = round(time.perf_counter() - start, 4)
+        recorder.record(stats)
+
+
+def build_batch_handler(
+    backends: BackendPool,
+    poll_interval: int,
+    history_timeout: int,
+    polling: AdaptivePolling | None = None,
+    cache: ResultCache | None = None,
+    templates: TemplateStore | None = None,
+    artifacts: ArtifactUploader | None = None,
+    output_mode: str = "path",
+    admission: AdmissionController | None = None,
+    journal: PromptJournal | None = None,
+    assets: AssetUploader | None = None,
+) -> Callable[[dict[str, Any], WorkerContext], Awaitable[dict[str, Any]]]:
+    """Build the handler for sweep tasks: one base workflow, many overrides.
+
+    At most ``concurrency`` variants are in progress at once, by default the
+    pool's total in-flight depth, and results come back in input order. A
+    failed variant is reported in place; the task fails only if all do.
+    """
+    default_concurrency = sum(
+        backend.scheduler.depth if backend.scheduler is not None else 1
+        for backend in backends.backends
+    )
+
+    async def handler(payload: dict[str, Any], ctx: WorkerContext) -> dict[str, Any]:
+        with _phase("batch", _task_attributes(ctx)):
+            batch = BatchInput.model_validate(payload)
+            base = _batch_base(batch, templates)
+            inputs = await _fetch_assets(batch.assets, assets)
+            names = {path: asset.value for path, asset in inputs.items()}
+            total = len(batch.overrides)
+            limit = asyncio.Semaphore(batch.concurrency or default_concurrency)
+            task_key = _task_key(ctx)
+            finished = 0
+
+            async def run(index: int, override: dict[str, Any]) -> dict[str, Any]:
+                params = {**batch.params, **names, **override}
+                workflow = base.render(params)
+                key = base.key(params) if batch.template_id else workflow_hash(workflow)
+                use_cache = cache is not None and batch.cache
+                if use_cache:
+                    cached = cache.get(key)
+                    if cached is not None:
+                        return cached
+                result = await _run_on_backend(
+                    backends,
+                    workflow,
+                    ctx.log,
+                    poll_interval,
+                    history_timeout,
+                    polling=polling,
+                    artifacts=artifacts,
+                    output_mode=output_mode,
+                    priority=batch.priority,
+                    admission=admission,
+                    journal=journal,
+                    task_key=f"{task_key}#{index}" if task_key else "",
+                    assets=assets,
+                    inputs=inputs.values(),
+                )
+                if use_cache:
+                    cache.put(key, result)
+                return result
+
+            async def variant(index: int, override: dict[str, Any]) -> dict[str, Any]:
+                nonlocal finished
+                async with limit:
+                    try:
+                        entry = {"index": index, **await run(index, override)}
+                    except _VARIANT_ERRORS as exc:
+                        entry = {
+                            "index": index,
+                            "error": f"{type(exc).__name__}: {exc}",
+                        }
+                finished += 1
+                state = "failed" if "error" in entry else "complete"
+                ctx.log(f"variant {index} {state} ({finished}/{total})")
+                return entry
+
+            ctx.log(f"submit {total} variants")
+            results = await asyncio.gather(
+                *(
+                    variant(index, override)
+                    for index, override in enumerate(batch.overrides)
+                )
+            )
+        failed = sum("error" in entry for entry in results)
         module_logger.info(
-            "Task complete",
-            extra={"prompt_id": result.get("prompt_id")},
+            "Batch complete",
+            extra={"variants": total, "failed": failed},
         )
-        return result
+        if failed == total:
+            raise RuntimeError(f"all {total} variants failed: {results[0]['error']}")
+        return {
+            "results": results,
+            "outputs": [path for entry in results for path in entry.get("outputs", [])],
+            "succeeded": total - failed,
+            "failed": failed,
+        }
 
     return handler
+
+
+def _batch_base(batch: BatchInput, templates: TemplateStore | None) -> WorkflowTemplate:
+    if batch.workflow is not None:
+        return WorkflowTemplate("batch", batch.workflow)
+    if templates is None:
+        raise TemplateError("workflow templates are not configured")
+    return templates.get(batch.template_id or "")
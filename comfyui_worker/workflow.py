@@ -0,0 +1,72 @@
+import hashlib
+import json
+from typing import Any
+
+# Inputs that change how long a node runs, as opposed to what it produces.
+_RUNTIME_INPUTS = frozenset(
+    {
+        "steps",
+        "width",
+        "height",
+        "batch_size",
+        "length",
+        "frames",
+        "num_frames",
+        "frame_count",
+        "upscale_by",
+        "scale_by",
+    }
+)
+
+
+def _digest(value: Any) -> str:
+    encoded = json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def workflow_fingerprint(workflow: dict[str, Any]) -> str:
+    """Fingerprint a workflow by its graph shape and size-like inputs.
+
+    Seeds, prompts and other content inputs are ignored so repeated runs of
+    the same pipeline share a fingerprint for runtime prediction.
+    """
+    parts = []
+    for node_id in sorted(workflow):
+        node = workflow[node_id]
+        if not isinstance(node, dict):
+            continue
+        inputs = node.get("inputs") or {}
+        shape = sorted(
+            (name, value)
+            for name, value in inputs.items()
+            if name in _RUNTIME_INPUTS and isinstance(value, (int, float, str))
+        )
+        parts.append([node_id, node.get("class_type"), shape])
+    return _digest(parts)[:16]
+
+
+def workflow_hash(workflow: dict[str, Any]) -> str:
+    """Content hash of the full workflow, independent of key order."""
+    return _digest(workflow)
+
+
+def model_fingerprint(workflow: dict[str, Any]) -> str:
+    """Fingerprint the models a workflow loads, or "" when it loads none.
+
+    Covers checkpoint, LoRA, VAE, UNet, CLIP, ControlNet and other loader
+    nodes by their ``*_name`` inputs, so prompts that share a fingerprint
+    can run back to back without ComfyUI swapping models.
+    """
+    models = set()
+    for node in workflow.values():
+        if not isinstance(node, dict):
+            continue
+        class_type = node.get("class_type") or ""
+        if "Loader" not in class_type:
+            continue
+        for name, value in (node.get("inputs") or {}).items():
+            if name.endswith("_name") and isinstance(value, str):
+                models.add((class_type, name, value))
+    if not models:
+        return ""
+    return _digest(sorted(models))[:16]
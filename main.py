@@ -2,14 +2,43 @@ import asyncio
 import logging
 import os
 import time
+from collections.abc import Awaitable
+from typing import Any
 
+import grpc
 import littlehorse
 from littlehorse.config import LHConfig
+from littlehorse.model import TaskDefId
 from littlehorse.worker import LHTaskWorker
 
+from comfyui_worker import tracing
+from comfyui_worker.admission import AdmissionController, gate_task_worker
+from comfyui_worker.artifacts import ArtifactUploader, build_sink
+from comfyui_worker.assets import AssetUploader
+from comfyui_worker.backends import BackendPool, ComfyUiBackend
+from comfyui_worker.cache import ResultCache
 from comfyui_worker.comfyui_client import ComfyUiClient
-from comfyui_worker.config import load_settings
-from comfyui_worker.worker import build_task_handler
+from comfyui_worker.config import Settings, load_settings
+from comfyui_worker.events import ComfyUiEventListener
+from comfyui_worker.journal import PromptJournal
+from comfyui_worker.metrics import WorkerCollector, start_metrics_server
+from comfyui_worker.poller import QueuePoller
+from comfyui_worker.polling import AdaptivePolling
+from comfyui_worker.recorder import WorkloadRecorder
+from comfyui_worker.scheduler import PromptScheduler
+from comfyui_worker.singleflight import SingleFlight
+from comfyui_worker.templates import TemplateStore
+from comfyui_worker.tracing import (
+    JsonFileExporter,
+    OtlpHttpExporter,
+    SpanExporter,
+    Tracer,
+)
+from comfyui_worker.worker import (
+    begin_shutdown,
+    build_batch_handler,
+    build_task_handler,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -26,62 +55,289 @@ def configure_logging() -> None:
     logger.info("Logging configured", extra={"level": level_name})
 
 
-def wait_for_comfyui(
-    client: ComfyUiClient,
+async def wait_for_comfyui(
+    client: ComfyUiClient | BackendPool,
     interval: int,
     timeout: int,
+    min_interval: float = 0.1,
 ) -> None:
-    """Poll ComfyUI until it responds or timeout is reached."""
+    """Poll ComfyUI until it responds or timeout is reached.
+
+    Probes start ``min_interval`` apart and double up to ``interval``, so a
+    ComfyUI that is already up is noticed immediately.
+    """
     logger.info(
         "Waiting for ComfyUI to become available",
         extra={"interval": interval, "timeout": timeout},
     )
     start = time.monotonic()
+    delay = min(min_interval, interval)
     while time.monotonic() - start < timeout:
-        if client.health_check():
-            logger.info("ComfyUI is available")
+        if await client.health_check():
+            logger.info(
+                "ComfyUI is available",
+                extra={"elapsed": round(time.monotonic() - start, 3)},
+            )
             return
         logger.debug(
             "ComfyUI not ready, retrying",
-            extra={"elapsed": time.monotonic() - start},
+            extra={"elapsed": time.monotonic() - start, "delay": delay},
         )
-        time.sleep(interval)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, interval)
     raise TimeoutError(f"ComfyUI not available after {timeout}s")
 
 
-def build_worker() -> LHTaskWorker:
+def register_task_def(
+    worker: LHTaskWorker,
+    config: LHConfig,
+    task_name: str,
+    timeout: float = 30.0,
+) -> None:
+    """Register the task definition and return once the server serves it.
+
+    Blocking; run it in a thread. Replaces a fixed sleep before starting
+    the worker, whose first call fetches the definition back.
+    """
+    worker.register_task_def()
+    stub = config.stub()
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while True:
+        try:
+            stub.GetTaskDef(TaskDefId(name=task_name), timeout=5)
+            return
+        except grpc.RpcError as exc:
+            if exc.code() != grpc.StatusCode.NOT_FOUND:
+                raise
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(
+                    f"Task definition {task_name} not visible after {timeout}s"
+                ) from exc
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
+
+async def _timed(awaitable: Awaitable[Any]) -> float:
+    start = time.perf_counter()
+    await awaitable
+    return time.perf_counter() - start
+
+
+def build_backend_pool(settings: Settings) -> BackendPool:
+    """Create a client, event listener and scheduler per ComfyUI backend."""
+    backends = []
+    for base_url, output_dir in zip(
+        settings.comfyui_base_urls, settings.comfyui_output_dirs
+    ):
+        client = ComfyUiClient(
+            base_url=base_url,
+            timeout=settings.comfyui_http_timeout_sec,
+            retries=settings.comfyui_http_retries,
+            max_connections=settings.comfyui_http_max_connections,
+            max_keepalive_connections=settings.comfyui_http_max_keepalive_connections,
+            keepalive_expiry=settings.comfyui_http_keepalive_expiry_sec,
+            client_id=settings.comfyui_client_id,
+        )
+        events = None
+        if settings.comfyui_use_websocket:
+            events = ComfyUiEventListener(
+                base_url=base_url,
+                client_id=settings.comfyui_client_id,
+            )
+            events.start()
+        backends.append(
+            ComfyUiBackend(
+                client=client,
+                output_dir=output_dir,
+                events=events,
+                scheduler=PromptScheduler(
+                    settings.comfyui_in_flight_depth,
+                    max_wait=settings.comfyui_affinity_max_wait_sec,
+                    aging=settings.comfyui_priority_aging_sec,
+                ),
+                poller=QueuePoller(client, interval=settings.comfyui_poll_interval_sec),
+                failure_threshold=settings.comfyui_backend_failure_threshold,
+            )
+        )
+    logger.info(
+        "ComfyUI backends configured",
+        extra={"backends": settings.comfyui_base_urls},
+    )
+    return BackendPool(
+        backends,
+        refresh_interval=settings.comfyui_backend_refresh_interval_sec,
+    )
+
+
+def build_result_cache(settings: Settings) -> ResultCache | None:
+    if settings.comfyui_cache_max_entries == 0:
+        return None
+    return ResultCache(
+        max_entries=settings.comfyui_cache_max_entries,
+        max_bytes=settings.comfyui_cache_max_bytes,
+        index_path=settings.comfyui_cache_index_path,
+    )
+
+
+def build_template_store(settings: Settings) -> TemplateStore | None:
+    if settings.comfyui_template_dir is None:
+        return None
+    templates = TemplateStore(
+        settings.comfyui_template_dir,
+        reload_interval=settings.comfyui_template_reload_interval_sec,
+    )
+    templates.load()
+    logger.info(
+        "Workflow templates loaded",
+        extra={"template_dir": settings.comfyui_template_dir, "count": len(templates)},
+    )
+    return templates
+
+
+def build_artifact_uploader(settings: Settings) -> ArtifactUploader | None:
+    if settings.comfyui_artifact_uri is None:
+        return None
+    sink = build_sink(
+        settings.comfyui_artifact_uri,
+        endpoint_url=settings.comfyui_s3_endpoint_url,
+        part_size=settings.comfyui_artifact_part_size,
+    )
+    return ArtifactUploader(sink, concurrency=settings.comfyui_artifact_concurrency)
+
+
+def build_asset_uploader(settings: Settings) -> AssetUploader:
+    return AssetUploader(
+        root=settings.comfyui_asset_root,
+        max_entries=settings.comfyui_asset_cache_entries,
+        max_bytes=settings.comfyui_asset_max_bytes,
+        timeout=settings.comfyui_http_timeout_sec,
+    )
+
+
+def build_tracer(settings: Settings) -> Tracer | None:
+    """Create the span exporter; OTLP wins when both targets are set."""
+    exporter: SpanExporter
+    if settings.comfyui_trace_otlp_endpoint is not None:
+        exporter = OtlpHttpExporter(settings.comfyui_trace_otlp_endpoint)
+    elif settings.comfyui_trace_file is not None:
+        exporter = JsonFileExporter(settings.comfyui_trace_file)
+    else:
+        return None
+    return Tracer(exporter, sample_rate=settings.comfyui_trace_sample_rate)
+
+
+def build_recorder(settings: Settings) -> WorkloadRecorder | None:
+    if settings.comfyui_record_file is None:
+        return None
+    return WorkloadRecorder(
+        settings.comfyui_record_file,
+        include_payloads=settings.comfyui_record_payloads,
+    )
+
+
+def build_journal(settings: Settings) -> PromptJournal | None:
+    if settings.comfyui_journal_path is None:
+        return None
+    journal = PromptJournal(settings.comfyui_journal_path)
+    logger.info("Prompt journal opened", extra={"path": journal.path})
+    return journal
+
+
+def build_admission(
+    settings: Settings, backends: BackendPool, threads: int
+) -> AdmissionController | None:
+    """Gate task intake on load and backend health, or return None if neither is on."""
+    budget = settings.comfyui_admission_wait_budget_sec
+    pause = settings.comfyui_pause_when_unavailable
+    if budget is None and not pause:
+        return None
+    return AdmissionController(
+        max_limit=threads,
+        wait_budget=budget,
+        target_wait=settings.comfyui_admission_target_wait_sec if budget else None,
+        backlog=backends.backlog,
+        available=backends.available if pause else lambda: True,
+        # Start where every backend's in-flight slots are just filled.
+        initial_limit=(
+            settings.comfyui_in_flight_depth * len(backends.backends)
+            if budget
+            else threads
+        ),
+    )
+
+
+async def build_workers() -> list[LHTaskWorker]:
+    """Build the workflow worker, plus the batch worker if LHW_BATCH_TASK_NAME is set."""
     task_name = os.getenv("LHW_TASK_NAME")
     if not task_name:
         raise ValueError("LHW_TASK_NAME must be set")
     threads = os.getenv("LHW_NUM_WORKER_THREADS")
     if not threads:
-        raise ValueError("LHW_NUM_WORKER_THREADS must be set to 1")
-    if threads != "1":
-        raise ValueError("LHW_NUM_WORKER_THREADS must be set to 1")
+        raise ValueError("LHW_NUM_WORKER_THREADS must be set")
+    if not threads.isdigit() or int(threads) < 1:
+        raise ValueError("LHW_NUM_WORKER_THREADS must be a positive integer")
+
+    started = time.perf_counter()
+    settings = load_settings()
+    backend_count = len(settings.comfyui_base_urls)
+    # Each accepted task holds at most one prompt, so accepting fewer tasks
+    # than the total in-flight depth would leave ComfyUI queues underfilled.
+    if int(threads) < settings.comfyui_in_flight_depth * backend_count:
+        raise ValueError(
+            "LHW_NUM_WORKER_THREADS must be at least COMFYUI_IN_FLIGHT_DEPTH "
+            "per ComfyUI backend"
+        )
     logger.info(
         "Worker configuration validated",
-        extra={"task_name": task_name, "threads": threads},
+        extra={
+            "task_name": task_name,
+            "threads": threads,
+            "in_flight_depth": settings.comfyui_in_flight_depth,
+            "backend_count": backend_count,
+        },
     )
 
-    settings = load_settings()
-    client = ComfyUiClient(
-        base_url=settings.comfyui_base_url,
-        timeout=settings.comfyui_http_timeout_sec,
-        retries=settings.comfyui_http_retries,
-    )
+    tracer = build_tracer(settings)
+    if tracer is not None:
+        tracing.configure(tracer)
+        tracer.start()
+
+    backends = build_backend_pool(settings)
 
-    # Wait for ComfyUI to be available before registering the task
-    wait_for_comfyui(
-        client,
-        interval=settings.comfyui_health_check_interval_sec,
-        timeout=settings.comfyui_health_check_timeout_sec,
+    polling = AdaptivePolling(
+        min_interval=settings.comfyui_poll_min_interval_sec,
+        max_interval=settings.comfyui_poll_interval_sec,
+        backoff=settings.comfyui_poll_backoff,
+        jitter=settings.comfyui_poll_jitter,
     )
+    cache = build_result_cache(settings)
+    singleflight = SingleFlight()
+    admission = build_admission(settings, backends, int(threads))
+    assets = build_asset_uploader(settings)
+    if settings.comfyui_metrics_port is not None:
+        start_metrics_server(
+            settings.comfyui_metrics_port,
+            WorkerCollector(backends, cache, singleflight, polling, admission, assets),
+        )
 
+    templates = build_template_store(settings)
+    artifacts = build_artifact_uploader(settings)
+    journal = build_journal(settings)
     handler = build_task_handler(
-        client=client,
-        output_dir=settings.comfyui_output_dir,
+        backends=backends,
         poll_interval=settings.comfyui_poll_interval_sec,
         history_timeout=settings.comfyui_history_timeout_sec,
+        polling=polling,
+        cache=cache,
+        singleflight=singleflight,
+        templates=templates,
+        artifacts=artifacts,
+        output_mode=settings.comfyui_output_mode,
+        recorder=build_recorder(settings),
+        admission=admission,
+        journal=journal,
+        assets=assets,
     )
     logger.info(
         "Task handler built",
@@ -89,25 +345,77 @@ def build_worker() -> LHTaskWorker:
             "task_name": task_name,
             "poll_interval": settings.comfyui_poll_interval_sec,
             "history_timeout": settings.comfyui_history_timeout_sec,
+            "use_websocket": settings.comfyui_use_websocket,
         },
     )
 
     config = LHConfig()
-    worker = LHTaskWorker(handler, task_name, config)
-    logger.info("Task worker built", extra={"task_name": task_name})
-    return worker
+    workers = {task_name: LHTaskWorker(handler, task_name, config)}
+    batch_task_name = os.getenv("LHW_BATCH_TASK_NAME")
+    if batch_task_name:
+        batch_handler = build_batch_handler(
+            backends=backends,
+            poll_interval=settings.comfyui_poll_interval_sec,
+            history_timeout=settings.comfyui_history_timeout_sec,
+            polling=polling,
+            cache=cache,
+            templates=templates,
+            artifacts=artifacts,
+            output_mode=settings.comfyui_output_mode,
+            admission=admission,
+            journal=journal,
+            assets=assets,
+        )
+        workers[batch_task_name] = LHTaskWorker(batch_handler, batch_task_name, config)
+    # One gate across both tasks: they share the same ComfyUI backends.
+    if admission is not None:
+        for worker in workers.values():
+            gate_task_worker(worker, admission)
+    logger.info("Task workers built", extra={"task_names": list(workers)})
+    built = time.perf_counter()
+
+    # Registration only needs the handler signature, so it runs while
+    # ComfyUI is still starting up.
+    comfyui_sec, task_def_sec = await asyncio.gather(
+        _timed(
+            wait_for_comfyui(
+                backends,
+                interval=settings.comfyui_health_check_interval_sec,
+                timeout=settings.comfyui_health_check_timeout_sec,
+            )
+        ),
+        _timed(
+            asyncio.gather(
+                *(
+                    asyncio.to_thread(register_task_def, worker, config, name)
+                    for name, worker in workers.items()
+                )
+            )
+        ),
+    )
+    backends.start()
+    logger.info(
+        "Worker ready",
+        extra={
+            "task_names": list(workers),
+            "build_sec": round(built - started, 3),
+            "comfyui_ready_sec": round(comfyui_sec, 3),
+            "task_def_sec": round(task_def_sec, 3),
+            "total_sec": round(time.perf_counter() - started, 3),
+        },
+    )
+    return list(workers.values())
 
 
 async def main() -> None:
     configure_logging()
-    worker = build_worker()
-    worker.register_task_def()
-    logger.info(
-        "Task definition registered",
-        extra={"task_name": os.getenv("LHW_TASK_NAME")},
-    )
-    await asyncio.sleep(1.0)
-    await littlehorse.start(worker)
+    workers = await build_workers()
+    try:
+        await littlehorse.start(*workers)
+    finally:
+        # Handlers still running are cancelled on the way out; leave their
+        # prompts in ComfyUI for the restarted worker to reattach to.
+        begin_shutdown()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+
+def test_admission_limit_follows_aimd() -> None:
+    from comfyui_worker.admission import AdmissionController
+
+    controller = AdmissionController(
+        max_limit=8, wait_budget=60, target_wait=5, initial_limit=4
+    )
+
+    for _ in range(5):
+        controller.observe(wait=1, service=0)
+    assert controller.limit == 5
+
+    controller.observe(wait=10, service=0)
+    assert controller.limit == 2
+
+    for _ in range(100):
+        controller.observe(wait=10, service=0)
+    assert controller.limit == 1
+    for _ in range(100):
+        controller.observe(wait=0, service=0)
+    assert controller.limit == 8
+
+
+def test_admission_decreases_once_per_execution_time() -> None:
+    from comfyui_worker.admission import AdmissionController
+
+    controller = AdmissionController(max_limit=8, wait_budget=60, target_wait=5)
+
+    controller.observe(wait=10, service=30)
+    controller.observe(wait=10, service=30)
+
+    # Prompts queued behind the first slow one should not cut the limit again.
+    assert controller.limit == 4
+    assert controller.service_time == 30
+
+
+@pytest.mark.anyio
+async def test_admission_pauses_while_predicted_wait_exceeds_budget() -> None:
+    from comfyui_worker.admission import AdmissionController
+
+    backlog = [10]
+    controller = AdmissionController(
+        max_limit=4,
+        wait_budget=60,
+        target_wait=5,
+        backlog=lambda: backlog[0],
+        recheck_interval=0.01,
+    )
+    controller.observe(wait=0, service=10)
+    assert controller.predicted_wait() == 100
+
+    admitted = asyncio.create_task(controller.admit())
+    await asyncio.sleep(0.03)
+    assert not admitted.done()
+
+    backlog[0] = 2
+    await asyncio.wait_for(admitted, 1)
+    assert controller.paused_sec > 0
+
+
+def _gated_connection(controller: Any, run: Any) -> tuple[Any, Any]:
+    from littlehorse.config import LHConfig
+    from littlehorse.model import (
+        PollTaskResponse,
+        ScheduledTask,
+        TaskDef,
+        TaskDefId,
+        TaskRunId,
+        WfRunId,
+    )
+    from littlehorse.worker import LHConnection, LHTask, LHTaskWorker
+
+    from comfyui_worker.admission import gate_task_worker
+
+    class StubLHServer:
+        def __init__(self) -> None:
+            self.polls = 0
+            self.reports: list[Any] = []
+
+        def PollTask(self, requests: Any) -> Any:
+            async def replies() -> Any:
+                async for _ in requests:
+                    self.polls += 1
+                    yield PollTaskResponse(
+                        result=ScheduledTask(
+                            task_def_id=TaskDefId(name="comfyui"),
+                            task_run_id=TaskRunId(
+                                wf_run_id=WfRunId(id="wf"), task_guid=str(self.polls)
+                            ),
+                        )
+                    )
+
+            return replies()
+
+        async def ReportTask(self, report: Any, timeout: Any = None) -> None:
+            self.reports.append(report)
+
+    config = LHConfig()
+    worker = LHTaskWorker(run, "comfyui", config)
+    gate_task_worker(worker, controller)
+    task = LHTask(run, TaskDef(id=TaskDefId(name="comfyui")))
+    worker._connections["lh:2023"] = LHConnection("lh:2023", config, task)
+    connection = worker._connections["lh:2023"]
+    connection._stub = StubLHServer()
+    return connection, connection._stub
+
+
+async def _settle() -> None:
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.anyio
+async def test_admission_gate_holds_polls_at_the_limit() -> None:
+    from littlehorse.worker import WorkerContext
+
+    from comfyui_worker.admission import AdmissionController
+
+    release = asyncio.Event()
+
+    async def run(ctx: WorkerContext) -> str:
+        await release.wait()
+        return "ok"
+
+    controller = AdmissionController(max_limit=1, wait_budget=60, target_wait=5)
+    connection, server = _gated_connection(controller, run)
+    started = asyncio.create_task(connection.start())
+
+    # One task claimed and running; the next poll must wait for its slot.
+    await _settle()
+    assert server.polls == 1
+    assert controller.in_use == 1
+
+    release.set()
+    await _settle()
+    assert server.polls > 1
+    assert server.reports
+
+    connection.stop()
+    await asyncio.wait_for(started, 1)
+
+
+@pytest.mark.anyio
+async def test_admission_gate_stops_while_polling_is_paused() -> None:
+    from littlehorse.worker import WorkerContext
+
+    from comfyui_worker.admission import AdmissionController
+
+    async def run(ctx: WorkerContext) -> str:
+        return "ok"
+
+    controller = AdmissionController(
+        max_limit=4, available=lambda: False, recheck_interval=60
+    )
+    connection, server = _gated_connection(controller, run)
+    started = asyncio.create_task(connection.start())
+    await _settle()
+    assert server.polls == 0
+
+    connection.stop()
+    await asyncio.wait_for(started, 1)
+    assert server.polls == 0
+
+
+@pytest.mark.anyio
+async def test_admission_pauses_while_no_backend_is_available() -> None:
+    from comfyui_worker.admission import AdmissionController
+
+    available = [False]
+    controller = AdmissionController(
+        max_limit=4, available=lambda: available[0], recheck_interval=0.01
+    )
+
+    admitted = asyncio.create_task(controller.admit())
+    await asyncio.sleep(0.03)
+    assert not admitted.done()
+
+    available[0] = True
+    await asyncio.wait_for(admitted, 1)
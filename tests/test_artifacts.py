@@ -0,0 +1,147 @@
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+MIB = 1024 * 1024
+
+
+class StubS3:
+    def __init__(self, fail_part: int | None = None) -> None:
+        self.objects: dict[str, bytes] = {}
+        self.parts: dict[int, bytes] = {}
+        self.completed: list[dict[str, Any]] = []
+        self.aborted = False
+        self.fail_part = fail_part
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes) -> None:
+        self.objects[f"{Bucket}/{Key}"] = Body
+
+    def create_multipart_upload(self, Bucket: str, Key: str) -> dict[str, Any]:
+        return {"UploadId": "upload-1"}
+
+    def upload_part(
+        self, PartNumber: int, Body: bytes, **kwargs: Any
+    ) -> dict[str, Any]:
+        if PartNumber == self.fail_part:
+            raise ConnectionError("part failed")
+        with self._lock:
+            self.parts[PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(
+        self, Bucket: str, Key: str, MultipartUpload: dict[str, Any], **kwargs: Any
+    ) -> None:
+        self.completed = MultipartUpload["Parts"]
+        body = b"".join(self.parts[part["PartNumber"]] for part in self.completed)
+        self.objects[f"{Bucket}/{Key}"] = body
+
+    def abort_multipart_upload(self, **kwargs: Any) -> None:
+        self.aborted = True
+
+
+@pytest.mark.anyio
+async def test_uploader_copies_to_file_sink(tmp_path: Path) -> None:
+    from comfyui_worker.artifacts import ArtifactUploader, FileSink
+
+    source = tmp_path / "out" / "img.png"
+    source.parent.mkdir()
+    source.write_bytes(b"png-bytes")
+    uploader = ArtifactUploader(FileSink(str(tmp_path / "sink"), chunk_size=4))
+
+    [artifact] = await uploader.upload("pid", [str(source)])
+
+    target = tmp_path / "sink" / "pid" / "img.png"
+    assert target.read_bytes() == b"png-bytes"
+    assert artifact == {
+        "uri": target.resolve().as_uri(),
+        "size": 9,
+        "sha256": hashlib.sha256(b"png-bytes").hexdigest(),
+        "filename": "img.png",
+    }
+
+
+@pytest.mark.anyio
+async def test_s3_sink_puts_small_files(tmp_path: Path) -> None:
+    from comfyui_worker.artifacts import ArtifactUploader, S3Sink
+
+    source = tmp_path / "img.png"
+    source.write_bytes(b"small")
+    client = StubS3()
+    uploader = ArtifactUploader(S3Sink("bucket", prefix="/runs/", client=client))
+
+    [artifact] = await uploader.upload("pid", [str(source)])
+
+    assert client.objects == {"bucket/runs/pid/img.png": b"small"}
+    assert artifact["uri"] == "s3://bucket/runs/pid/img.png"
+
+
+@pytest.mark.anyio
+async def test_s3_sink_streams_large_files_in_parts(tmp_path: Path) -> None:
+    from comfyui_worker.artifacts import ArtifactUploader, S3Sink
+
+    data = bytes(range(256)) * (11 * MIB // 256)
+    source = tmp_path / "video.mp4"
+    source.write_bytes(data)
+    client = StubS3()
+    uploader = ArtifactUploader(
+        S3Sink("bucket", client=client, part_size=5 * MIB), concurrency=2
+    )
+
+    [artifact] = await uploader.upload("pid", [str(source)])
+
+    assert [part["PartNumber"] for part in client.completed] == [1, 2, 3]
+    assert client.objects["bucket/pid/video.mp4"] == data
+    assert artifact["size"] == len(data)
+    assert artifact["sha256"] == hashlib.sha256(data).hexdigest()
+
+
+@pytest.mark.anyio
+async def test_uploader_keys_keep_output_subfolders(tmp_path: Path) -> None:
+    from comfyui_worker.artifacts import ArtifactUploader, S3Sink
+
+    client = StubS3()
+    uploader = ArtifactUploader(S3Sink("bucket", client=client))
+    outputs = tmp_path / "out"
+    for subfolder in ("faces", "poses"):
+        (outputs / subfolder).mkdir(parents=True)
+        (outputs / subfolder / "img.png").write_bytes(subfolder.encode())
+
+    artifacts = await uploader.upload(
+        "pid",
+        [str(outputs / "faces" / "img.png"), str(outputs / "poses" / "img.png")],
+        str(outputs),
+    )
+
+    assert client.objects == {
+        "bucket/pid/faces/img.png": b"faces",
+        "bucket/pid/poses/img.png": b"poses",
+    }
+    assert [artifact["filename"] for artifact in artifacts] == ["img.png"] * 2
+
+
+@pytest.mark.anyio
+async def test_s3_sink_aborts_failed_multipart_upload(tmp_path: Path) -> None:
+    from comfyui_worker.artifacts import ArtifactUploader, S3Sink
+
+    source = tmp_path / "video.mp4"
+    source.write_bytes(b"x" * 11 * MIB)
+    client = StubS3(fail_part=2)
+    uploader = ArtifactUploader(S3Sink("bucket", client=client, part_size=5 * MIB))
+
+    with pytest.raises(ConnectionError):
+        await uploader.upload("pid", [str(source)])
+
+    assert client.aborted is True
+    assert client.objects == {}
+
+
+def test_build_sink_from_uri() -> None:
+    from comfyui_worker.artifacts import FileSink, build_sink
+
+    assert isinstance(build_sink("file:///data/artifacts"), FileSink)
+    with pytest.raises(ValueError):
+        build_sink("ftp://host/path")
@@ -0,0 +1,86 @@
+import asyncio
+import hashlib
+from pathlib import Path
+
+import pytest
+from pytest_httpx import HTTPXMock
+
+
+class StubClient:
+    def __init__(self, base_url: str = "http://gpu0") -> None:
+        self.base_url = base_url
+        self.uploads: list[tuple[str, str]] = []
+
+    async def upload_image(
+        self, content: bytes, filename: str, subfolder: str = ""
+    ) -> str:
+        await asyncio.sleep(0)
+        self.uploads.append((filename, subfolder))
+        return f"{subfolder}/{filename}"
+
+
+@pytest.mark.anyio
+async def test_asset_uploader_fetches_urls_and_local_paths(
+    tmp_path: Path, httpx_mock: HTTPXMock
+) -> None:
+    from comfyui_worker.assets import AssetUploader
+
+    httpx_mock.add_response(url="https://cdn.example/face.JPG", content=b"face")
+    (tmp_path / "refs").mkdir()
+    (tmp_path / "refs" / "pose.png").write_bytes(b"pose")
+    uploader = AssetUploader(root=str(tmp_path))
+
+    assets = await uploader.fetch(
+        {
+            "10.inputs.image": "https://cdn.example/face.JPG",
+            "11.inputs.image": "refs/pose.png",
+        }
+    )
+
+    face = assets["10.inputs.image"]
+    assert face.sha256 == hashlib.sha256(b"face").hexdigest()
+    assert face.value == f"lhw-assets/{face.sha256}.jpg"
+    assert assets["11.inputs.image"].content == b"pose"
+    await uploader.aclose()
+
+
+@pytest.mark.anyio
+async def test_asset_uploader_rejects_unsafe_references(tmp_path: Path) -> None:
+    from comfyui_worker.assets import AssetError, AssetUploader
+
+    (tmp_path / "secret").write_bytes(b"x")
+    root = tmp_path / "refs"
+    root.mkdir()
+
+    with pytest.raises(AssetError, match="not enabled"):
+        await AssetUploader().fetch({"10.inputs.image": "/etc/hosts"})
+    with pytest.raises(AssetError, match="outside"):
+        await AssetUploader(root=str(root)).fetch({"10.inputs.image": "../secret"})
+    with pytest.raises(AssetError, match="unsupported"):
+        await AssetUploader().fetch({"10.inputs.image": "ftp://host/a.png"})
+
+
+@pytest.mark.anyio
+async def test_asset_uploader_uploads_each_hash_once_per_backend() -> None:
+    from comfyui_worker.assets import Asset, AssetUploader
+
+    uploader = AssetUploader(max_entries=2)
+    first, second, third = (
+        Asset(name, f"{name}.png", name.encode()) for name in ("a", "b", "c")
+    )
+    gpu0, gpu1 = StubClient("http://gpu0"), StubClient("http://gpu1")
+
+    # Concurrent tasks sharing a reference image trigger one upload.
+    await asyncio.gather(
+        uploader.upload(gpu0, [first]), uploader.upload(gpu0, [first, first])
+    )
+    await uploader.upload(gpu0, [first])
+    await uploader.upload(gpu1, [first])
+    assert gpu0.uploads == [("a.png", "lhw-assets")]
+    assert gpu1.uploads == [("a.png", "lhw-assets")]
+    assert (uploader.uploads, uploader.reused) == (2, 2)
+
+    # Evicted from the index, an asset is uploaded again.
+    await uploader.upload(gpu0, [second, third])
+    await uploader.upload(gpu0, [first])
+    assert len(gpu0.uploads) == 4
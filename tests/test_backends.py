@@ -0,0 +1,250 @@
+from typing import Any
+
+import httpx
+import pytest
+
+
+class StubClient:
+    def __init__(
+        self,
+        base_url: str,
+        queue: dict[str, Any] | None = None,
+        vram_free: int = 0,
+        fail: bool = False,
+    ) -> None:
+        self.base_url = base_url
+        self.queue = queue or {"queue_running": [], "queue_pending": []}
+        self.vram_free = vram_free
+        self.fail = fail
+
+    async def get_queue(self) -> dict[str, Any]:
+        if self.fail:
+            request = httpx.Request("GET", f"{self.base_url}/queue")
+            raise httpx.ConnectError("refused", request=request)
+        return self.queue
+
+    async def get_system_stats(self) -> dict[str, Any]:
+        return {"devices": [{"vram_free": self.vram_free}]}
+
+    async def health_check(self) -> bool:
+        return not self.fail
+
+
+def _backend(client: StubClient, **kwargs: Any) -> Any:
+    from comfyui_worker.backends import ComfyUiBackend
+
+    return ComfyUiBackend(client, "/outputs", **kwargs)  # type: ignore[arg-type]
+
+
+@pytest.mark.anyio
+async def test_pool_routes_to_shortest_queue() -> None:
+    from comfyui_worker.backends import BackendPool
+
+    busy = _backend(
+        StubClient(
+            "http://gpu0",
+            queue={"queue_running": [["a", 0]], "queue_pending": [["b", 1]]},
+        )
+    )
+    idle = _backend(StubClient("http://gpu1"))
+    pool = BackendPool([busy, idle])
+
+    await pool.refresh()
+
+    assert busy.queue_depth == 2
+    assert pool.select() is idle
+
+
+@pytest.mark.anyio
+async def test_pool_breaks_ties_on_free_vram() -> None:
+    from comfyui_worker.backends import BackendPool
+
+    small = _backend(StubClient("http://gpu0", vram_free=1_000))
+    large = _backend(StubClient("http://gpu1", vram_free=8_000))
+    pool = BackendPool([small, large])
+
+    await pool.refresh()
+
+    assert pool.select() is large
+    assert pool.select() is large
+
+
+@pytest.mark.anyio
+async def test_pool_prefers_backend_with_models_loaded() -> None:
+    from comfyui_worker.backends import BackendPool
+    from comfyui_worker.scheduler import PromptScheduler
+
+    other = _backend(
+        StubClient("http://gpu0", vram_free=8_000), scheduler=PromptScheduler(1)
+    )
+    loaded = _backend(StubClient("http://gpu1"), scheduler=PromptScheduler(1))
+    other.scheduler.last_model = "sdxl"
+    loaded.scheduler.last_model = "flux"
+    pool = BackendPool([other, loaded])
+
+    await pool.refresh()
+
+    assert pool.select("flux") is loaded
+    assert pool.select() is other
+
+
+@pytest.mark.anyio
+async def test_pool_counts_assigned_workflows() -> None:
+    from comfyui_worker.backends import BackendPool
+
+    first = _backend(StubClient("http://gpu0"))
+    second = _backend(StubClient("http://gpu1"))
+    pool = BackendPool([first, second])
+
+    async with pool.route() as chosen:
+        assert chosen.assigned == 1
+        other = pool.select()
+        assert other is not chosen
+
+    assert chosen.assigned == 0
+
+
+@pytest.mark.anyio
+async def test_failing_backend_drops_out_and_recovers() -> None:
+    from comfyui_worker.backends import BackendPool
+
+    flaky_client = StubClient("http://gpu0", fail=True)
+    flaky = _backend(flaky_client, failure_threshold=2)
+    steady = _backend(StubClient("http://gpu1", vram_free=0))
+    pool = BackendPool([flaky, steady])
+
+    await pool.refresh()
+    assert flaky.healthy
+    await pool.refresh()
+    assert not flaky.healthy
+    assert all(pool.select() is steady for _ in range(3))
+
+    flaky_client.fail = False
+    await pool.refresh()
+    assert flaky.healthy
+
+
+@pytest.mark.anyio
+async def test_pool_keeps_refreshing_after_an_unexpected_error() -> None:
+    import asyncio
+
+    from comfyui_worker.backends import BackendPool
+
+    class MalformedStatsClient(StubClient):
+        def __init__(self) -> None:
+            super().__init__("http://gpu0")
+            self.calls = 0
+
+        async def get_system_stats(self) -> dict[str, Any]:
+            self.calls += 1
+            if self.calls == 1:
+                raise KeyError("devices")
+            return await super().get_system_stats()
+
+    client = MalformedStatsClient()
+    backend = _backend(client)
+    pool = BackendPool([backend], refresh_interval=0.01)
+
+    async def probed_again() -> None:
+        while backend.refreshed_at is None:
+            await asyncio.sleep(0.01)
+
+    pool.start()
+    try:
+        await asyncio.wait_for(probed_again(), 1)
+    finally:
+        await pool.stop()
+
+    assert client.calls >= 2
+
+
+@pytest.mark.anyio
+async def test_route_records_backend_failures_only() -> None:
+    from comfyui_worker.backends import BackendPool
+
+    first = _backend(StubClient("http://gpu0"), failure_threshold=1)
+    second = _backend(StubClient("http://gpu1"), failure_threshold=1)
+    pool = BackendPool([first, second])
+
+    with pytest.raises(ValueError):
+        async with pool.route() as backend:
+            raise ValueError("bad workflow")
+    assert backend.healthy
+
+    request = httpx.Request("POST", "http://gpu/prompt")
+    with pytest.raises(httpx.ConnectError):
+        async with pool.route() as backend:
+            raise httpx.ConnectError("refused", request=request)
+    assert not backend.healthy
+
+
+@pytest.mark.anyio
+async def test_pool_raises_when_no_backend_is_healthy() -> None:
+    from comfyui_worker.backends import BackendPool, NoHealthyBackendError
+
+    pool = BackendPool(
+        [
+            _backend(StubClient("http://gpu0", fail=True), failure_threshold=1),
+            _backend(StubClient("http://gpu1", fail=True), failure_threshold=1),
+        ]
+    )
+
+    await pool.refresh()
+
+    with pytest.raises(NoHealthyBackendError):
+        pool.select()
+    assert await pool.health_check() is False
+
+
+@pytest.mark.anyio
+async def test_single_backend_fails_fast_while_its_circuit_is_open() -> None:
+    from comfyui_worker.backends import BackendPool, NoHealthyBackendError
+
+    client = StubClient("http://gpu0", fail=True)
+    only = _backend(client, failure_threshold=1)
+    pool = BackendPool([only])
+
+    await pool.refresh()
+    assert only.state == "open"
+    assert not pool.available()
+    with pytest.raises(NoHealthyBackendError):
+        pool.select()
+
+    client.fail = False
+    await pool.refresh()
+    assert only.state == "half_open"
+    assert pool.select() is only
+
+
+def test_half_open_circuit_closes_or_reopens_on_first_result() -> None:
+    backend = _backend(StubClient("http://gpu0"), failure_threshold=3)
+    for _ in range(3):
+        backend.record_failure()
+    assert backend.state == "open"
+
+    backend.record_probe()
+    backend.record_failure()
+    assert backend.state == "open"
+    assert backend.opened == 2
+
+    backend.record_probe()
+    backend.record_success()
+    assert backend.state == "closed"
+
+
+@pytest.mark.anyio
+async def test_pool_backlog_is_the_least_loaded_healthy_queue() -> None:
+    from comfyui_worker.backends import BackendPool
+
+    busy = _backend(
+        StubClient(
+            "http://gpu0",
+            queue={"queue_running": [["a", 0]], "queue_pending": [["b", 1]]},
+        )
+    )
+    down = _backend(StubClient("http://gpu1", fail=True), failure_threshold=1)
+    pool = BackendPool([busy, down])
+
+    await pool.refresh()
+
+    assert pool.backlog() == 2
@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+
+def test_parse_distribution() -> None:
+    from benchmarks.distributions import parse_distribution
+
+    rng = random.Random(0)
+    assert parse_distribution("fixed:1.5")() == 1.5
+    assert 1 <= parse_distribution("uniform:1,2", rng)() <= 2
+    assert parse_distribution("normal:0,1", rng)() >= 0
+    with pytest.raises(ValueError):
+        parse_distribution("gamma:1")
+
+
+def test_compare_flags_regressions() -> None:
+    from benchmarks.harness import compare
+
+    baseline = {
+        "tasks_per_sec": 10.0,
+        "latency_p95_sec": 1.0,
+        "latency_p99_sec": 2.0,
+        "http_requests_per_task": 3.0,
+        "cpu_ms_per_task": 5.0,
+    }
+    result = dict(baseline, tasks_per_sec=8.0, http_requests_per_task=3.1)
+
+    assert compare(result, baseline, tolerance=0.1) == ["tasks_per_sec: 10.0 -> 8.0"]
+
+
+@pytest.mark.anyio
+async def test_benchmark_runs_against_fake_comfyui() -> None:
+    pytest.importorskip("aiohttp")
+    from benchmarks.distributions import parse_distribution
+    from benchmarks.fake_comfyui import FakeComfyUi, serve
+    from benchmarks.harness import run_benchmark
+
+    runner, port = await serve(FakeComfyUi(parse_distribution("fixed:0.01")))
+    try:
+        result = await run_benchmark(
+            f"http://127.0.0.1:{port}", tasks=6, concurrency=3, depth=2
+        )
+    finally:
+        await runner.cleanup()
+
+    assert result["failures"] == 0
+    assert result["tasks_per_sec"] > 0
+    assert result["http_requests_by_endpoint"]["/prompt"] == 6
+
+
+def test_replay_scales_recorded_summary() -> None:
+    from benchmarks.replay import compare_to_recorded, recorded_summary
+
+    entries = [
+        {"t": 100.0, "total": 2.0, "ok": True},
+        {"t": 101.0, "total": 3.0, "ok": True},
+        {"t": 102.0, "total": 1.0, "ok": False},
+    ]
+
+    summary = recorded_summary(entries, speed=2.0)
+
+    assert summary["tasks_per_sec"] == 1.0
+    assert summary["latency_p50_sec"] == 1.25
+    replayed = dict(summary, latency_p95_sec=summary["latency_p95_sec"] * 2)
+    assert compare_to_recorded(replayed, summary, tolerance=0.1) == [
+        (
+            f"latency_p95_sec: {summary['latency_p95_sec']} -> "
+            f"{replayed['latency_p95_sec']}"
+        )
+    ]
+
+
+@pytest.mark.anyio
+async def test_replay_runs_trace_against_fake_comfyui() -> None:
+    pytest.importorskip("aiohttp")
+    from benchmarks.distributions import parse_distribution
+    from benchmarks.fake_comfyui import FakeComfyUi, serve
+    from benchmarks.replay import run_replay
+
+    entries = [
+        {"t": 10.0 + index * 0.1, "execute": 0.1, "total": 0.2, "ok": True}
+        for index in range(4)
+    ]
+    runner, port = await serve(FakeComfyUi(parse_distribution("fixed:5")))
+    try:
+        result = await run_replay(
+            f"http://127.0.0.1:{port}", entries, speed=10.0, depth=2
+        )
+    finally:
+        await runner.cleanup()
+
+    assert result["failures"] == 0
+    # Recorded execution times override the server's 5s distribution.
+    assert result["latency_p99_sec"] < 1.0
+    assert result["http_requests_by_endpoint"]["/prompt"] == 4
+
+
+@pytest.mark.anyio
+async def test_history_parse_benchmark_agrees_on_outputs() -> None:
+    from benchmarks.history_parse import run
+
+    result = await run(nodes=20, outputs=3, meta_bytes=64, chunk_size=256, repeat=1)
+
+    assert result["full"]["files"] == result["streaming"]["files"] == 3
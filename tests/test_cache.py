@@ -0,0 +1,97 @@
+from pathlib import Path
+
+
+def _result(tmp_path: Path, name: str, size: int) -> dict:
+    path = tmp_path / name
+    path.write_bytes(b"x" * size)
+    return {"prompt_id": name, "outputs": [str(path)]}
+
+
+def test_cache_returns_stored_result(tmp_path: Path) -> None:
+    from comfyui_worker.cache import ResultCache
+
+    cache = ResultCache(max_entries=4, max_bytes=1024)
+    result = _result(tmp_path, "a.png", 10)
+    cache.put("k", result)
+
+    cached = cache.get("k")
+
+    assert cached == result
+    assert cached is not result
+    assert cache.get("other") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_drops_entries_with_missing_outputs(tmp_path: Path) -> None:
+    from comfyui_worker.cache import ResultCache
+
+    cache = ResultCache(max_entries=4, max_bytes=1024)
+    result = _result(tmp_path, "a.png", 10)
+    cache.put("k", result)
+    Path(result["outputs"][0]).unlink()
+
+    assert cache.get("k") is None
+    assert len(cache) == 0
+    assert cache.total_bytes == 0
+
+
+def test_cache_counts_results_it_cannot_store(tmp_path: Path) -> None:
+    from comfyui_worker.cache import ResultCache
+
+    cache = ResultCache(max_entries=4, max_bytes=16)
+    cache.put("missing", {"prompt_id": "a", "outputs": [str(tmp_path / "gone.png")]})
+    cache.put("large", _result(tmp_path, "b.png", 32))
+
+    assert len(cache) == 0
+    assert cache.skipped == 2
+
+
+def test_cache_evicts_least_recently_used_by_count(tmp_path: Path) -> None:
+    from comfyui_worker.cache import ResultCache
+
+    cache = ResultCache(max_entries=2, max_bytes=1024)
+    cache.put("a", _result(tmp_path, "a.png", 1))
+    cache.put("b", _result(tmp_path, "b.png", 1))
+    cache.get("a")
+    cache.put("c", _result(tmp_path, "c.png", 1))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_cache_evicts_by_total_bytes(tmp_path: Path) -> None:
+    from comfyui_worker.cache import ResultCache
+
+    cache = ResultCache(max_entries=10, max_bytes=100)
+    cache.put("a", _result(tmp_path, "a.png", 60))
+    cache.put("b", _result(tmp_path, "b.png", 60))
+    cache.put("huge", _result(tmp_path, "huge.png", 200))
+
+    assert len(cache) == 1
+    assert cache.total_bytes == 60
+    assert cache.get("b") is not None
+
+
+def test_cache_index_survives_restart(tmp_path: Path) -> None:
+    from comfyui_worker.cache import ResultCache
+
+    index = tmp_path / "cache" / "index.json"
+    result = _result(tmp_path, "a.png", 10)
+    ResultCache(max_entries=4, max_bytes=1024, index_path=str(index)).put("k", result)
+
+    reloaded = ResultCache(max_entries=4, max_bytes=1024, index_path=str(index))
+
+    assert reloaded.get("k") == result
+    assert reloaded.total_bytes == 10
+
+
+def test_cache_ignores_corrupt_index(tmp_path: Path) -> None:
+    from comfyui_worker.cache import ResultCache
+
+    index = tmp_path / "index.json"
+    index.write_text("{not json")
+
+    cache = ResultCache(max_entries=4, max_bytes=1024, index_path=str(index))
+
+    assert len(cache) == 0
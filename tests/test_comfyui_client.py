@@ -1,8 +1,13 @@
+import json
+from pathlib import Path
+
+import httpx
 import pytest
 from pytest_httpx import HTTPXMock
 
 
-def test_queue_status_detects_prompt_id(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_queue_status_detects_prompt_id(httpx_mock: HTTPXMock) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
 
     httpx_mock.add_response(
@@ -12,10 +17,11 @@ def test_queue_status_detects_prompt_id(httpx_mock: HTTPXMock) -> None:
     )
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.is_in_queue("abc") is True
+    assert await client.is_in_queue("abc") is True
 
 
-def test_queue_status_retries_on_request_error(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_queue_status_retries_on_request_error(httpx_mock: HTTPXMock) -> None:
     import httpx
 
     from comfyui_worker.comfyui_client import ComfyUiClient
@@ -29,11 +35,12 @@ def test_queue_status_retries_on_request_error(httpx_mock: HTTPXMock) -> None:
     )
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.is_in_queue("abc") is True
+    assert await client.is_in_queue("abc") is True
     assert len(httpx_mock.get_requests()) == 2
 
 
-def test_submits_prompt_returns_id(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_submits_prompt_returns_id(httpx_mock: HTTPXMock) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
 
     httpx_mock.add_response(
@@ -43,10 +50,46 @@ def test_submits_prompt_returns_id(httpx_mock: HTTPXMock) -> None:
     )
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.submit_prompt({"nodes": {}}) == "pid"
+    assert await client.submit_prompt({"nodes": {}}) == "pid"
+    assert "front" not in json.loads(httpx_mock.get_request().content)
+
+
+@pytest.mark.anyio
+async def test_submits_prompt_to_front_of_queue(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(
+        method="POST",
+        url="http://comfy/prompt",
+        json={"prompt_id": "pid"},
+    )
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
+    assert await client.submit_prompt({"nodes": {}}, front=True) == "pid"
+    assert json.loads(httpx_mock.get_request().content)["front"] is True
+
+
+@pytest.mark.anyio
+async def test_upload_image_returns_load_image_value(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(
+        method="POST",
+        url="http://comfy/upload/image",
+        json={"name": "abc.png", "subfolder": "lhw-assets", "type": "input"},
+    )
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
+    value = await client.upload_image(b"png", "abc.png", "lhw-assets")
 
+    assert value == "lhw-assets/abc.png"
+    body = httpx_mock.get_request().content
+    assert b'name="overwrite"\r\n\r\ntrue' in body
+    assert b'filename="abc.png"' in body
 
-def test_submits_prompt_requires_prompt_id(httpx_mock: HTTPXMock) -> None:
+
+@pytest.mark.anyio
+async def test_submits_prompt_requires_prompt_id(httpx_mock: HTTPXMock) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
 
     httpx_mock.add_response(
@@ -57,10 +100,11 @@ def test_submits_prompt_requires_prompt_id(httpx_mock: HTTPXMock) -> None:
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
     with pytest.raises(ValueError, match="prompt_id"):
-        client.submit_prompt({"nodes": {}})
+        await client.submit_prompt({"nodes": {}})
 
 
-def test_submits_prompt_retries_on_request_error(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_submits_prompt_retries_on_request_error(httpx_mock: HTTPXMock) -> None:
     import httpx
 
     from comfyui_worker.comfyui_client import ComfyUiClient
@@ -74,11 +118,12 @@ def test_submits_prompt_retries_on_request_error(httpx_mock: HTTPXMock) -> None:
     )
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.submit_prompt({"nodes": {}}) == "pid"
+    assert await client.submit_prompt({"nodes": {}}) == "pid"
     assert len(httpx_mock.get_requests()) == 2
 
 
-def test_submits_prompt_retries_on_server_error(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_submits_prompt_retries_on_server_error(httpx_mock: HTTPXMock) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
 
     httpx_mock.add_response(
@@ -94,11 +139,12 @@ def test_submits_prompt_retries_on_server_error(httpx_mock: HTTPXMock) -> None:
     )
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.submit_prompt({"nodes": {}}) == "pid"
+    assert await client.submit_prompt({"nodes": {}}) == "pid"
     assert len(httpx_mock.get_requests()) == 2
 
 
-def test_client_get_history_returns_none_when_missing(
+@pytest.mark.anyio
+async def test_client_get_history_returns_none_when_missing(
     httpx_mock: HTTPXMock,
 ) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
@@ -106,12 +152,13 @@ def test_client_get_history_returns_none_when_missing(
     httpx_mock.add_response(url="http://localhost:8188/history/pid", json={})
 
     client = ComfyUiClient("http://localhost:8188", timeout=5.0, retries=0)
-    result = client.get_history("pid")
+    result = await client.get_history("pid")
 
     assert result is None
 
 
-def test_client_get_history_returns_history_when_present(
+@pytest.mark.anyio
+async def test_client_get_history_returns_history_when_present(
     httpx_mock: HTTPXMock,
 ) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
@@ -119,16 +166,17 @@ def test_client_get_history_returns_history_when_present(
     history_data = {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
     httpx_mock.add_response(
         url="http://localhost:8188/history/pid",
-        json={"pid": history_data},
+        json={"pid": {**history_data, "prompt": [1, "pid", {}], "meta": {}}},
     )
 
     client = ComfyUiClient("http://localhost:8188", timeout=5.0, retries=0)
-    result = client.get_history("pid")
+    result = await client.get_history("pid")
 
     assert result == history_data
 
 
-def test_health_check_returns_true_on_success(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_health_check_returns_true_on_success(httpx_mock: HTTPXMock) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
 
     httpx_mock.add_response(
@@ -138,10 +186,13 @@ def test_health_check_returns_true_on_success(httpx_mock: HTTPXMock) -> None:
     )
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.health_check() is True
+    assert await client.health_check() is True
 
 
-def test_health_check_returns_false_on_connection_error(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_health_check_returns_false_on_connection_error(
+    httpx_mock: HTTPXMock,
+) -> None:
     import httpx
 
     from comfyui_worker.comfyui_client import ComfyUiClient
@@ -150,10 +201,11 @@ def test_health_check_returns_false_on_connection_error(httpx_mock: HTTPXMock) -
     httpx_mock.add_exception(httpx.ConnectError("Connection refused", request=request))
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.health_check() is False
+    assert await client.health_check() is False
 
 
-def test_health_check_returns_false_on_http_error(httpx_mock: HTTPXMock) -> None:
+@pytest.mark.anyio
+async def test_health_check_returns_false_on_http_error(httpx_mock: HTTPXMock) -> None:
     from comfyui_worker.comfyui_client import ComfyUiClient
 
     httpx_mock.add_response(
@@ -163,4 +215,123 @@ def test_health_check_returns_false_on_http_error(httpx_mock: HTTPXMock) -> None
     )
 
     client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=1)
-    assert client.health_check() is False
+    assert await client.health_check() is False
+
+
+@pytest.mark.anyio
+async def test_client_reuses_pooled_connection(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(
+        method="GET",
+        url="http://comfy/queue",
+        json={"queue_running": [], "queue_pending": []},
+        is_reusable=True,
+    )
+
+    async with ComfyUiClient(base_url="http://comfy", timeout=5, retries=0) as client:
+        http = client._http
+        assert await client.is_in_queue("abc") is False
+        assert await client.is_in_queue("abc") is False
+        assert client._http is http
+
+    assert http.is_closed
+
+
+@pytest.mark.anyio
+async def test_submits_prompt_with_client_id(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(
+        method="POST",
+        url="http://comfy/prompt",
+        match_json={"prompt": {"nodes": {}}, "client_id": "worker-1"},
+        json={"prompt_id": "pid"},
+    )
+
+    client = ComfyUiClient(
+        base_url="http://comfy", timeout=5, retries=0, client_id="worker-1"
+    )
+    assert await client.submit_prompt({"nodes": {}}) == "pid"
+
+
+@pytest.mark.anyio
+async def test_client_get_system_stats(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    stats = {"devices": [{"name": "cuda:0", "vram_free": 1024}]}
+    httpx_mock.add_response(method="GET", url="http://comfy/system_stats", json=stats)
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    assert await client.get_system_stats() == stats
+
+
+@pytest.mark.anyio
+async def test_client_get_history_batch(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(
+        method="GET",
+        url="http://comfy/history?max_items=4",
+        json={"a": {"outputs": {}, "prompt": [1]}, "b": {"outputs": {}}},
+    )
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    batch = await client.get_history_batch(4)
+    assert set(batch) == {"a", "b"}
+    assert batch["a"] == {"outputs": {}}
+
+
+@pytest.mark.anyio
+async def test_client_streams_output_to_disk(
+    httpx_mock: HTTPXMock, tmp_path: Path
+) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(
+        method="GET",
+        url="http://comfy/view?filename=img.png&subfolder=sub&type=output",
+        content=b"png-bytes",
+    )
+    destination = tmp_path / "pid" / "img.png"
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    size = await client.download_output("img.png", "sub", "output", destination)
+
+    assert size == 9
+    assert destination.read_bytes() == b"png-bytes"
+    assert not destination.with_name("img.png.part").exists()
+
+
+@pytest.mark.anyio
+async def test_client_download_cleans_up_on_error(
+    httpx_mock: HTTPXMock, tmp_path: Path
+) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(method="GET", status_code=404)
+    destination = tmp_path / "img.png"
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    with pytest.raises(httpx.HTTPStatusError):
+        await client.download_output("img.png", "", "output", destination)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.anyio
+async def test_client_deletes_and_interrupts_prompts(httpx_mock: HTTPXMock) -> None:
+    import json
+
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    httpx_mock.add_response(method="POST", url="http://comfy/queue")
+    httpx_mock.add_response(method="POST", url="http://comfy/interrupt")
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    await client.delete_from_queue(["a", "b"])
+    await client.interrupt("c")
+
+    delete, interrupt = httpx_mock.get_requests()
+    assert json.loads(delete.content) == {"delete": ["a", "b"]}
+    assert json.loads(interrupt.content) == {"prompt_id": "c"}
@@ -26,6 +26,9 @@ def test_config_accepts_all_fields() -> None:
     assert settings.comfyui_history_timeout_sec == 600
     assert settings.comfyui_http_timeout_sec == 30.0
     assert settings.comfyui_http_retries == 3
+    assert settings.comfyui_http_max_connections == 10
+    assert settings.comfyui_http_max_keepalive_connections == 5
+    assert settings.comfyui_http_keepalive_expiry_sec == 30.0
     assert settings.comfyui_health_check_interval_sec == 2
     assert settings.comfyui_health_check_timeout_sec == 120
 
@@ -104,3 +107,248 @@ def test_load_settings_health_check_from_env(monkeypatch: MonkeyPatch) -> None:
 
     assert settings.comfyui_health_check_interval_sec == 5
     assert settings.comfyui_health_check_timeout_sec == 300
+
+
+def test_load_settings_http_pool_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_HTTP_MAX_CONNECTIONS", "20")
+    monkeypatch.setenv("COMFYUI_HTTP_MAX_KEEPALIVE_CONNECTIONS", "8")
+    monkeypatch.setenv("COMFYUI_HTTP_KEEPALIVE_EXPIRY_SEC", "60")
+
+    settings = load_settings()
+
+    assert settings.comfyui_http_max_connections == 20
+    assert settings.comfyui_http_max_keepalive_connections == 8
+    assert settings.comfyui_http_keepalive_expiry_sec == 60.0
+
+
+def test_load_settings_websocket_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_USE_WEBSOCKET", "false")
+    monkeypatch.setenv("COMFYUI_CLIENT_ID", "worker-1")
+
+    settings = load_settings()
+
+    assert settings.comfyui_use_websocket is False
+    assert settings.comfyui_client_id == "worker-1"
+
+
+def test_load_settings_generates_client_id(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.delenv("COMFYUI_CLIENT_ID", raising=False)
+
+    settings = load_settings()
+
+    assert settings.comfyui_use_websocket is True
+    assert settings.comfyui_client_id
+    # Stable across restarts, so reattached prompts keep their events.
+    assert load_settings().comfyui_client_id == settings.comfyui_client_id
+
+
+def test_load_settings_in_flight_depth_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_IN_FLIGHT_DEPTH", "3")
+
+    settings = load_settings()
+
+    assert settings.comfyui_in_flight_depth == 3
+
+
+def test_load_settings_poll_tuning_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_POLL_MIN_INTERVAL_SEC", "0.5")
+    monkeypatch.setenv("COMFYUI_POLL_BACKOFF", "2")
+    monkeypatch.setenv("COMFYUI_POLL_JITTER", "0")
+
+    settings = load_settings()
+
+    assert settings.comfyui_poll_min_interval_sec == 0.5
+    assert settings.comfyui_poll_backoff == 2.0
+    assert settings.comfyui_poll_jitter == 0.0
+
+
+def test_load_settings_cache_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_CACHE_MAX_ENTRIES", "16")
+    monkeypatch.setenv("COMFYUI_CACHE_MAX_BYTES", "2048")
+    monkeypatch.setenv("COMFYUI_CACHE_INDEX_PATH", "/cache/index.json")
+
+    settings = load_settings()
+
+    assert settings.comfyui_cache_max_entries == 16
+    assert settings.comfyui_cache_max_bytes == 2048
+    assert settings.comfyui_cache_index_path == "/cache/index.json"
+
+
+def test_load_settings_template_dir_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_TEMPLATE_DIR", "/templates")
+    monkeypatch.setenv("COMFYUI_TEMPLATE_RELOAD_INTERVAL_SEC", "0")
+
+    settings = load_settings()
+
+    assert settings.comfyui_template_dir == "/templates"
+    assert settings.comfyui_template_reload_interval_sec == 0.0
+
+
+def test_load_settings_artifacts_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_ARTIFACT_URI", "s3://bucket/runs")
+    monkeypatch.setenv("COMFYUI_ARTIFACT_CONCURRENCY", "8")
+    monkeypatch.setenv("COMFYUI_S3_ENDPOINT_URL", "http://minio:9000")
+
+    settings = load_settings()
+
+    assert settings.comfyui_artifact_uri == "s3://bucket/runs"
+    assert settings.comfyui_artifact_concurrency == 8
+    assert settings.comfyui_s3_endpoint_url == "http://minio:9000"
+
+
+def test_load_settings_output_mode_from_env(monkeypatch: MonkeyPatch) -> None:
+    from pydantic import ValidationError
+
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_OUTPUT_MODE", "fetch")
+
+    assert load_settings().comfyui_output_mode == "fetch"
+
+    monkeypatch.setenv("COMFYUI_OUTPUT_MODE", "copy")
+    with pytest.raises(ValidationError):
+        load_settings()
+
+
+def test_load_settings_metrics_port_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+
+    assert load_settings().comfyui_metrics_port is None
+
+    monkeypatch.setenv("COMFYUI_METRICS_PORT", "9100")
+    assert load_settings().comfyui_metrics_port == 9100
+
+
+def test_load_settings_tracing_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_TRACE_OTLP_ENDPOINT", "http://collector:4318")
+    monkeypatch.setenv("COMFYUI_TRACE_SAMPLE_RATE", "0.1")
+
+    settings = load_settings()
+
+    assert settings.comfyui_trace_otlp_endpoint == "http://collector:4318"
+    assert settings.comfyui_trace_file is None
+    assert settings.comfyui_trace_sample_rate == 0.1
+
+
+def test_config_splits_backend_lists() -> None:
+    from comfyui_worker.config import Settings
+
+    settings = Settings(
+        comfyui_base_url="http://gpu0:8188, http://gpu1:8188",
+        comfyui_output_dir="/outputs",
+    )
+
+    assert settings.comfyui_base_urls == ["http://gpu0:8188", "http://gpu1:8188"]
+    assert settings.comfyui_output_dirs == ["/outputs", "/outputs"]
+
+
+def test_config_rejects_mismatched_output_dirs() -> None:
+    from pydantic import ValidationError
+
+    from comfyui_worker.config import Settings
+
+    with pytest.raises(ValidationError):
+        Settings(
+            comfyui_base_url="http://gpu0,http://gpu1,http://gpu2",
+            comfyui_output_dir="/out/a,/out/b",
+        )
+
+
+def test_load_settings_recording_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    assert load_settings().comfyui_record_file is None
+
+    monkeypatch.setenv("COMFYUI_RECORD_FILE", "/tmp/trace.jsonl")
+    monkeypatch.setenv("COMFYUI_RECORD_PAYLOADS", "true")
+    settings = load_settings()
+
+    assert settings.comfyui_record_file == "/tmp/trace.jsonl"
+    assert settings.comfyui_record_payloads is True
+
+
+def test_load_settings_journal_path_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    assert load_settings().comfyui_journal_path is None
+
+    monkeypatch.setenv("COMFYUI_JOURNAL_PATH", "/data/journal.db")
+    assert load_settings().comfyui_journal_path == "/data/journal.db"
+
+
+def test_load_settings_admission_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    settings = load_settings()
+    assert settings.comfyui_admission_wait_budget_sec is None
+    assert settings.comfyui_pause_when_unavailable is False
+
+    monkeypatch.setenv("COMFYUI_ADMISSION_WAIT_BUDGET_SEC", "90")
+    monkeypatch.setenv("COMFYUI_ADMISSION_TARGET_WAIT_SEC", "15")
+    monkeypatch.setenv("COMFYUI_PAUSE_WHEN_UNAVAILABLE", "true")
+    settings = load_settings()
+
+    assert settings.comfyui_admission_wait_budget_sec == 90.0
+    assert settings.comfyui_admission_target_wait_sec == 15.0
+    assert settings.comfyui_pause_when_unavailable is True
+
+
+def test_load_settings_assets_from_env(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker.config import load_settings
+
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://test:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/test/output")
+    monkeypatch.setenv("COMFYUI_ASSET_ROOT", "/mnt/refs")
+    monkeypatch.setenv("COMFYUI_ASSET_CACHE_ENTRIES", "16")
+    settings = load_settings()
+
+    assert settings.comfyui_asset_root == "/mnt/refs"
+    assert settings.comfyui_asset_cache_entries == 16
+    assert settings.comfyui_asset_max_bytes == 64 * 1024**2
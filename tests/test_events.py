@@ -0,0 +1,114 @@
+import asyncio
+import json
+from typing import Any
+
+import pytest
+
+
+def test_websocket_url_maps_scheme() -> None:
+    from comfyui_worker.events import websocket_url
+
+    assert (
+        websocket_url("http://comfy:8188/", "abc") == "ws://comfy:8188/ws?clientId=abc"
+    )
+    assert websocket_url("https://comfy", "abc") == "wss://comfy/ws?clientId=abc"
+
+
+def _event(event_type: str, **data: Any) -> str:
+    return json.dumps({"type": event_type, "data": data})
+
+
+@pytest.mark.anyio
+async def test_listener_resolves_waiter_on_completion() -> None:
+    from websockets.asyncio.server import ServerConnection, serve
+
+    from comfyui_worker.events import ComfyUiEventListener
+
+    release = asyncio.Event()
+    paths: list[str] = []
+
+    async def handler(websocket: ServerConnection) -> None:
+        paths.append(websocket.request.path if websocket.request else "")
+        await release.wait()
+        await websocket.send(_event("executing", node="3", prompt_id="pid"))
+        await websocket.send(_event("executed", node="9", prompt_id="pid"))
+        await websocket.send(_event("execution_success", prompt_id="pid"))
+        await websocket.send(_event("executing", node=None, prompt_id="pid"))
+        await websocket.wait_closed()
+
+    async with serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        listener = ComfyUiEventListener(f"http://127.0.0.1:{port}", "client-1")
+        listener.start()
+        try:
+            assert await listener.wait_connected(timeout=5)
+            waiter = asyncio.create_task(listener.wait_for_completion("pid", 5))
+            await asyncio.sleep(0)
+            release.set()
+            await waiter
+        finally:
+            await listener.stop()
+
+    assert paths == ["/ws?clientId=client-1"]
+
+
+@pytest.mark.anyio
+async def test_listener_raises_on_execution_error() -> None:
+    from comfyui_worker.events import ComfyUiEventListener, ComfyUiExecutionError
+
+    listener = ComfyUiEventListener("http://comfy", "client-1")
+    listener._connected.set()
+    waiter = asyncio.create_task(listener.wait_for_completion("pid", 5))
+    await asyncio.sleep(0)
+
+    listener._handle_message(
+        _event("execution_error", prompt_id="pid", exception_message="OOM")
+    )
+    listener._handle_message(_event("executing", node=None, prompt_id="pid"))
+
+    with pytest.raises(ComfyUiExecutionError, match="OOM"):
+        await waiter
+
+
+@pytest.mark.anyio
+async def test_listener_completes_on_execution_success() -> None:
+    from comfyui_worker.events import ComfyUiEventListener
+
+    listener = ComfyUiEventListener("http://comfy", "client-1")
+    listener._connected.set()
+    waiter = asyncio.create_task(listener.wait_for_completion("pid", 5))
+    await asyncio.sleep(0)
+
+    listener._handle_message(_event("execution_success", prompt_id="pid"))
+    await asyncio.wait_for(waiter, 1)
+    # The trailing executing/node=None of older servers is a no-op.
+    listener._handle_message(_event("executing", node=None, prompt_id="pid"))
+    assert list(listener._finished) == ["pid"]
+    await listener.wait_for_completion("pid", 0)
+
+
+@pytest.mark.anyio
+async def test_listener_remembers_prompts_finished_before_wait() -> None:
+    from comfyui_worker.events import ComfyUiEventListener
+
+    listener = ComfyUiEventListener("http://comfy", "client-1")
+    listener._handle_message(_event("executing", node=None, prompt_id="pid"))
+
+    await listener.wait_for_completion("pid", 0)
+
+
+@pytest.mark.anyio
+async def test_listener_fails_waiters_when_disconnected() -> None:
+    from comfyui_worker.events import ComfyUiEventListener, ComfyUiEventStreamClosed
+
+    listener = ComfyUiEventListener("http://comfy", "client-1")
+    with pytest.raises(ComfyUiEventStreamClosed):
+        await listener.wait_for_completion("pid", 5)
+
+    listener._connected.set()
+    waiter = asyncio.create_task(listener.wait_for_completion("pid", 5))
+    await asyncio.sleep(0)
+    listener._disconnected()
+
+    with pytest.raises(ComfyUiEventStreamClosed):
+        await waiter
@@ -0,0 +1,105 @@
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+
+async def _chunks(body: bytes, size: int = 7) -> AsyncIterator[bytes]:
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def _entry() -> dict[str, Any]:
+    return {
+        "prompt": [1, "pid", {"3": {"class_type": "KSampler", "inputs": {}}}, {}, []],
+        "outputs": {
+            "9": {"images": [{"filename": "a.png", "subfolder": "", "type": "output"}]},
+            "10": {
+                "gifs": [{"filename": "b.mp4", "format": "video/h264-mp4"}],
+                "audio": [{"filename": "c.flac", "subfolder": "sfx", "type": "output"}],
+            },
+            "11": {"text": ["a caption"], "latents": [{"big": "x" * 100}]},
+        },
+        "status": {"status_str": "success", "completed": True, "messages": []},
+        "meta": {"9": {"node_id": "9"}},
+    }
+
+
+@pytest.mark.anyio
+async def test_parse_history_keeps_outputs_and_status() -> None:
+    from comfyui_worker.history import parse_history
+
+    body = json.dumps({"other": _entry(), "pid": _entry()}).encode()
+
+    history = await parse_history(_chunks(body), "pid")
+
+    assert history is not None
+    assert set(history) == {"outputs", "status"}
+    assert history["outputs"]["11"] == {"text": ["a caption"]}
+    assert history["status"]["status_str"] == "success"
+
+
+@pytest.mark.anyio
+async def test_parse_history_reads_single_chunk_bodies() -> None:
+    from comfyui_worker.history import parse_history
+
+    body = json.dumps({"pid": {"outputs": {}, "status": {"completed": True}}})
+
+    history = await parse_history(_chunks(body.encode(), len(body)), "pid")
+
+    assert history == {"outputs": {}, "status": {"completed": True}}
+
+
+@pytest.mark.anyio
+async def test_parse_history_returns_none_when_missing() -> None:
+    from comfyui_worker.history import parse_history
+
+    assert await parse_history(_chunks(b"{}"), "pid") is None
+
+
+@pytest.mark.anyio
+async def test_parse_history_rejects_truncated_body() -> None:
+    from comfyui_worker.history import parse_history
+
+    with pytest.raises(ValueError, match="Invalid ComfyUI history"):
+        await parse_history(_chunks(b'{"pid": {"outputs": '), "pid")
+
+
+@pytest.mark.anyio
+async def test_parse_history_handles_dotted_prompt_ids() -> None:
+    from comfyui_worker.history import parse_history
+
+    body = json.dumps({"a.b": _entry()}).encode()
+
+    history = await parse_history(_chunks(body), "a.b")
+
+    assert history is not None
+    assert "meta" not in history
+
+
+def test_output_files_and_texts_cover_media_types() -> None:
+    from comfyui_worker.history import OutputFile, output_files, output_texts
+
+    history = _entry()
+
+    assert output_files(history) == [
+        OutputFile("9", "image", "a.png", "", "output"),
+        OutputFile("10", "video", "b.mp4", "", "output"),
+        OutputFile("10", "audio", "c.flac", "sfx", "output"),
+    ]
+    assert output_texts(history) == ["a caption"]
+
+
+@pytest.mark.anyio
+async def test_parse_history_batch_keeps_every_entry() -> None:
+    from comfyui_worker.history import parse_history_batch
+
+    body = json.dumps({"a": _entry(), "b.c": _entry(), "d": {"prompt": []}})
+
+    batch = await parse_history_batch(_chunks(body.encode()))
+
+    assert set(batch) == {"a", "b.c", "d"}
+    assert batch["a"]["outputs"]["11"] == {"text": ["a caption"]}
+    assert batch["b.c"]["status"]["completed"] is True
+    assert batch["d"] == {"outputs": {}}
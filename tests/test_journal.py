@@ -0,0 +1,44 @@
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+
+
+@pytest.mark.anyio
+async def test_journal_survives_reopen(tmp_path: Path) -> None:
+    from comfyui_worker.journal import JournalEntry, PromptJournal
+
+    path = str(tmp_path / "journal.db")
+    journal = PromptJournal(path)
+    await journal.record("wf/guid", "pid", "http://gpu0", "hash")
+    await journal.record("wf/other", "pid2", "http://gpu0", "hash")
+    await journal.discard("wf/other")
+    journal.close()
+
+    journal = PromptJournal(path)
+    assert await journal.get("wf/guid") == JournalEntry(
+        "pid", "http://gpu0", "hash", "submitted"
+    )
+    assert await journal.get("wf/other") is None
+    await journal.finish("wf/guid")
+    entry = await journal.get("wf/guid")
+    assert entry is not None
+    assert entry.state == "finished"
+
+    mode = sqlite3.connect(path).execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+
+
+@pytest.mark.anyio
+async def test_journal_prunes_stale_entries(tmp_path: Path) -> None:
+    from comfyui_worker.journal import PromptJournal
+
+    path = str(tmp_path / "journal.db")
+    journal = PromptJournal(path)
+    await journal.record("wf/guid", "pid", "http://gpu0", "hash")
+    journal.close()
+    with sqlite3.connect(path) as db:
+        db.execute("UPDATE prompts SET updated_at = ?", (time.time() - 120,))
+
+    assert await PromptJournal(path, max_age=60).get("wf/guid") is None
@@ -8,9 +8,25 @@ from _pytest.monkeypatch import MonkeyPatch
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 
-def test_main_builds_lh_worker(monkeypatch: MonkeyPatch) -> None:
+@pytest.fixture
+def registered_task_defs(monkeypatch: MonkeyPatch) -> list[str]:
     import main
-    from main import build_worker
+
+    registered: list[str] = []
+    monkeypatch.setattr(
+        main,
+        "register_task_def",
+        lambda worker, config, task_name: registered.append(task_name),
+    )
+    return registered
+
+
+@pytest.mark.anyio
+async def test_main_builds_lh_worker(
+    monkeypatch: MonkeyPatch, registered_task_defs: list[str]
+) -> None:
+    import main
+    from main import build_workers
     from littlehorse.worker import LHTaskWorker
 
     monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
@@ -21,86 +37,261 @@ def test_main_builds_lh_worker(monkeypatch: MonkeyPatch) -> None:
     captured: dict[str, Any] = {}
 
     class StubClient:
-        def __init__(self, base_url: str, timeout: float, retries: int) -> None:
+        def __init__(
+            self, base_url: str, timeout: float, retries: int, **kwargs: Any
+        ) -> None:
             captured["client_args"] = (base_url, timeout, retries)
+            captured["client_kwargs"] = kwargs
 
-        def health_check(self) -> bool:
+        async def health_check(self) -> bool:
             return True
 
     async def stub_handler(workflow: dict[str, Any], ctx: Any) -> dict[str, Any]:
         return {"ok": True}
 
+    class StubEventListener:
+        def __init__(self, base_url: str, client_id: str) -> None:
+            captured["events_args"] = (base_url, client_id)
+            self.started = False
+
+        def start(self) -> None:
+            self.started = True
+
     def stub_build_task_handler(
-        client: StubClient,
-        output_dir: str,
+        backends: Any,
         poll_interval: int,
         history_timeout: int,
+        **kwargs: Any,
     ) -> Callable[[dict[str, Any], Any], Awaitable[dict[str, Any]]]:
-        captured["handler_args"] = (client, output_dir, poll_interval, history_timeout)
+        captured["handler_args"] = (backends, poll_interval, history_timeout)
+        captured["handler_kwargs"] = kwargs
         return stub_handler
 
+    monkeypatch.setenv("COMFYUI_CLIENT_ID", "worker-1")
     monkeypatch.setattr(main, "ComfyUiClient", StubClient)
+    monkeypatch.setattr(main, "ComfyUiEventListener", StubEventListener)
     monkeypatch.setattr(main, "build_task_handler", stub_build_task_handler)
 
-    worker = build_worker()
+    [worker] = await build_workers()
 
     assert isinstance(worker, LHTaskWorker)
     assert worker._task_def_name == "execute-comfyui-workflow"
     assert captured["client_args"] == ("http://comfy", 30.0, 3)
+    assert captured["client_kwargs"] == {
+        "max_connections": 10,
+        "max_keepalive_connections": 5,
+        "keepalive_expiry": 30.0,
+        "client_id": "worker-1",
+    }
+    assert captured["events_args"] == ("http://comfy", "worker-1")
+    backend = captured["handler_args"][0].backends[0]
+    assert backend.output_dir == "/outputs"
+    assert backend.events.started is True
+    assert captured["handler_kwargs"]["cache"] is not None
+    assert registered_task_defs == ["execute-comfyui-workflow"]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("registered_task_defs")
+async def test_main_builds_worker_with_threads_env(monkeypatch: MonkeyPatch) -> None:
+    import main
+    from main import build_workers
+
+    monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
+    monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "1")
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
+    monkeypatch.setenv("COMFYUI_USE_WEBSOCKET", "false")
+
+    class StubClient:
+        def __init__(
+            self, base_url: str, timeout: float, retries: int, **kwargs: Any
+        ) -> None:
+            pass
 
+        async def health_check(self) -> bool:
+            return True
+
+    monkeypatch.setattr(main, "ComfyUiClient", StubClient)
+
+    assert await build_workers()
 
-def test_main_builds_worker_with_threads_env(monkeypatch: MonkeyPatch) -> None:
+
+@pytest.mark.anyio
+async def test_main_builds_batch_worker_when_configured(
+    monkeypatch: MonkeyPatch, registered_task_defs: list[str]
+) -> None:
     import main
-    from main import build_worker
+    from main import build_workers
 
     monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
+    monkeypatch.setenv("LHW_BATCH_TASK_NAME", "execute-comfyui-batch")
     monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "1")
     monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
     monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
+    monkeypatch.setenv("COMFYUI_USE_WEBSOCKET", "false")
+
+    class StubClient:
+        def __init__(
+            self, base_url: str, timeout: float, retries: int, **kwargs: Any
+        ) -> None:
+            pass
+
+        async def health_check(self) -> bool:
+            return True
+
+    monkeypatch.setattr(main, "ComfyUiClient", StubClient)
+
+    workers = await build_workers()
+
+    assert [worker._task_def_name for worker in workers] == [
+        "execute-comfyui-workflow",
+        "execute-comfyui-batch",
+    ]
+    assert sorted(registered_task_defs) == [
+        "execute-comfyui-batch",
+        "execute-comfyui-workflow",
+    ]
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("registered_task_defs")
+async def test_main_gates_workers_on_admission_control(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    import main
+    from main import build_workers
+
+    monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
+    monkeypatch.setenv("LHW_BATCH_TASK_NAME", "execute-comfyui-batch")
+    monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "4")
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
+    monkeypatch.setenv("COMFYUI_USE_WEBSOCKET", "false")
+    monkeypatch.setenv("COMFYUI_ADMISSION_WAIT_BUDGET_SEC", "120")
 
     class StubClient:
-        def __init__(self, base_url: str, timeout: float, retries: int) -> None:
+        def __init__(
+            self, base_url: str, timeout: float, retries: int, **kwargs: Any
+        ) -> None:
             pass
 
-        def health_check(self) -> bool:
+        async def health_check(self) -> bool:
             return True
 
     monkeypatch.setattr(main, "ComfyUiClient", StubClient)
+    monkeypatch.setattr(main.BackendPool, "start", lambda self, **_: None)
+
+    workflow_worker, batch_worker = await build_workers()
+
+    controller = workflow_worker._connections._controller
+    assert batch_worker._connections._controller is controller
+    assert controller.limit == 1
 
-    assert build_worker() is not None
+    monkeypatch.delenv("COMFYUI_ADMISSION_WAIT_BUDGET_SEC")
+    monkeypatch.setenv("COMFYUI_PAUSE_WHEN_UNAVAILABLE", "true")
+    workflow_worker, _ = await build_workers()
 
+    # Without a budget the gate only pauses intake while ComfyUI is down.
+    assert workflow_worker._connections._controller.limit == 4
 
-def test_main_requires_threads_env(monkeypatch: MonkeyPatch) -> None:
-    from main import build_worker
+    monkeypatch.delenv("COMFYUI_PAUSE_WHEN_UNAVAILABLE")
+    workflow_worker, batch_worker = await build_workers()
+
+    # With neither enabled the SDK's connections are left untouched.
+    assert type(workflow_worker._connections) is dict
+    assert type(batch_worker._connections) is dict
+
+
+@pytest.mark.anyio
+async def test_main_requires_threads_env(monkeypatch: MonkeyPatch) -> None:
+    from main import build_workers
 
     monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
     monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
     monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
     monkeypatch.delenv("LHW_NUM_WORKER_THREADS", raising=False)
     with pytest.raises(ValueError, match="LHW_NUM_WORKER_THREADS"):
-        build_worker()
+        await build_workers()
 
 
-def test_main_rejects_non_one_threads_env(monkeypatch: MonkeyPatch) -> None:
-    from main import build_worker
+@pytest.mark.anyio
+async def test_main_rejects_invalid_threads_env(monkeypatch: MonkeyPatch) -> None:
+    from main import build_workers
 
     monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
-    monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "2")
+    monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "0")
     monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
     monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
     with pytest.raises(ValueError, match="LHW_NUM_WORKER_THREADS"):
-        build_worker()
+        await build_workers()
+
+
+@pytest.mark.anyio
+async def test_main_rejects_threads_below_in_flight_depth(
+    monkeypatch: MonkeyPatch,
+) -> None:
+    from main import build_workers
+
+    monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
+    monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "2")
+    monkeypatch.setenv("COMFYUI_IN_FLIGHT_DEPTH", "3")
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
+    with pytest.raises(ValueError, match="COMFYUI_IN_FLIGHT_DEPTH"):
+        await build_workers()
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("registered_task_defs")
+async def test_main_builds_pipelined_worker(monkeypatch: MonkeyPatch) -> None:
+    import main
+    from main import build_workers
+
+    monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
+    monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "4")
+    monkeypatch.setenv("COMFYUI_IN_FLIGHT_DEPTH", "2")
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
+    monkeypatch.setenv("COMFYUI_USE_WEBSOCKET", "false")
+
+    captured: dict[str, Any] = {}
+
+    class StubClient:
+        def __init__(
+            self, base_url: str, timeout: float, retries: int, **kwargs: Any
+        ) -> None:
+            pass
+
+        async def health_check(self) -> bool:
+            return True
 
+    async def stub_handler(workflow: dict[str, Any], ctx: Any) -> dict[str, Any]:
+        return {"ok": True}
 
-def test_main_requires_task_name_env(monkeypatch: MonkeyPatch) -> None:
-    from main import build_worker
+    def stub_build_task_handler(
+        backends: Any, **kwargs: Any
+    ) -> Callable[[dict[str, Any], Any], Awaitable[dict[str, Any]]]:
+        captured["backends"] = backends
+        return stub_handler
+
+    monkeypatch.setattr(main, "ComfyUiClient", StubClient)
+    monkeypatch.setattr(main, "build_task_handler", stub_build_task_handler)
+
+    assert await build_workers()
+    assert captured["backends"].backends[0].scheduler.depth == 2
+
+
+@pytest.mark.anyio
+async def test_main_requires_task_name_env(monkeypatch: MonkeyPatch) -> None:
+    from main import build_workers
 
     monkeypatch.delenv("LHW_TASK_NAME", raising=False)
     monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "1")
     monkeypatch.setenv("COMFYUI_BASE_URL", "http://comfy")
     monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
     with pytest.raises(ValueError, match="LHW_TASK_NAME"):
-        build_worker()
+        await build_workers()
 
 
 def test_main_configures_logging_env(monkeypatch: MonkeyPatch) -> None:
@@ -113,39 +304,149 @@ def test_main_configures_logging_env(monkeypatch: MonkeyPatch) -> None:
     assert logging.getLogger().level == logging.DEBUG
 
 
-def test_wait_for_comfyui_returns_on_success() -> None:
+@pytest.mark.anyio
+async def test_wait_for_comfyui_returns_on_success() -> None:
     from main import wait_for_comfyui
 
     class StubClient:
-        def health_check(self) -> bool:
+        async def health_check(self) -> bool:
             return True
 
     # Should not raise
-    wait_for_comfyui(StubClient(), interval=0, timeout=1)  # type: ignore[arg-type]
+    await wait_for_comfyui(StubClient(), interval=0, timeout=1)  # type: ignore[arg-type]
 
 
-def test_wait_for_comfyui_times_out() -> None:
+@pytest.mark.anyio
+async def test_wait_for_comfyui_times_out() -> None:
     from main import wait_for_comfyui
 
     class StubClient:
-        def health_check(self) -> bool:
+        async def health_check(self) -> bool:
             return False
 
     with pytest.raises(TimeoutError, match="not available after"):
-        wait_for_comfyui(StubClient(), interval=0, timeout=0)  # type: ignore[arg-type]
+        await wait_for_comfyui(StubClient(), interval=0, timeout=0)  # type: ignore[arg-type]
 
 
-def test_wait_for_comfyui_retries_until_success() -> None:
+@pytest.mark.anyio
+async def test_wait_for_comfyui_retries_until_success() -> None:
     from main import wait_for_comfyui
 
     class StubClient:
         def __init__(self) -> None:
             self.calls = 0
 
-        def health_check(self) -> bool:
+        async def health_check(self) -> bool:
             self.calls += 1
             return self.calls >= 3
 
     client = StubClient()
-    wait_for_comfyui(client, interval=0, timeout=5)  # type: ignore[arg-type]
+    await wait_for_comfyui(client, interval=0, timeout=5)  # type: ignore[arg-type]
     assert client.calls == 3
+
+
+@pytest.mark.anyio
+@pytest.mark.usefixtures("registered_task_defs")
+async def test_main_builds_pool_of_backends(monkeypatch: MonkeyPatch) -> None:
+    import main
+    from main import build_workers
+
+    monkeypatch.setenv("LHW_TASK_NAME", "execute-comfyui-workflow")
+    monkeypatch.setenv("LHW_NUM_WORKER_THREADS", "2")
+    monkeypatch.setenv("COMFYUI_BASE_URL", "http://gpu0:8188,http://gpu1:8188")
+    monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/out/gpu0,/out/gpu1")
+    monkeypatch.setenv("COMFYUI_USE_WEBSOCKET", "false")
+
+    captured: dict[str, Any] = {}
+
+    class StubClient:
+        def __init__(
+            self, base_url: str, timeout: float, retries: int, **kwargs: Any
+        ) -> None:
+            self.base_url = base_url
+
+        async def health_check(self) -> bool:
+            return self.base_url.startswith("http://gpu1")
+
+    async def stub_handler(workflow: dict[str, Any], ctx: Any) -> dict[str, Any]:
+        return {"ok": True}
+
+    def stub_build_task_handler(
+        backends: Any, **kwargs: Any
+    ) -> Callable[[dict[str, Any], Any], Awaitable[dict[str, Any]]]:
+        captured["backends"] = backends
+        return stub_handler
+
+    monkeypatch.setattr(main, "ComfyUiClient", StubClient)
+    monkeypatch.setattr(main, "build_task_handler", stub_build_task_handler)
+    monkeypatch.setattr(main.BackendPool, "start", lambda self, **_: None)
+
+    assert await build_workers()
+    pool = captured["backends"]
+    assert [backend.name for backend in pool.backends] == [
+        "http://gpu0:8188",
+        "http://gpu1:8188",
+    ]
+    assert [backend.output_dir for backend in pool.backends] == [
+        "/out/gpu0",
+        "/out/gpu1",
+    ]
+
+
+@pytest.mark.anyio
+async def test_wait_for_comfyui_backs_off_to_interval(monkeypatch: MonkeyPatch) -> None:
+    import main
+    from main import wait_for_comfyui
+
+    delays: list[float] = []
+
+    async def fake_sleep(delay: float) -> None:
+        delays.append(delay)
+
+    class StubClient:
+        async def health_check(self) -> bool:
+            return len(delays) >= 5
+
+    monkeypatch.setattr(main.asyncio, "sleep", fake_sleep)
+    await wait_for_comfyui(StubClient(), interval=1, timeout=5)  # type: ignore[arg-type]
+
+    assert delays == [0.1, 0.2, 0.4, 0.8, 1]
+
+
+def test_register_task_def_waits_until_visible(monkeypatch: MonkeyPatch) -> None:
+    import grpc
+
+    import main
+
+    class NotFound(grpc.RpcError):
+        def code(self) -> grpc.StatusCode:
+            return grpc.StatusCode.NOT_FOUND
+
+    class StubStub:
+        def __init__(self) -> None:
+            self.calls = 0
+
+        def GetTaskDef(self, task_def_id: Any, timeout: float) -> None:
+            self.calls += 1
+            if self.calls < 3:
+                raise NotFound()
+
+    class StubConfig:
+        def __init__(self) -> None:
+            self.grpc_stub = StubStub()
+
+        def stub(self) -> StubStub:
+            return self.grpc_stub
+
+    class StubWorker:
+        registered = False
+
+        def register_task_def(self) -> None:
+            self.registered = True
+
+    monkeypatch.setattr(main.time, "sleep", lambda delay: None)
+    worker, config = StubWorker(), StubConfig()
+    main.register_task_def(worker, config, "task")  # type: ignore[arg-type]
+
+    assert worker.registered
+    assert config.grpc_stub.calls == 3
@@ -0,0 +1,147 @@
+import httpx
+import pytest
+from prometheus_client import REGISTRY, CollectorRegistry, generate_latest
+from pytest_httpx import HTTPXMock
+
+
+def _sample(name: str, labels: dict[str, str]) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_endpoint_collapses_ids() -> None:
+    from comfyui_worker.metrics import endpoint
+
+    assert endpoint("/history/abc-123") == "/history"
+    assert endpoint("/queue") == "/queue"
+
+
+def test_history_timing_records_queue_and_execution() -> None:
+    from comfyui_worker.metrics import observe_history_timing
+
+    count = "comfyui_worker_phase_seconds_count"
+    total = "comfyui_worker_phase_seconds_sum"
+    before = {
+        phase: (_sample(count, {"phase": phase}), _sample(total, {"phase": phase}))
+        for phase in ("queued", "execute")
+    }
+    history = {
+        "status": {
+            "messages": [
+                ["execution_start", {"prompt_id": "pid", "timestamp": 102_000}],
+                ["execution_cached", {"nodes": []}],
+                ["execution_success", {"prompt_id": "pid", "timestamp": 107_500}],
+            ]
+        }
+    }
+
+    observe_history_timing(history, submitted_at=100.0)
+
+    for phase, seconds in (("queued", 2.0), ("execute", 5.5)):
+        old_count, old_sum = before[phase]
+        assert _sample(count, {"phase": phase}) == old_count + 1
+        assert _sample(total, {"phase": phase}) == pytest.approx(old_sum + seconds)
+
+
+@pytest.mark.anyio
+async def test_client_counts_retries_and_errors(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    retries = _sample("comfyui_worker_http_retries_total", {"endpoint": "/queue"})
+    errors = _sample("comfyui_worker_http_errors_total", {"endpoint": "/queue"})
+    httpx_mock.add_exception(httpx.ConnectError("refused"), is_reusable=True)
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=2)
+    with pytest.raises(httpx.ConnectError):
+        await client.get_queue()
+
+    assert (
+        _sample("comfyui_worker_http_retries_total", {"endpoint": "/queue"})
+        == retries + 2
+    )
+    assert (
+        _sample("comfyui_worker_http_errors_total", {"endpoint": "/queue"})
+        == errors + 1
+    )
+
+
+@pytest.mark.anyio
+async def test_client_counts_error_statuses_on_every_endpoint(
+    httpx_mock: HTTPXMock,
+) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    endpoints = ("/queue", "/history", "/system_stats", "/interrupt")
+    before = {
+        endpoint: _sample("comfyui_worker_http_errors_total", {"endpoint": endpoint})
+        for endpoint in endpoints
+    }
+    httpx_mock.add_response(status_code=500, is_reusable=True)
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=2)
+    for call in (
+        client.get_queue(),
+        client.get_history("pid"),
+        client.get_history_batch(8),
+        client.get_system_stats(),
+        client.interrupt("pid"),
+    ):
+        with pytest.raises(httpx.HTTPStatusError):
+            await call
+
+    after = {
+        endpoint: _sample("comfyui_worker_http_errors_total", {"endpoint": endpoint})
+        for endpoint in endpoints
+    }
+    assert after["/history"] == before["/history"] + 2
+    assert all(after[e] == before[e] + 1 for e in endpoints if e != "/history")
+
+
+@pytest.mark.anyio
+async def test_client_records_request_latency(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.comfyui_client import ComfyUiClient
+
+    labels = {"endpoint": "/history", "status": "200"}
+    before = _sample("comfyui_worker_http_request_seconds_count", labels)
+    httpx_mock.add_response(url="http://comfy/history/pid", json={"pid": {}})
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    await client.get_history("pid")
+
+    assert _sample("comfyui_worker_http_request_seconds_count", labels) == before + 1
+
+
+def test_collector_exports_backend_and_cache_state() -> None:
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.cache import ResultCache
+    from comfyui_worker.metrics import WorkerCollector
+    from comfyui_worker.scheduler import PromptScheduler
+
+    class StubClient:
+        base_url = "http://gpu0"
+
+    scheduler = PromptScheduler(2)
+    scheduler.swaps = 3
+    backend = ComfyUiBackend(StubClient(), "/outputs", scheduler=scheduler)  # type: ignore[arg-type]
+    backend.queue_depth = 4
+    backend.record_failure()
+    backend.record_failure()
+    backend.record_failure()
+    cache = ResultCache(max_entries=1, max_bytes=1)
+    cache.hits = 5
+    cache.skipped = 2
+    registry = CollectorRegistry()
+    registry.register(WorkerCollector(BackendPool([backend]), cache=cache))
+
+    text = generate_latest(registry).decode()
+
+    assert 'comfyui_worker_queue_depth{backend="http://gpu0"} 4.0' in text
+    assert 'comfyui_worker_model_swaps_total{backend="http://gpu0"} 3.0' in text
+    assert 'comfyui_worker_cache_lookups_total{outcome="hit"} 5.0' in text
+    assert "comfyui_worker_cache_skipped_total 2.0" in text
+    assert (
+        'comfyui_worker_backend_circuit_state{backend="http://gpu0",state="open"} 1.0'
+        in text
+    )
+    assert (
+        'comfyui_worker_backend_circuit_opened_total{backend="http://gpu0"} 1.0' in text
+    )
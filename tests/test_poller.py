@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any
+
+import pytest
+
+
+class StubClient:
+    def __init__(self, queued: set[str]) -> None:
+        self.queued = queued
+        self.histories: dict[str, Any] = {}
+        self.calls: list[str] = []
+
+    async def get_queue(self) -> dict[str, Any]:
+        self.calls.append("queue")
+        return {
+            "queue_running": [[pid, 0] for pid in sorted(self.queued)][:1],
+            "queue_pending": [[pid, 0] for pid in sorted(self.queued)][1:],
+        }
+
+    async def get_history(self, prompt_id: str) -> dict[str, Any] | None:
+        self.calls.append(f"history/{prompt_id}")
+        return self.histories.get(prompt_id)
+
+    async def get_history_batch(self, max_items: int) -> dict[str, Any]:
+        self.calls.append(f"history?max_items={max_items}")
+        return dict(list(self.histories.items())[:1])
+
+
+@pytest.mark.anyio
+async def test_poller_shares_one_queue_fetch_per_tick() -> None:
+    from comfyui_worker.poller import QueuePoller
+
+    client = StubClient({"a", "b", "c"})
+    poller = QueuePoller(client, interval=0)  # type: ignore[arg-type]
+    logs: list[str] = []
+
+    waiters = [
+        asyncio.create_task(poller.wait_for_history(pid, 5, logs.append))
+        for pid in ("a", "b", "c")
+    ]
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert client.calls == ["queue"]
+    assert poller.snapshot is not None and poller.snapshot.depth == 3
+    assert sorted(logs) == [f"prompt {pid} still queued" for pid in "abc"]
+
+    client.queued.clear()
+    client.histories = {pid: {"outputs": {pid: {}}} for pid in ("a", "b", "c")}
+    results = await asyncio.gather(*waiters)
+
+    assert [result["outputs"] for result in results] == [
+        {"a": {}},
+        {"b": {}},
+        {"c": {}},
+    ]
+    assert client.calls.count("queue") == 2
+    assert "history?max_items=11" in client.calls
+    # Only the ids missing from the batch are fetched one by one.
+    assert "history/a" not in client.calls
+    assert {"history/b", "history/c"} <= set(client.calls)
+    assert poller.waiting == 0
+
+
+@pytest.mark.anyio
+async def test_poller_times_out_waiting_prompt() -> None:
+    from comfyui_worker.poller import QueuePoller
+
+    client = StubClient({"a"})
+    poller = QueuePoller(client, interval=0.01)  # type: ignore[arg-type]
+
+    with pytest.raises(TimeoutError, match="queue wait timed out"):
+        await poller.wait_for_history("a", 0.05)
+    assert poller.waiting == 0
+
+
+@pytest.mark.anyio
+async def test_poller_propagates_queue_errors() -> None:
+    import httpx
+
+    from comfyui_worker.poller import QueuePoller
+
+    class FailingClient(StubClient):
+        async def get_queue(self) -> dict[str, Any]:
+            request = httpx.Request("GET", "http://comfy/queue")
+            raise httpx.ConnectError("refused", request=request)
+
+    poller = QueuePoller(FailingClient(set()), interval=0)  # type: ignore[arg-type]
+
+    with pytest.raises(httpx.ConnectError):
+        await poller.wait_for_history("a", 5)
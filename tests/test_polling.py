@@ -0,0 +1,122 @@
+import pytest
+from pytest import MonkeyPatch
+
+
+def test_schedule_backs_off_to_max_interval() -> None:
+    from comfyui_worker.polling import PollSchedule
+
+    schedule = PollSchedule(0.25, 2.0, backoff=2.0, jitter=0.0)
+
+    delays = [schedule.next_delay() for _ in range(6)]
+
+    assert delays == [0.25, 0.5, 1.0, 2.0, 2.0, 2.0]
+    assert schedule.polls == 6
+
+
+def test_schedule_jitter_stays_within_bounds() -> None:
+    from comfyui_worker.polling import PollSchedule
+
+    schedule = PollSchedule(1.0, 1.0, backoff=1.0, jitter=0.2)
+
+    for _ in range(50):
+        assert 0.8 <= schedule.next_delay() <= 1.2
+
+
+def test_schedule_clusters_polls_in_expected_window(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker import polling
+
+    clock = [100.0]
+    monkeypatch.setattr(polling.time, "monotonic", lambda: clock[0])
+    schedule = polling.PollSchedule(
+        0.25, 2.0, backoff=2.0, jitter=0.0, window=(10.0, 12.0)
+    )
+
+    # Before the window the backoff is uncapped but never sleeps past its start.
+    clock[0] = 108.0
+    assert schedule.next_delay() == 0.25
+    assert schedule.next_delay() == 0.5
+    clock[0] = 109.5
+    assert schedule.next_delay() == 0.5
+
+    # Inside the window polls run at the minimum interval.
+    clock[0] = 111.0
+    assert schedule.next_delay() == 0.25
+
+    # Past the window the capped backoff resumes.
+    clock[0] = 113.0
+    assert [schedule.next_delay() for _ in range(5)] == [0.25, 0.5, 1.0, 2.0, 2.0]
+
+
+def test_schedule_window_starts_when_prompt_runs(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker import polling
+
+    clock = [100.0]
+    monkeypatch.setattr(polling.time, "monotonic", lambda: clock[0])
+    schedule = polling.PollSchedule(
+        0.25, 2.0, backoff=2.0, jitter=0.0, window=(10.0, 12.0)
+    )
+
+    # Queued well past the window's end, then seen starting to run.
+    clock[0] = 150.0
+    schedule.mark_running()
+    clock[0] = 155.0
+    assert schedule.executing == 5.0
+    assert schedule.next_delay() == 0.25
+    assert schedule.next_delay() == 0.5
+    clock[0] = 161.0
+    assert schedule.next_delay() == 0.25
+
+
+def test_histogram_needs_samples_before_predicting() -> None:
+    from comfyui_worker.polling import RuntimeHistogram
+
+    histogram = RuntimeHistogram(window=10)
+    histogram.observe("fp", 10.0)
+    histogram.observe("fp", 12.0)
+
+    assert histogram.quantiles("fp") is None
+
+    histogram.observe("fp", 14.0)
+    p10, p50, p90 = histogram.quantiles("fp")  # type: ignore[misc]
+
+    assert p10 == pytest.approx(10.4)
+    assert p50 == 12.0
+    assert p90 == pytest.approx(13.6)
+
+
+def test_histogram_evicts_least_recent_fingerprint() -> None:
+    from comfyui_worker.polling import RuntimeHistogram
+
+    histogram = RuntimeHistogram(window=10, max_fingerprints=1)
+    for _ in range(3):
+        histogram.observe("a", 1.0)
+    histogram.observe("b", 1.0)
+
+    assert histogram.quantiles("a") is None
+
+
+def test_adaptive_polling_predicts_after_history(monkeypatch: MonkeyPatch) -> None:
+    from comfyui_worker import polling
+
+    clock = [0.0]
+    monkeypatch.setattr(polling.time, "monotonic", lambda: clock[0])
+    adaptive = polling.AdaptivePolling(0.25, 2.0, jitter=0.0)
+
+    for runtime in (9.0, 10.0, 11.0):
+        schedule = adaptive.schedule("fp")
+        assert schedule.predicted is None
+        schedule.next_delay()
+        # Time spent queued in ComfyUI is not learnt.
+        clock[0] += 30.0 + runtime
+        adaptive.complete("fp", schedule, runtime)
+
+    schedule = adaptive.schedule("fp")
+    assert schedule.predicted == 10.0
+    adaptive.complete("fp", schedule, 12.0)
+    adaptive.complete("fp", adaptive.schedule("fp"), None)
+
+    stats = adaptive.stats()
+    assert stats["prompts"] == 5
+    assert stats["polls"] == 3
+    assert stats["predictions"] == 1
+    assert stats["mean_abs_prediction_error_sec"] == pytest.approx(2.0)
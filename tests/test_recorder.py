@@ -0,0 +1,17 @@
+from pathlib import Path
+
+
+def test_recorder_appends_compact_lines(tmp_path: Path) -> None:
+    from comfyui_worker.recorder import WorkloadRecorder, read_trace
+
+    path = tmp_path / "trace.jsonl"
+    recorder = WorkloadRecorder(str(path))
+    recorder.record({"t": 2.0, "fp": "b", "total": 1.0})
+    recorder.record({"t": 1.0, "fp": "a", "total": 1.0})
+    # A crash mid-write leaves a torn last line behind.
+    with path.open("a") as file:
+        file.write('{"t": 3.0, "fp"')
+
+    assert path.read_text().splitlines()[0] == '{"t":2.0,"fp":"b","total":1.0}'
+    assert [entry["fp"] for entry in read_trace(str(path))] == ["a", "b"]
+    assert recorder.records == 2
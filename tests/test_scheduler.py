@@ -0,0 +1,221 @@
+import asyncio
+
+import pytest
+
+
+def test_scheduler_rejects_zero_depth() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    with pytest.raises(ValueError):
+        PromptScheduler(0)
+
+
+@pytest.mark.anyio
+async def test_scheduler_limits_in_flight_prompts() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(2)
+    release = asyncio.Event()
+    peak = 0
+
+    async def run() -> None:
+        nonlocal peak
+        async with scheduler.slot():
+            peak = max(peak, scheduler.in_flight)
+            await release.wait()
+
+    tasks = [asyncio.create_task(run()) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert scheduler.in_flight == 2
+    assert scheduler.waiting == 3
+
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert peak == 2
+    assert scheduler.in_flight == 0
+    assert scheduler.waiting == 0
+
+
+@pytest.mark.anyio
+async def test_scheduler_hands_slots_out_in_order() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(1)
+    order: list[int] = []
+
+    async def run(index: int) -> None:
+        async with scheduler.slot():
+            order.append(index)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(run(index) for index in range(4)))
+
+    assert order == [0, 1, 2, 3]
+
+
+@pytest.mark.anyio
+async def test_scheduler_cancelled_waiter_frees_its_place() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(1)
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        async with scheduler.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert scheduler.waiting == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    release.set()
+    await holder
+
+    assert scheduler.in_flight == 0
+    assert scheduler.waiting == 0
+
+
+@pytest.mark.anyio
+async def test_scheduler_waiter_cancelled_while_slot_is_released() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(1)
+    release = asyncio.Event()
+
+    async def hold() -> None:
+        async with scheduler.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    # The holder releases and drops the cancelled waiter before the waiter
+    # itself gets to handle its cancellation.
+    release.set()
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    await holder
+
+    assert scheduler.in_flight == 0
+    assert scheduler.waiting == 0
+
+
+@pytest.mark.anyio
+async def test_scheduler_groups_waiting_prompts_by_model() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(1)
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def run(name: str, model: str) -> None:
+        async with scheduler.slot(model):
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(run("a1", "a"))
+    await asyncio.sleep(0)
+    rest = [
+        asyncio.create_task(run(name, model))
+        for name, model in (("b1", "b"), ("a2", "a"), ("b2", "b"), ("a3", "a"))
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, *rest)
+
+    assert order == ["a1", "a2", "a3", "b1", "b2"]
+    assert scheduler.swaps == 1
+    assert scheduler.affinity_picks == 2
+
+
+@pytest.mark.anyio
+async def test_scheduler_serves_overdue_prompts_first() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(1, max_wait=0)
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def run(name: str, model: str) -> None:
+        async with scheduler.slot(model):
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(run("a1", "a"))
+    await asyncio.sleep(0)
+    rest = [
+        asyncio.create_task(run(name, model))
+        for name, model in (("b1", "b"), ("a2", "a"))
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, *rest)
+
+    assert order == ["a1", "b1", "a2"]
+    assert scheduler.swaps == 2
+
+
+@pytest.mark.anyio
+async def test_scheduler_serves_higher_priority_lanes_first() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(1)
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def run(name: str, model: str, priority: str) -> None:
+        async with scheduler.slot(model, priority):
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(run("first", "a", "normal"))
+    await asyncio.sleep(0)
+    rest = [
+        asyncio.create_task(run(name, model, priority))
+        for name, model, priority in (
+            ("low", "a", "low"),
+            ("normal", "b", "normal"),
+            ("high-b", "b", "high"),
+            ("high-a", "a", "high"),
+        )
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, *rest)
+
+    # Model affinity only reorders within a lane.
+    assert order == ["first", "high-a", "high-b", "normal", "low"]
+
+
+@pytest.mark.anyio
+async def test_scheduler_ages_waiting_prompts_into_higher_lanes() -> None:
+    from comfyui_worker.scheduler import PromptScheduler
+
+    scheduler = PromptScheduler(1, aging=0.01)
+    order: list[str] = []
+    release = asyncio.Event()
+
+    async def run(name: str, priority: str) -> None:
+        async with scheduler.slot(priority=priority):
+            order.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(run("first", "normal"))
+    await asyncio.sleep(0)
+    low = asyncio.create_task(run("low", "low"))
+    await asyncio.sleep(0.05)
+    high = asyncio.create_task(run("high", "high"))
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, low, high)
+
+    assert order == ["first", "low", "high"]
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+
+@pytest.mark.anyio
+async def test_singleflight_shares_one_call() -> None:
+    from comfyui_worker.singleflight import SingleFlight
+
+    flight = SingleFlight()
+    release = asyncio.Event()
+    calls = 0
+
+    async def work() -> str:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "result"
+
+    callers = [asyncio.create_task(flight.do("k", work)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert "k" in flight
+    release.set()
+
+    assert await asyncio.gather(*callers) == ["result"] * 3
+    assert calls == 1
+    assert flight.shared == 2
+    assert flight.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_singleflight_does_not_replay_failures() -> None:
+    from comfyui_worker.singleflight import SingleFlight
+
+    flight = SingleFlight()
+    release = asyncio.Event()
+    attempts = 0
+
+    async def work() -> str:
+        nonlocal attempts
+        attempts += 1
+        await release.wait()
+        if attempts == 1:
+            raise RuntimeError("boom")
+        return "ok"
+
+    callers = [asyncio.create_task(flight.do("k", work)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert await flight.do("k", work) == "ok"
+    assert attempts == 2
+
+
+@pytest.mark.anyio
+async def test_singleflight_keeps_call_running_for_remaining_callers() -> None:
+    from comfyui_worker.singleflight import SingleFlight
+
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work() -> str:
+        await release.wait()
+        return "result"
+
+    first = asyncio.create_task(flight.do("k", work))
+    second = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "result"
+    assert first.cancelled()
+
+
+@pytest.mark.anyio
+async def test_singleflight_cancels_call_when_last_caller_leaves() -> None:
+    from comfyui_worker.singleflight import SingleFlight
+
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def work() -> str:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "unreachable"
+
+    caller = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+    caller.cancel()
+    await asyncio.wait_for(cancelled.wait(), 1)
+
+    assert "k" not in flight
@@ -0,0 +1,74 @@
+def test_parse_task_input_accepts_bare_workflow() -> None:
+    from comfyui_worker.task_input import parse_task_input
+
+    workflow = {"3": {"class_type": "KSampler", "inputs": {}}}
+
+    task = parse_task_input(workflow)
+
+    assert task.workflow == workflow
+    assert task.cache is False
+    assert task.dedupe is True
+    assert task.priority == "normal"
+
+
+def test_parse_task_input_reads_envelope_options() -> None:
+    from comfyui_worker.task_input import parse_task_input
+
+    workflow = {"3": {"class_type": "KSampler", "inputs": {}}}
+
+    task = parse_task_input({"workflow": workflow, "cache": True})
+
+    assert task.workflow == workflow
+    assert task.cache is True
+
+
+def test_parse_task_input_reads_template_reference() -> None:
+    from comfyui_worker.task_input import parse_task_input
+
+    task = parse_task_input({"template_id": "txt2img", "params": {"3.inputs.seed": 1}})
+
+    assert task.workflow is None
+    assert task.template_id == "txt2img"
+    assert task.params == {"3.inputs.seed": 1}
+
+
+def test_parse_task_input_validates_priority() -> None:
+    import pytest
+    from pydantic import ValidationError
+
+    from comfyui_worker.task_input import parse_task_input
+
+    task = parse_task_input({"workflow": {"3": {}}, "priority": "high"})
+    assert task.priority == "high"
+
+    with pytest.raises(ValidationError):
+        parse_task_input({"workflow": {"3": {}}, "priority": "urgent"})
+
+
+def test_parse_task_input_requires_one_source() -> None:
+    import pytest
+    from pydantic import ValidationError
+
+    from comfyui_worker.task_input import parse_task_input
+
+    with pytest.raises(ValidationError):
+        parse_task_input({"workflow": {"3": {}}, "template_id": "txt2img"})
+
+
+def test_batch_input_requires_overrides_and_one_source() -> None:
+    import pytest
+    from pydantic import ValidationError
+
+    from comfyui_worker.task_input import BatchInput
+
+    batch = BatchInput.model_validate(
+        {"template_id": "txt2img", "overrides": [{"3.inputs.seed": 1}]}
+    )
+    assert batch.concurrency is None
+
+    with pytest.raises(ValidationError):
+        BatchInput.model_validate({"template_id": "txt2img", "overrides": []})
+    with pytest.raises(ValidationError):
+        BatchInput.model_validate(
+            {"workflow": {"3": {}}, "params": {"a.b": 1}, "overrides": [{}]}
+        )
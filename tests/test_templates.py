@@ -0,0 +1,77 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+TEMPLATE = {
+    "3": {"class_type": "KSampler", "inputs": {"seed": 1, "steps": 20}},
+    "6": {"class_type": "CLIPTextEncode", "inputs": {"text": "a cat"}},
+}
+
+
+def test_render_patches_copy_on_write() -> None:
+    from comfyui_worker.templates import WorkflowTemplate
+
+    template = WorkflowTemplate("txt2img", json.loads(json.dumps(TEMPLATE)))
+
+    workflow = template.render({"3.inputs.seed": 42, "3.inputs.steps": 30})
+
+    assert workflow["3"]["inputs"] == {"seed": 42, "steps": 30}
+    assert template.workflow["3"]["inputs"] == {"seed": 1, "steps": 20}
+    assert workflow["6"] is template.workflow["6"]
+
+
+def test_render_rejects_paths_outside_template() -> None:
+    from comfyui_worker.templates import TemplateError, WorkflowTemplate
+
+    template = WorkflowTemplate("txt2img", TEMPLATE)
+
+    with pytest.raises(TemplateError):
+        template.render({"99.inputs.seed": 1})
+    with pytest.raises(TemplateError):
+        template.render({"seed": 1})
+
+
+def test_key_matches_for_equal_params() -> None:
+    from comfyui_worker.templates import WorkflowTemplate
+
+    template = WorkflowTemplate("txt2img", TEMPLATE)
+
+    assert template.key({"3.inputs.seed": 1}) == template.key({"3.inputs.seed": 1})
+    assert template.key({"3.inputs.seed": 1}) != template.key({"3.inputs.seed": 2})
+
+
+def test_store_loads_and_hot_reloads(tmp_path: Path) -> None:
+    from comfyui_worker.templates import TemplateError, TemplateStore
+
+    path = tmp_path / "txt2img.json"
+    path.write_text(json.dumps(TEMPLATE))
+    store = TemplateStore(str(tmp_path), reload_interval=0)
+
+    assert store.get("txt2img").workflow == TEMPLATE
+
+    updated = {"3": {"class_type": "KSampler", "inputs": {"seed": 7}}}
+    path.write_text(json.dumps(updated))
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert store.get("txt2img").workflow == updated
+
+    path.unlink()
+    with pytest.raises(TemplateError):
+        store.get("txt2img")
+
+
+def test_store_keeps_previous_version_on_bad_file(tmp_path: Path) -> None:
+    from comfyui_worker.templates import TemplateStore
+
+    path = tmp_path / "txt2img.json"
+    path.write_text(json.dumps(TEMPLATE))
+    store = TemplateStore(str(tmp_path), reload_interval=0)
+    store.load()
+
+    path.write_text("{broken")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert store.get("txt2img").workflow == TEMPLATE
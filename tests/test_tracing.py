@@ -0,0 +1,193 @@
+import asyncio
+import json
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, cast
+
+import httpx
+import pytest
+from littlehorse.worker import WorkerContext
+from pytest_httpx import HTTPXMock
+
+
+class ListExporter:
+    def __init__(self) -> None:
+        self.spans: list[Any] = []
+
+    async def export(self, spans: list[Any]) -> None:
+        self.spans.extend(spans)
+
+    async def aclose(self) -> None:
+        pass
+
+
+@pytest.fixture
+def tracer() -> Iterator[Any]:
+    from comfyui_worker import tracing
+
+    tracer = tracing.Tracer(ListExporter())
+    tracing.configure(tracer)
+    yield tracer
+    tracing.configure(None)
+
+
+@pytest.mark.anyio
+async def test_child_spans_join_the_parent_trace() -> None:
+    from comfyui_worker.tracing import STATUS_ERROR, Tracer
+
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+
+    with tracer.span("task") as root:
+        with tracer.span("submit") as child:
+            pass
+        with pytest.raises(RuntimeError), tracer.span("wait"):
+            raise RuntimeError("boom")
+    await tracer.flush()
+
+    spans = {span.name: span for span in exporter.spans}
+    assert set(spans) == {"task", "submit", "wait"}
+    assert child.trace_id == root.trace_id
+    assert spans["submit"].parent_id == root.span_id
+    assert spans["task"].parent_id is None
+    assert spans["wait"].status == STATUS_ERROR
+    assert spans["wait"].status_message == "RuntimeError: boom"
+
+
+@pytest.mark.anyio
+async def test_unsampled_traces_record_nothing() -> None:
+    from comfyui_worker.tracing import Tracer
+
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sample_rate=0.0)
+
+    with tracer.span("task") as root, tracer.span("submit") as child:
+        child.set_attribute("ignored", True)
+    await tracer.flush()
+
+    assert root.recording is False
+    assert exporter.spans == []
+
+
+@pytest.mark.anyio
+async def test_json_file_exporter_appends_lines(tmp_path: Path) -> None:
+    from comfyui_worker.tracing import JsonFileExporter, Tracer
+
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer(JsonFileExporter(str(path)))
+
+    with tracer.span("task", attributes={"comfyui.prompt_id": "pid"}):
+        pass
+    await tracer.stop()
+
+    [line] = path.read_text().splitlines()
+    record = json.loads(line)
+    assert record["name"] == "task"
+    assert record["attributes"] == {"comfyui.prompt_id": "pid"}
+    assert record["end_ns"] >= record["start_ns"]
+
+
+@pytest.mark.anyio
+async def test_otlp_exporter_posts_json(httpx_mock: HTTPXMock) -> None:
+    from comfyui_worker.tracing import OtlpHttpExporter, Tracer
+
+    httpx_mock.add_response(method="POST", url="http://collector:4318/v1/traces")
+    tracer = Tracer(OtlpHttpExporter("http://collector:4318/"))
+
+    with tracer.span("task", attributes={"attempt": 2, "cached": False}):
+        pass
+    await tracer.stop()
+
+    body = json.loads(httpx_mock.get_request().content)
+    [span] = body["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert span["name"] == "task"
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16
+    assert {"key": "attempt", "value": {"intValue": "2"}} in span["attributes"]
+    assert {"key": "cached", "value": {"boolValue": False}} in span["attributes"]
+
+
+@pytest.mark.anyio
+async def test_task_handler_traces_phases_and_http_calls(
+    tracer: Any, httpx_mock: HTTPXMock
+) -> None:
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.comfyui_client import ComfyUiClient
+    from comfyui_worker.worker import build_task_handler
+
+    httpx_mock.add_response(
+        method="POST", url="http://comfy/prompt", json={"prompt_id": "pid"}
+    )
+    httpx_mock.add_response(
+        method="GET",
+        url="http://comfy/queue",
+        json={"queue_running": [], "queue_pending": []},
+    )
+    httpx_mock.add_response(
+        method="GET", url="http://comfy/history/pid", json={"pid": {"outputs": {}}}
+    )
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(client, "/outputs")]),
+        poll_interval=0,
+        history_timeout=1,
+    )
+
+    await handler({"3": {}}, cast(WorkerContext, StubCtx()))
+    await tracer.flush()
+
+    exporter = tracer.exporter
+    spans = {span.name: span for span in exporter.spans}
+    root = spans["comfyui.task"]
+    assert {"comfyui.submit", "comfyui.wait", "comfyui.outputs"} <= set(spans)
+    assert spans["POST /prompt"].parent_id == spans["comfyui.submit"].span_id
+    assert spans["GET /history"].parent_id == spans["comfyui.wait"].span_id
+    assert spans["comfyui.submit"].attributes["comfyui.prompt_id"] == "pid"
+    assert all(span.trace_id == root.trace_id for span in exporter.spans)
+
+
+@pytest.mark.anyio
+async def test_shared_queue_polls_stay_out_of_task_traces(
+    tracer: Any, httpx_mock: HTTPXMock
+) -> None:
+    from comfyui_worker import tracing
+    from comfyui_worker.comfyui_client import ComfyUiClient
+    from comfyui_worker.poller import QueuePoller
+
+    queued = {"a", "b"}
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/queue":
+            running = [[pid, 0] for pid in sorted(queued)]
+            return httpx.Response(
+                200, json={"queue_running": running, "queue_pending": []}
+            )
+        prompt_id = request.url.path.rsplit("/", 1)[-1]
+        return httpx.Response(200, json={prompt_id: {"outputs": {}}})
+
+    httpx_mock.add_callback(respond, is_reusable=True)
+    client = ComfyUiClient(base_url="http://comfy", timeout=5, retries=0)
+    poller = QueuePoller(client, interval=0.01)
+
+    async def wait(prompt_id: str) -> None:
+        with tracing.span("comfyui.wait", attributes={"comfyui.prompt_id": prompt_id}):
+            await poller.wait_for_history(prompt_id, 5)
+
+    first = asyncio.create_task(wait("a"))
+    second = asyncio.create_task(wait("b"))
+    await asyncio.sleep(0.03)
+    queued.discard("a")
+    await first
+    # Polls made for "b" after "a"'s span ended must not land in its trace.
+    await asyncio.sleep(0.03)
+    queued.clear()
+    await second
+    await tracer.flush()
+
+    spans = tracer.exporter.spans
+    assert [span.name for span in spans] == ["comfyui.wait", "comfyui.wait"]
+    assert spans[0].trace_id != spans[1].trace_id
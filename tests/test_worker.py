@@ -1,3 +1,5 @@
+import asyncio
+from pathlib import Path
 from typing import Any, cast
 
 from _pytest.monkeypatch import MonkeyPatch
@@ -12,71 +14,148 @@ def test_worker_extracts_outputs_inline() -> None:
     history = {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
     assert _extract_outputs(history) == ["img.png"]
 
+    history["outputs"]["2"] = {"images": [{"filename": "img.png", "subfolder": "a"}]}
+    assert _extract_outputs(history) == ["img.png", "a/img.png"]
 
-def test_worker_waits_for_history_and_returns_outputs() -> None:
+
+@pytest.mark.anyio
+async def test_worker_waits_for_history_and_returns_outputs() -> None:
     from comfyui_worker.worker import _execute_workflow
 
     class StubClient:
         def __init__(self) -> None:
             self.calls: list[str] = []
 
-        def submit_prompt(self, workflow: dict[str, Any]) -> str:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
             self.calls.append("submit")
             return "pid"
 
-        def is_in_queue(self, prompt_id: str) -> bool:
+        async def is_in_queue(self, prompt_id: str) -> bool:
             self.calls.append("queue")
             return False
 
-        def get_history(self, prompt_id: str) -> dict[str, Any]:
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
             self.calls.append("history")
             return {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
 
-    results = _execute_workflow(
+    results = await _execute_workflow(
         StubClient(), {"nodes": {}}, "/outputs", lambda *_: None, 2, 600
     )
     assert results["outputs"] == ["/outputs/img.png"]
 
 
-def test_worker_times_out_when_queue_never_clears() -> None:
+@pytest.mark.anyio
+async def test_worker_submits_high_priority_prompts_to_front() -> None:
+    from prometheus_client import REGISTRY
+
+    from comfyui_worker.scheduler import PromptScheduler
     from comfyui_worker.worker import _execute_workflow
 
     class StubClient:
-        def submit_prompt(self, workflow: dict[str, Any]) -> str:
+        def __init__(self) -> None:
+            self.fronts: list[bool] = []
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.fronts.append(front)
             return "pid"
 
-        def is_in_queue(self, prompt_id: str) -> bool:
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {}}
+
+    def lane_waits(lane: str) -> float:
+        return (
+            REGISTRY.get_sample_value(
+                "comfyui_worker_lane_wait_seconds_count",
+                {"lane": lane, "queue": "local"},
+            )
+            or 0.0
+        )
+
+    client = StubClient()
+    before = lane_waits("high")
+    for priority in ("high", "low"):
+        await _execute_workflow(
+            client,  # type: ignore[arg-type]
+            {"nodes": {}},
+            "/outputs",
+            lambda *_: None,
+            poll_interval=0,
+            history_timeout=5,
+            scheduler=PromptScheduler(1),
+            priority=priority,
+        )
+
+    assert client.fronts == [True, False]
+    assert lane_waits("high") == before + 1
+
+
+@pytest.mark.anyio
+async def test_worker_times_out_when_queue_never_clears() -> None:
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.pending = ["pid"]
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
             return True
 
-        def get_history(self, prompt_id: str) -> dict[str, Any]:
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
             return {}
 
+        async def get_queue(self) -> dict[str, Any]:
+            return {"queue_running": [], "queue_pending": [[p] for p in self.pending]}
+
+        async def delete_from_queue(self, prompt_ids: list[str]) -> None:
+            self.pending = [p for p in self.pending if p not in prompt_ids]
+
+    client = StubClient()
     with pytest.raises(TimeoutError):
-        _execute_workflow(
-            StubClient(),
+        await _execute_workflow(
+            client,  # type: ignore[arg-type]
             {"nodes": {}},
             "/outputs",
             lambda *_: None,
             poll_interval=0,
             history_timeout=0,
         )
+    # The abandoned prompt no longer waits for the GPU.
+    assert client.pending == []
 
 
-def test_worker_times_out_when_history_missing() -> None:
+@pytest.mark.anyio
+async def test_worker_times_out_when_history_missing() -> None:
     from comfyui_worker.worker import _execute_workflow
 
     class StubClient:
-        def submit_prompt(self, workflow: dict[str, Any]) -> str:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
             return "pid"
 
-        def is_in_queue(self, prompt_id: str) -> bool:
+        async def is_in_queue(self, prompt_id: str) -> bool:
             return False
 
-        def get_history(self, prompt_id: str) -> dict[str, Any] | None:
+        async def get_history(self, prompt_id: str) -> dict[str, Any] | None:
             return None
 
+        async def get_queue(self) -> dict[str, Any]:
+            return {"queue_running": [], "queue_pending": []}
+
     with pytest.raises(TimeoutError):
-        _execute_workflow(
+        await _execute_workflow(
             StubClient(),
             {"nodes": {}},
             "/outputs",
@@ -86,20 +165,23 @@ def test_worker_times_out_when_history_missing() -> None:
         )
 
 
-def test_worker_accepts_empty_history() -> None:
+@pytest.mark.anyio
+async def test_worker_accepts_empty_history() -> None:
     from comfyui_worker.worker import _execute_workflow
 
     class StubClient:
-        def submit_prompt(self, workflow: dict[str, Any]) -> str:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
             return "pid"
 
-        def is_in_queue(self, prompt_id: str) -> bool:
+        async def is_in_queue(self, prompt_id: str) -> bool:
             return False
 
-        def get_history(self, prompt_id: str) -> dict[str, Any]:
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
             return {}
 
-    results = _execute_workflow(
+    results = await _execute_workflow(
         StubClient(),
         {"nodes": {}},
         "/outputs",
@@ -110,20 +192,23 @@ def test_worker_accepts_empty_history() -> None:
     assert results["outputs"] == []
 
 
-def test_worker_preserves_absolute_outputs() -> None:
+@pytest.mark.anyio
+async def test_worker_preserves_absolute_outputs() -> None:
     from comfyui_worker.worker import _execute_workflow
 
     class StubClient:
-        def submit_prompt(self, workflow: dict[str, Any]) -> str:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
             return "pid"
 
-        def is_in_queue(self, prompt_id: str) -> bool:
+        async def is_in_queue(self, prompt_id: str) -> bool:
             return False
 
-        def get_history(self, prompt_id: str) -> dict[str, Any]:
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
             return {"outputs": {"1": {"images": [{"filename": "/abs/img.png"}]}}}
 
-    results = _execute_workflow(
+    results = await _execute_workflow(
         StubClient(),
         {"nodes": {}},
         "/outputs",
@@ -134,7 +219,8 @@ def test_worker_preserves_absolute_outputs() -> None:
     assert results["outputs"] == ["/abs/img.png"]
 
 
-def test_task_entrypoint_logs_progress(monkeypatch: MonkeyPatch) -> None:
+@pytest.mark.anyio
+async def test_task_entrypoint_logs_progress(monkeypatch: MonkeyPatch) -> None:
     from comfyui_worker.worker import execute_comfyui_workflow
 
     class StubCtx:
@@ -145,32 +231,41 @@ def test_task_entrypoint_logs_progress(monkeypatch: MonkeyPatch) -> None:
             self.logs.append(message)
 
     class StubClient:
-        def submit_prompt(self, workflow: dict[str, Any]) -> str:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
             return "pid"
 
-        def is_in_queue(self, prompt_id: str) -> bool:
+        async def is_in_queue(self, prompt_id: str) -> bool:
             return False
 
-        def get_history(self, prompt_id: str) -> dict[str, Any]:
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
             return {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
 
+        async def aclose(self) -> None:
+            self.closed = True
+
+    client = StubClient()
+
     monkeypatch.setenv("COMFYUI_BASE_URL", "http://localhost:8188")
     monkeypatch.setenv("COMFYUI_OUTPUT_DIR", "/outputs")
 
     monkeypatch.setattr(
         "comfyui_worker.worker.ComfyUiClient",
-        lambda base_url, timeout, retries: StubClient(),
+        lambda base_url, timeout, retries, **kwargs: client,
     )
 
     ctx = StubCtx()
-    result = execute_comfyui_workflow({"nodes": {}}, cast(WorkerContext, ctx))
+    result = await execute_comfyui_workflow({"nodes": {}}, cast(WorkerContext, ctx))
 
     assert result["prompt_id"] == "pid"
     assert "submit" in ctx.logs[0]
+    assert client.closed is True
 
 
 @pytest.mark.anyio
 async def test_build_task_handler_executes_workflow() -> None:
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
     from comfyui_worker.worker import build_task_handler
 
     class StubCtx:
@@ -181,18 +276,19 @@ async def test_build_task_handler_executes_workflow() -> None:
             self.logs.append(message)
 
     class StubClient:
-        def submit_prompt(self, workflow: dict[str, Any]) -> str:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
             return "pid"
 
-        def is_in_queue(self, prompt_id: str) -> bool:
+        async def is_in_queue(self, prompt_id: str) -> bool:
             return False
 
-        def get_history(self, prompt_id: str) -> dict[str, Any]:
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
             return {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
 
     handler = build_task_handler(
-        client=StubClient(),
-        output_dir="/outputs",
+        backends=BackendPool([ComfyUiBackend(StubClient(), "/outputs")]),  # type: ignore[arg-type]
         poll_interval=0,
         history_timeout=1,
     )
@@ -204,3 +300,1054 @@ async def test_build_task_handler_executes_workflow() -> None:
     assert result["outputs"] == ["/outputs/img.png"]
     assert "submit workflow" in ctx.logs
     assert "workflow complete" in ctx.logs
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_feeds_admission_control() -> None:
+    from comfyui_worker.admission import AdmissionController
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.worker import build_task_handler
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {
+                "outputs": {},
+                "status": {
+                    "messages": [
+                        ["execution_start", {"timestamp": 0}],
+                        ["execution_success", {"timestamp": 4000}],
+                    ]
+                },
+            }
+
+    admission = AdmissionController(
+        max_limit=4, wait_budget=60, target_wait=5, initial_limit=2
+    )
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(StubClient(), "/outputs")]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        admission=admission,
+    )
+
+    await handler({"nodes": {}}, cast(WorkerContext, StubCtx()))
+
+    assert admission.service_time == 4.0
+    assert admission.limit == 2
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_reattaches_retried_tasks(tmp_path: Path) -> None:
+    from types import SimpleNamespace
+
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.journal import PromptJournal
+    from comfyui_worker.worker import build_task_handler
+
+    class StubClient:
+        base_url = "http://gpu0"
+
+        def __init__(self) -> None:
+            self.submitted = 0
+            self.histories = {"pid-1": {"outputs": {}}}
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.submitted += 1
+            prompt_id = f"pid-{self.submitted}"
+            self.histories[prompt_id] = {"outputs": {}}
+            return prompt_id
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any] | None:
+            return self.histories.get(prompt_id)
+
+    def attempt(task_guid: str) -> Any:
+        return SimpleNamespace(
+            wf_run_id=SimpleNamespace(id="wf"),
+            task_run_id=SimpleNamespace(task_guid=task_guid),
+            attempt_number=1,
+            log=lambda message: None,
+        )
+
+    client = StubClient()
+    journal = PromptJournal(str(tmp_path / "journal.db"))
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(client, "/outputs")]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        journal=journal,
+    )
+
+    first = await handler({"nodes": {}}, attempt("guid"))
+    assert client.submitted == 1
+    # The worker restarted before reporting; LittleHorse retries the task.
+    retried = await handler({"nodes": {}}, attempt("guid"))
+    assert client.submitted == 1
+    assert retried["prompt_id"] == first["prompt_id"] == "pid-1"
+
+    # ComfyUI has forgotten the prompt too, so it is submitted again.
+    del client.histories["pid-1"]
+    retried = await handler({"nodes": {}}, attempt("guid"))
+    assert client.submitted == 2
+    entry = await journal.get("wf/guid")
+    assert entry is not None
+    assert entry.prompt_id == retried["prompt_id"] == "pid-2"
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_keeps_prompts_running_on_shutdown(
+    tmp_path: Path, monkeypatch: MonkeyPatch
+) -> None:
+    from types import SimpleNamespace
+
+    from comfyui_worker import worker
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.journal import SUBMITTED, PromptJournal
+    from comfyui_worker.scheduler import PromptScheduler
+
+    class StubClient:
+        base_url = "http://gpu0"
+
+        def __init__(self) -> None:
+            self.cancelled: list[tuple[str, Any]] = []
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid-1"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return True
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any] | None:
+            return None
+
+        async def get_queue(self) -> dict[str, Any]:
+            return {"queue_running": [["pid-1"]], "queue_pending": []}
+
+        async def interrupt(self, prompt_id: str) -> None:
+            self.cancelled.append(("interrupt", prompt_id))
+
+        async def delete_from_queue(self, prompt_ids: list[str]) -> None:
+            self.cancelled.append(("delete", prompt_ids))
+
+    ctx = SimpleNamespace(
+        wf_run_id=SimpleNamespace(id="wf"),
+        task_run_id=SimpleNamespace(task_guid="guid"),
+        attempt_number=1,
+        log=lambda message: None,
+    )
+    client = StubClient()
+    scheduler = PromptScheduler(1)
+    journal = PromptJournal(str(tmp_path / "journal.db"))
+    handler = worker.build_task_handler(
+        backends=BackendPool(
+            [ComfyUiBackend(client, "/outputs", scheduler=scheduler)]  # type: ignore[arg-type]
+        ),
+        poll_interval=60,
+        history_timeout=600,
+        journal=journal,
+    )
+    monkeypatch.setattr(worker, "_shutting_down", False)
+
+    task = asyncio.create_task(handler({"nodes": {}}, ctx))
+    while await journal.get("wf/guid") is None:
+        await asyncio.sleep(0)
+    worker.begin_shutdown()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    entry = await journal.get("wf/guid")
+    assert entry is not None
+    assert (entry.prompt_id, entry.state) == ("pid-1", SUBMITTED)
+    assert client.cancelled == []
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("still_running", [False, True])
+async def test_worker_resumes_prompts_without_waiting_for_events(
+    still_running: bool,
+) -> None:
+    from comfyui_worker.events import ComfyUiEventListener
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.submitted = 0
+            self.queue_checks = 2 if still_running else 0
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.submitted += 1
+            return "new"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            self.queue_checks -= 1
+            return self.queue_checks >= 0
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {"9": {"images": [{"filename": "a.png"}]}}}
+
+    # Connected, but ComfyUI will never send events for the earlier prompt:
+    # it finished before the restart or went to the old client id.
+    events = ComfyUiEventListener("http://comfy", "client-1")
+    events._connected.set()
+    client = StubClient()
+
+    result = await asyncio.wait_for(
+        _execute_workflow(
+            client,  # type: ignore[arg-type]
+            {"nodes": {}},
+            "/outputs",
+            lambda *_: None,
+            poll_interval=0,
+            history_timeout=30,
+            events=events,
+            resume="old",
+        ),
+        1,
+    )
+
+    assert result["prompt_id"] == "old"
+    assert result["outputs"] == ["/outputs/a.png"]
+    assert client.submitted == 0
+
+
+@pytest.mark.anyio
+async def test_worker_refetches_history_that_lags_the_completion_event() -> None:
+    from comfyui_worker.events import ComfyUiEventListener
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.history_fetches = 0
+            self.queue_checks = 0
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            self.queue_checks += 1
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any] | None:
+            self.history_fetches += 1
+            if self.history_fetches == 1:
+                return None
+            return {"outputs": {"9": {"images": [{"filename": "a.png"}]}}}
+
+    events = ComfyUiEventListener("http://comfy", "client-1")
+    events._connected.set()
+    events._finish("pid", None)
+    client = StubClient()
+
+    result = await asyncio.wait_for(
+        _execute_workflow(
+            client,  # type: ignore[arg-type]
+            {"nodes": {}},
+            "/outputs",
+            lambda *_: None,
+            poll_interval=60,
+            history_timeout=30,
+            events=events,
+        ),
+        1,
+    )
+
+    assert result["outputs"] == ["/outputs/a.png"]
+    assert client.history_fetches == 2
+    assert client.queue_checks == 0
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_uploads_and_patches_input_assets(
+    tmp_path: Path,
+) -> None:
+    from comfyui_worker.assets import AssetUploader
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.worker import build_task_handler
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        base_url = "http://gpu0"
+
+        def __init__(self) -> None:
+            self.uploads: list[str] = []
+            self.workflows: list[dict[str, Any]] = []
+
+        async def upload_image(
+            self, content: bytes, filename: str, subfolder: str = ""
+        ) -> str:
+            self.uploads.append(filename)
+            return f"{subfolder}/{filename}"
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.workflows.append(workflow)
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {}}
+
+    (tmp_path / "face.png").write_bytes(b"face")
+    client = StubClient()
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(client, "/outputs")]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        assets=AssetUploader(root=str(tmp_path)),
+    )
+    workflow = {"10": {"class_type": "LoadImage", "inputs": {"image": "x.png"}}}
+    payload = {"workflow": workflow, "assets": {"10.inputs.image": "face.png"}}
+
+    await handler(payload, cast(WorkerContext, StubCtx()))
+    await handler(payload, cast(WorkerContext, StubCtx()))
+
+    [uploaded] = client.uploads
+    assert client.workflows[0]["10"]["inputs"]["image"] == f"lhw-assets/{uploaded}"
+    assert workflow["10"]["inputs"]["image"] == "x.png"
+
+
+@pytest.mark.anyio
+async def test_worker_waits_for_completion_event() -> None:
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubEvents:
+        async def wait_for_completion(self, prompt_id: str, timeout: float) -> None:
+            return None
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.calls: list[str] = []
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.calls.append("submit")
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            self.calls.append("queue")
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            self.calls.append("history")
+            return {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
+
+    client = StubClient()
+    results = await _execute_workflow(
+        client,
+        {"nodes": {}},
+        "/outputs",
+        lambda *_: None,
+        poll_interval=0,
+        history_timeout=1,
+        events=StubEvents(),  # type: ignore[arg-type]
+    )
+
+    assert results["outputs"] == ["/outputs/img.png"]
+    assert client.calls == ["submit", "history"]
+
+
+@pytest.mark.anyio
+async def test_worker_falls_back_to_polling_when_stream_closed() -> None:
+    from comfyui_worker.events import ComfyUiEventStreamClosed
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubEvents:
+        async def wait_for_completion(self, prompt_id: str, timeout: float) -> None:
+            raise ComfyUiEventStreamClosed("closed")
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.calls: list[str] = []
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.calls.append("submit")
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            self.calls.append("queue")
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            self.calls.append("history")
+            return {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
+
+    client = StubClient()
+    results = await _execute_workflow(
+        client,
+        {"nodes": {}},
+        "/outputs",
+        lambda *_: None,
+        poll_interval=0,
+        history_timeout=1,
+        events=StubEvents(),  # type: ignore[arg-type]
+    )
+
+    assert results["outputs"] == ["/outputs/img.png"]
+    assert client.calls == ["submit", "queue", "history"]
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_pipelines_prompts() -> None:
+    import asyncio
+
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.scheduler import PromptScheduler
+    from comfyui_worker.worker import build_task_handler
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.submitted = 0
+            self.peak_queued = 0
+            self.queued: set[str] = set()
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.submitted += 1
+            prompt_id = f"pid-{self.submitted}"
+            self.queued.add(prompt_id)
+            self.peak_queued = max(self.peak_queued, len(self.queued))
+            return prompt_id
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            await asyncio.sleep(0)
+            self.queued.discard(prompt_id)
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {"1": {"images": [{"filename": f"{prompt_id}.png"}]}}}
+
+    client = StubClient()
+    backend = ComfyUiBackend(client, "/outputs", scheduler=PromptScheduler(2))  # type: ignore[arg-type]
+    handler = build_task_handler(
+        backends=BackendPool([backend]),
+        poll_interval=0,
+        history_timeout=1,
+    )
+
+    results = await asyncio.gather(
+        *(handler({"nodes": {}}, cast(WorkerContext, StubCtx())) for _ in range(5))
+    )
+
+    assert sorted(result["prompt_id"] for result in results) == [
+        f"pid-{index}" for index in range(1, 6)
+    ]
+    assert client.peak_queued == 2
+
+
+@pytest.mark.anyio
+async def test_worker_waits_on_shared_poller() -> None:
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubPoller:
+        async def wait_for_history(
+            self, prompt_id: str, timeout: float, **kwargs: Any
+        ) -> dict[str, Any]:
+            return {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
+
+    class StubClient:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+    results = await _execute_workflow(
+        StubClient(),  # type: ignore[arg-type]
+        {"nodes": {}},
+        "/outputs",
+        lambda *_: None,
+        poll_interval=0,
+        history_timeout=1,
+        poller=StubPoller(),  # type: ignore[arg-type]
+    )
+
+    assert results == {"prompt_id": "pid", "outputs": ["/outputs/img.png"]}
+
+
+@pytest.mark.anyio
+async def test_worker_records_runtime_for_adaptive_polling() -> None:
+    from comfyui_worker.polling import AdaptivePolling
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.queue_checks = 0
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            self.queue_checks += 1
+            return self.queue_checks < 3
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {}}
+
+    polling = AdaptivePolling(min_interval=0.001, max_interval=0.002, jitter=0.0)
+
+    await _execute_workflow(
+        StubClient(),
+        {"3": {"class_type": "KSampler", "inputs": {"steps": 20}}},
+        "/outputs",
+        lambda *_: None,
+        poll_interval=1,
+        history_timeout=5,
+        polling=polling,
+    )
+
+    assert polling.stats()["prompts"] == 1
+    assert polling.stats()["polls"] == 2
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_serves_opted_in_repeats_from_cache(
+    tmp_path: Path,
+) -> None:
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.cache import ResultCache
+    from comfyui_worker.worker import build_task_handler
+
+    (tmp_path / "img.png").write_bytes(b"png")
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.submits = 0
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.submits += 1
+            return f"pid-{self.submits}"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            # The preview lives in ComfyUI's temp dir and must not block caching.
+            return {
+                "outputs": {
+                    "1": {"images": [{"filename": "img.png"}]},
+                    "2": {"images": [{"filename": "preview.png", "type": "temp"}]},
+                }
+            }
+
+    client = StubClient()
+    cache = ResultCache(max_entries=8, max_bytes=1024)
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(client, str(tmp_path))]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        cache=cache,
+    )
+    ctx = cast(WorkerContext, StubCtx())
+    workflow = {"3": {"class_type": "KSampler", "inputs": {"seed": 1}}}
+
+    first = await handler({"workflow": workflow, "cache": True}, ctx)
+    second = await handler({"workflow": workflow, "cache": True}, ctx)
+    uncached = await handler(workflow, ctx)
+
+    assert (
+        first
+        == second
+        == {"prompt_id": "pid-1", "outputs": [str(tmp_path / "img.png")]}
+    )
+    assert uncached["prompt_id"] == "pid-2"
+    assert client.submits == 2
+    assert cache.skipped == 0
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_dedupes_identical_in_flight_workflows() -> None:
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.singleflight import SingleFlight
+    from comfyui_worker.worker import build_task_handler
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.submits = 0
+            self.release = asyncio.Event()
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.submits += 1
+            return f"pid-{self.submits}"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            await self.release.wait()
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {}}
+
+    client = StubClient()
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(client, "/outputs")]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        singleflight=SingleFlight(),
+    )
+    ctx = cast(WorkerContext, StubCtx())
+    workflow = {"3": {"class_type": "KSampler", "inputs": {"seed": 1}}}
+
+    tasks = [
+        asyncio.create_task(handler(workflow, ctx)),
+        asyncio.create_task(handler({"workflow": workflow}, ctx)),
+        asyncio.create_task(handler({"workflow": workflow, "dedupe": False}, ctx)),
+    ]
+    await asyncio.sleep(0.01)
+    client.release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert results[0]["prompt_id"] == results[1]["prompt_id"]
+    assert results[2]["prompt_id"] != results[0]["prompt_id"]
+    assert client.submits == 2
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_renders_templates(tmp_path: Path) -> None:
+    import json
+
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.templates import TemplateStore
+    from comfyui_worker.worker import build_task_handler
+
+    (tmp_path / "txt2img.json").write_text(
+        json.dumps({"3": {"class_type": "KSampler", "inputs": {"seed": 1}}})
+    )
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.workflows: list[dict[str, Any]] = []
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            self.workflows.append(workflow)
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {}}
+
+    client = StubClient()
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(client, "/outputs")]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        templates=TemplateStore(str(tmp_path)),
+    )
+
+    await handler(
+        {"template_id": "txt2img", "params": {"3.inputs.seed": 42}},
+        cast(WorkerContext, StubCtx()),
+    )
+
+    assert client.workflows == [
+        {"3": {"class_type": "KSampler", "inputs": {"seed": 42}}}
+    ]
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_uploads_artifacts(tmp_path: Path) -> None:
+    from comfyui_worker.artifacts import ArtifactUploader, FileSink
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.worker import build_task_handler
+
+    (tmp_path / "img.png").write_bytes(b"png")
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {"outputs": {"1": {"images": [{"filename": "img.png"}]}}}
+
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(StubClient(), str(tmp_path))]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        artifacts=ArtifactUploader(FileSink(str(tmp_path / "sink"))),
+    )
+
+    result = await handler({"3": {}}, cast(WorkerContext, StubCtx()))
+
+    assert result["outputs"] == [str(tmp_path / "img.png")]
+    assert result["artifacts"][0]["uri"].endswith("/sink/pid/img.png")
+    assert result["artifacts"][0]["size"] == 3
+
+
+@pytest.mark.anyio
+async def test_worker_fetches_outputs_over_view(tmp_path: Path) -> None:
+    from comfyui_worker.worker import _execute_workflow
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.downloads: list[tuple[str, str, str]] = []
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {
+                "outputs": {
+                    "9": {
+                        "images": [
+                            {"filename": "a.png", "subfolder": "", "type": "output"},
+                            {"filename": "b.png", "subfolder": "run", "type": "temp"},
+                        ]
+                    }
+                }
+            }
+
+        async def download_output(
+            self, filename: str, subfolder: str, folder_type: str, destination: Path
+        ) -> int:
+            self.downloads.append((filename, subfolder, folder_type))
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            destination.write_bytes(b"x")
+            return 1
+
+    client = StubClient()
+    result = await _execute_workflow(
+        client,
+        {"3": {}},
+        str(tmp_path),
+        lambda *_: None,
+        poll_interval=0,
+        history_timeout=1,
+        output_mode="fetch",
+    )
+
+    root = tmp_path.resolve() / "pid"
+    assert result["outputs"] == [str(root / "a.png"), str(root / "run" / "b.png")]
+    assert sorted(client.downloads) == [
+        ("a.png", "", "output"),
+        ("b.png", "run", "temp"),
+    ]
+
+
+@pytest.mark.anyio
+async def test_worker_rejects_outputs_escaping_output_dir(tmp_path: Path) -> None:
+    from comfyui_worker.worker import _fetch_outputs
+
+    history = {
+        "outputs": {"9": {"images": [{"filename": "x.png", "subfolder": "../.."}]}}
+    }
+
+    with pytest.raises(ValueError):
+        await _fetch_outputs(None, "pid", history, str(tmp_path))  # type: ignore[arg-type]
+
+
+@pytest.mark.anyio
+async def test_build_task_handler_records_workload(tmp_path: Path) -> None:
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.recorder import WorkloadRecorder, read_trace
+    from comfyui_worker.worker import build_task_handler
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            return {
+                "outputs": {},
+                "status": {
+                    "messages": [
+                        ["execution_start", {"timestamp": 1_000}],
+                        ["execution_success", {"timestamp": 3_500}],
+                    ]
+                },
+            }
+
+    recorder = WorkloadRecorder(str(tmp_path / "trace.jsonl"))
+    handler = build_task_handler(
+        backends=BackendPool([ComfyUiBackend(StubClient(), str(tmp_path))]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+        recorder=recorder,
+    )
+
+    await handler({"3": {"class_type": "KSampler"}}, cast(WorkerContext, StubCtx()))
+    with pytest.raises(ValueError):
+        await handler(
+            {"template_id": "x", "workflow": {}}, cast(WorkerContext, StubCtx())
+        )
+
+    ok, failed = read_trace(str(tmp_path / "trace.jsonl"))
+    assert ok["ok"] is True
+    assert ok["execute"] == 2.5
+    assert ok["fp"] and ok["model"] == ""
+    assert ok["bytes"] == len('{"3":{"class_type":"KSampler"}}')
+    assert "workflow" not in ok
+    assert failed["ok"] is False
+    assert failed["error"] == "ValidationError"
+
+
+def test_worker_resolves_all_media_outputs_and_texts() -> None:
+    from comfyui_worker.worker import _resolve_outputs
+
+    history = {
+        "outputs": {
+            "9": {"gifs": [{"filename": "clip.mp4"}]},
+            "10": {"audio": [{"filename": "voice.flac"}], "text": "hello"},
+        }
+    }
+
+    result = _resolve_outputs("pid", history, "/out")
+
+    assert result["outputs"] == ["/out/clip.mp4", "/out/voice.flac"]
+    assert result["texts"] == ["hello"]
+
+
+def test_worker_resolves_only_saved_outputs_in_path_mode() -> None:
+    from comfyui_worker.worker import _resolve_outputs
+
+    history = {
+        "outputs": {
+            "9": {"images": [{"filename": "final.png", "subfolder": "run"}]},
+            "12": {
+                "images": [
+                    {"filename": "preview.png", "subfolder": "", "type": "temp"},
+                    {"filename": "saved.png", "subfolder": "", "type": "output"},
+                ]
+            },
+        }
+    }
+
+    result = _resolve_outputs("pid", history, "/out")
+
+    # Previews sit in ComfyUI's temp dir, not under the output directory.
+    assert result["outputs"] == ["/out/run/final.png", "/out/saved.png"]
+
+
+@pytest.mark.anyio
+async def test_worker_interrupts_running_prompt_when_cancelled() -> None:
+    from comfyui_worker import metrics
+    from comfyui_worker.polling import AdaptivePolling
+    from comfyui_worker.scheduler import PromptScheduler
+    from comfyui_worker.worker import _execute_workflow
+    from comfyui_worker.workflow import workflow_fingerprint
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.interrupted: list[str] = []
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            return "pid"
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return True
+
+        async def get_queue(self) -> dict[str, Any]:
+            return {"queue_running": [["pid"]], "queue_pending": []}
+
+        async def interrupt(self, prompt_id: str) -> None:
+            self.interrupted.append(prompt_id)
+
+    client = StubClient()
+    scheduler = PromptScheduler(1)
+    polling = AdaptivePolling(60, 60)
+    for _ in range(3):
+        polling.histogram.observe(workflow_fingerprint({"nodes": {}}), 100.0)
+    reclaimed = metrics.RECLAIMED_GPU_SECONDS._value.get()
+
+    task = asyncio.create_task(
+        _execute_workflow(
+            client,  # type: ignore[arg-type]
+            {"nodes": {}},
+            "/outputs",
+            lambda *_: None,
+            poll_interval=60,
+            history_timeout=600,
+            scheduler=scheduler,
+            polling=polling,
+        )
+    )
+    while scheduler.in_flight == 0:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert client.interrupted == ["pid"]
+    assert scheduler.in_flight == 0
+    assert 99 < metrics.RECLAIMED_GPU_SECONDS._value.get() - reclaimed <= 100
+
+
+@pytest.mark.anyio
+async def test_build_batch_handler_runs_variants_in_order(tmp_path: Path) -> None:
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.scheduler import PromptScheduler
+    from comfyui_worker.worker import build_batch_handler
+
+    class StubCtx:
+        def __init__(self) -> None:
+            self.logs: list[str] = []
+
+        def log(self, message: str) -> None:
+            self.logs.append(message)
+
+    class StubClient:
+        def __init__(self) -> None:
+            self.prompts: dict[str, dict[str, Any]] = {}
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            seed = workflow["3"]["inputs"]["seed"]
+            if seed == 2:
+                raise ValueError("bad seed")
+            prompt_id = f"p{seed}"
+            self.prompts[prompt_id] = workflow
+            return prompt_id
+
+        async def is_in_queue(self, prompt_id: str) -> bool:
+            return False
+
+        async def get_history(self, prompt_id: str) -> dict[str, Any]:
+            await asyncio.sleep(0.01 if prompt_id == "p1" else 0)
+            return {"outputs": {"9": {"images": [{"filename": f"{prompt_id}.png"}]}}}
+
+    client = StubClient()
+    scheduler = PromptScheduler(2)
+    handler = build_batch_handler(
+        backends=BackendPool(
+            [ComfyUiBackend(client, str(tmp_path), scheduler=scheduler)]  # type: ignore[arg-type]
+        ),
+        poll_interval=0,
+        history_timeout=1,
+    )
+    base = {"3": {"class_type": "KSampler", "inputs": {"seed": 0, "steps": 20}}}
+    ctx = StubCtx()
+
+    result = await handler(
+        {
+            "workflow": base,
+            "overrides": [{"3.inputs.seed": seed} for seed in (1, 2, 3)],
+        },
+        cast(WorkerContext, ctx),
+    )
+
+    assert [entry["index"] for entry in result["results"]] == [0, 1, 2]
+    assert result["results"][1]["error"] == "ValueError: bad seed"
+    assert result["outputs"] == [str(tmp_path / "p1.png"), str(tmp_path / "p3.png")]
+    assert (result["succeeded"], result["failed"]) == (2, 1)
+    assert "variant 1 failed (1/3)" in ctx.logs
+    # Variants share every untouched node with the base workflow.
+    assert base["3"]["inputs"]["seed"] == 0
+    assert client.prompts["p3"]["3"]["inputs"]["steps"] == 20
+    assert scheduler.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_build_batch_handler_fails_when_every_variant_fails(
+    tmp_path: Path,
+) -> None:
+    import httpx
+
+    from comfyui_worker.backends import BackendPool, ComfyUiBackend
+    from comfyui_worker.worker import build_batch_handler
+
+    class StubCtx:
+        def log(self, message: str) -> None:
+            pass
+
+    class StubClient:
+        base_url = "http://gpu0"
+
+        async def submit_prompt(
+            self, workflow: dict[str, Any], front: bool = False
+        ) -> str:
+            raise httpx.ConnectError("refused")
+
+    handler = build_batch_handler(
+        backends=BackendPool([ComfyUiBackend(StubClient(), str(tmp_path))]),  # type: ignore[arg-type]
+        poll_interval=0,
+        history_timeout=1,
+    )
+
+    with pytest.raises(RuntimeError, match="all 2 variants failed"):
+        await handler(
+            {"workflow": {"3": {}}, "overrides": [{"9.inputs.x": 1}, {}]},
+            cast(WorkerContext, StubCtx()),
+        )
@@ -0,0 +1,59 @@
+def _workflow(seed: int, text: str, steps: int) -> dict:
+    return {
+        "3": {
+            "class_type": "KSampler",
+            "inputs": {"seed": seed, "steps": steps, "model": ["4", 0]},
+        },
+        "6": {"class_type": "CLIPTextEncode", "inputs": {"text": text}},
+    }
+
+
+def test_fingerprint_ignores_content_inputs() -> None:
+    from comfyui_worker.workflow import workflow_fingerprint
+
+    assert workflow_fingerprint(_workflow(1, "a cat", 20)) == workflow_fingerprint(
+        _workflow(2, "a dog", 20)
+    )
+
+
+def test_fingerprint_changes_with_runtime_inputs() -> None:
+    from comfyui_worker.workflow import workflow_fingerprint
+
+    assert workflow_fingerprint(_workflow(1, "a cat", 20)) != workflow_fingerprint(
+        _workflow(1, "a cat", 40)
+    )
+
+
+def test_workflow_hash_ignores_key_order() -> None:
+    from comfyui_worker.workflow import workflow_hash
+
+    a = {"1": {"inputs": {"x": 1, "y": 2}}, "2": {}}
+    b = {"2": {}, "1": {"inputs": {"y": 2, "x": 1}}}
+
+    assert workflow_hash(a) == workflow_hash(b)
+    assert workflow_hash(a) != workflow_hash({"1": {"inputs": {"x": 2, "y": 2}}})
+
+
+def test_model_fingerprint_tracks_loader_inputs() -> None:
+    from comfyui_worker.workflow import model_fingerprint
+
+    def workflow(ckpt: str, seed: int) -> dict:
+        return {
+            "4": {
+                "class_type": "CheckpointLoaderSimple",
+                "inputs": {"ckpt_name": ckpt},
+            },
+            "10": {
+                "class_type": "LoraLoader",
+                "inputs": {"lora_name": "style.safetensors", "strength_model": 1.0},
+            },
+            "3": {"class_type": "KSampler", "inputs": {"seed": seed}},
+        }
+
+    assert model_fingerprint(workflow("sdxl.safetensors", 1)) == model_fingerprint(
+        workflow("sdxl.safetensors", 2)
+    )
+    assert model_fingerprint(workflow("sdxl.safetensors", 1)) != model_fingerprint(
+        workflow("flux.safetensors", 1)
+    )
+    assert model_fingerprint({"3": {"class_type": "KSampler", "inputs": {}}}) == ""